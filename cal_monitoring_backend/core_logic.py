@@ -1,24 +1,154 @@
+import numpy as np
 import pandas as pd
+import hashlib
 import json
+import numbers
+import operator
+import re
+import shutil
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Union
+from pathlib import Path
+from typing import Any, Callable, Iterator, NamedTuple, Union
 
-def load_sensor_data_from_excel(file_path: str) -> tuple[pd.DataFrame, pd.Series]:
+# === Caché columnar de exportaciones Excel ===
+# Cada hoja se convierte una vez a un .npy por columna (float64 memory-mapped si la columna es
+# numérica, arreglo de objetos si no) más un meta.json, en .cache_sensores/<nombre>-<clave>/ junto
+# al Excel. La clave incluye ruta, mtime y tamaño, así que un Excel modificado invalida su caché.
+
+DIRECTORIO_CACHE_EXCEL = ".cache_sensores"
+_VERSION_CACHE_EXCEL = 2
+
+
+def _clave_cache_excel(ruta: Path) -> str:
+    stat = ruta.stat()
+    firma = f"{ruta.resolve()}|{stat.st_mtime_ns}|{stat.st_size}|{_VERSION_CACHE_EXCEL}"
+    return hashlib.sha1(firma.encode("utf-8")).hexdigest()[:16]
+
+
+def _es_columna_numerica(valores: np.ndarray) -> bool:
+    return all(isinstance(v, numbers.Real) and not isinstance(v, bool) for v in valores)
+
+
+def _columnas_excel(sensor_data: pd.DataFrame) -> list[tuple[Any, bool, np.ndarray]]:
+    """(columna, numérica, valores) de cada columna: float64 si es completamente numérica, objetos si no."""
+    columnas = []
+    for col in sensor_data.columns:
+        valores = sensor_data[col].to_numpy(dtype=object)
+        numerica = _es_columna_numerica(valores)
+        columnas.append((col, numerica, valores.astype(np.float64) if numerica else valores))
+    return columnas
+
+
+def _armar_frame_excel(columnas: list[tuple[Any, bool, np.ndarray]]) -> pd.DataFrame:
+    """DataFrame sin copiar los arreglos; las columnas no numéricas quedan como object (no str)."""
+    return pd.DataFrame(
+        {col: pd.Series(valores, dtype=np.float64 if numerica else object, copy=False) for col, numerica, valores in columnas},
+        columns=[col for col, _, _ in columnas],
+        copy=False,
+    )
+
+
+def _guardar_cache_excel(directorio: Path, sensor_data: pd.DataFrame, sensor_names_with_cols: pd.Series) -> None:
+    # Se escribe en un directorio temporal y se renombra, para no dejar cachés a medias
+    temporal = directorio.with_name(directorio.name + ".tmp")
+    shutil.rmtree(temporal, ignore_errors=True)
+    temporal.mkdir(parents=True)
+
+    columnas = []
+    for posicion, (col, numerica, valores) in enumerate(_columnas_excel(sensor_data)):
+        np.save(temporal / f"c{posicion}.npy", valores, allow_pickle=not numerica)
+        columnas.append({"columna": col, "numerica": numerica})
+    np.save(temporal / "nombres.npy", sensor_names_with_cols.to_numpy(dtype=object), allow_pickle=True)
+
+    with open(temporal / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({"version": _VERSION_CACHE_EXCEL, "filas": len(sensor_data), "columnas": columnas}, f)
+
+    # Eliminar cachés anteriores del mismo archivo: exactamente "<nombre con extensión>-<16 hex>",
+    # para no tocar las de otro libro cuyo nombre empiece igual (Tabla.xlsx vs Tabla-Completa.xlsx)
+    # ni las del mismo nombre con otra extensión (Tabla.xls vs Tabla.xlsx)
+    nombre = directorio.name.rsplit("-", 1)[0]
+    patron = re.compile(re.escape(nombre) + r"-[0-9a-f]{16}")
+    for anterior in directorio.parent.iterdir():
+        if anterior != directorio and anterior.is_dir() and patron.fullmatch(anterior.name):
+            shutil.rmtree(anterior, ignore_errors=True)
+    temporal.rename(directorio)
+
+
+def _cargar_cache_excel(directorio: Path) -> tuple[pd.DataFrame, pd.Series] | None:
+    """
+    Carga una caché escrita por _guardar_cache_excel. Las columnas numéricas se abren con
+    memory-map copy-on-write (mmap_mode="c"): el DataFrame se puede modificar y los cambios
+    quedan en memoria, sin tocar la caché.
+    """
+    meta_path = directorio / "meta.json"
+    if not meta_path.is_file():
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != _VERSION_CACHE_EXCEL:
+        return None
+
+    columnas = []
+    for posicion, info in enumerate(meta["columnas"]):
+        archivo = directorio / f"c{posicion}.npy"
+        if info["numerica"]:
+            valores = np.load(archivo, mmap_mode="c")
+        else:
+            valores = np.load(archivo, allow_pickle=True)
+        columnas.append((info["columna"], info["numerica"], valores))
+    sensor_data = _armar_frame_excel(columnas)
+    sensor_names_with_cols = pd.Series(
+        np.load(directorio / "nombres.npy", allow_pickle=True), index=[col for col, _, _ in columnas]
+    )
+    return sensor_data, sensor_names_with_cols
+
+
+def _leer_excel_sensores(file_path: str) -> tuple[pd.DataFrame, pd.Series]:
+    df = pd.read_excel(file_path, header=None)
+    # La fila 3 (índice 2 si es 0-basado) contiene los nombres de los sensores.
+    # Creamos una Serie donde el valor es el nombre del sensor y el índice es el índice de la columna.
+    sensor_names_with_cols = pd.Series(df.iloc[2].values, index=df.columns)
+    # Los datos de los sensores comienzan desde la fila 6 (índice 5 si es 0-basado)
+    sensor_data = df.iloc[5:].reset_index(drop=True)
+    return sensor_data, sensor_names_with_cols
+
+
+def load_sensor_data_from_excel(file_path: str, usar_cache: bool = True) -> tuple[pd.DataFrame, pd.Series]:
     """
     Carga los datos de los sensores desde un archivo Excel.
     Asume que la fila con índice 2 (tercera fila, 0-basada) contiene los nombres de los sensores
     y los datos de los sensores comienzan desde la fila con índice 5 (sexta fila, 0-basada).
     Retorna una tupla con el DataFrame de los datos de sensores y una Serie de los nombres de los sensores
     con sus índices de columna originales como índice de la Serie.
+    Las columnas completamente numéricas se retornan como float64 y el resto como object, con o
+    sin caché. Con usar_cache=True la primera lectura guarda una caché columnar (ver
+    DIRECTORIO_CACHE_EXCEL) y la retorna ya cargada desde ahí, igual que las lecturas siguientes,
+    que la abren con memory-map sin volver a parsear el XLSX.
     """
     try:
-        df = pd.read_excel(file_path, header=None)
-        # La fila 3 (índice 2 si es 0-basado) contiene los nombres de los sensores.
-        # Creamos una Serie donde el valor es el nombre del sensor y el índice es el índice de la columna.
-        sensor_names_with_cols = pd.Series(df.iloc[2].values, index=df.columns)
-        # Los datos de los sensores comienzan desde la fila 6 (índice 5 si es 0-basado)
-        sensor_data = df.iloc[5:].reset_index(drop=True)
-        return sensor_data, sensor_names_with_cols
+        ruta = Path(file_path)
+        directorio = None
+        if usar_cache:
+            directorio = ruta.parent / DIRECTORIO_CACHE_EXCEL / f"{ruta.name}-{_clave_cache_excel(ruta)}"
+            try:
+                en_cache = _cargar_cache_excel(directorio)
+                if en_cache is not None:
+                    return en_cache
+            except Exception as e:
+                print(f"Advertencia: caché de '{file_path}' ilegible, se vuelve a leer el Excel: {e}")
+
+        sensor_data, sensor_names_with_cols = _leer_excel_sensores(file_path)
+
+        if directorio is not None:
+            try:
+                _guardar_cache_excel(directorio, sensor_data, sensor_names_with_cols)
+                en_cache = _cargar_cache_excel(directorio)
+                if en_cache is not None:
+                    return en_cache
+            except OSError as e:
+                print(f"Advertencia: no se pudo escribir la caché de '{file_path}': {e}")
+        return _armar_frame_excel(_columnas_excel(sensor_data)), sensor_names_with_cols
     except FileNotFoundError:
         print(f"Error: El archivo Excel '{file_path}' no se encontró.")
         return None, None
@@ -68,7 +198,7 @@ def extract_tags_recursively(obj, tags_set: set):
     """
     if isinstance(obj, dict):
         for key, value in obj.items():
-            if key in ["tag", "tag_controlador", "actuador"]:
+            if key in ["tag", "tag_controlador", "actuador", "tag_salida", "tag_modo", "tag_abierta"]:
                 tags_set.add(value)
             elif key == "equipos" and isinstance(value, list):
                 tags_set.update(value)
@@ -78,11 +208,46 @@ def extract_tags_recursively(obj, tags_set: set):
         for item in obj:
             extract_tags_recursively(item, tags_set)
 
+def expandir_tag(tag: str) -> list[str]:
+    """
+    Expande un tag compuesto con "/" igual que expandir_claves_json (app.py legado):
+    el último segmento separado por "-" se divide en "/" y cada sufijo se une al prefijo.
+    Ej: "2270-ZM-009-12A/13A" -> ["2270-ZM-009-12A", "2270-ZM-009-13A"].
+    """
+    if "/" not in tag:
+        return [tag]
+    partes = tag.split("-")
+    prefijo = "-".join(partes[:-1])
+    return [f"{prefijo}-{sufijo}" for sufijo in partes[-1].split("/")]
+
+
+def construir_indice_columnas(excel_sensor_names: pd.Series) -> tuple[dict, dict]:
+    """
+    Construye, en una sola pasada, el índice tag normalizado (strip) -> índice de columna.
+    Ante cabeceras repetidas conserva la primera columna (igual que buscar_col) y
+    las informa en el segundo diccionario: tag -> lista de todas sus columnas.
+    """
+    indice = {}
+    duplicados = {}
+    for idx_col, nombre in excel_sensor_names.items():
+        if pd.isna(nombre):
+            continue
+        tag = str(nombre).strip()
+        if tag == "":
+            continue
+        if tag in indice:
+            duplicados.setdefault(tag, [indice[tag]]).append(idx_col)
+        else:
+            indice[tag] = idx_col
+    return indice, duplicados
+
+
 def build_tag_column_map(alarm_config: dict, excel_sensor_names: pd.Series, required_tags: list[str] = None) -> tuple[dict, set]:
     """
     Construye un mapa de TAGs a índices de columna en el DataFrame de Excel
     y un conjunto de TAGs que no fueron encontrados.
     Acepta una lista opcional de required_tags para asegurar que se mapeen.
+    Los tags compuestos con "/" se mapean por cada tag expandido (ver expandir_tag).
     """
     mapa_col_idx = {}
     tags_no_encontrados = set()
@@ -96,23 +261,149 @@ def build_tag_column_map(alarm_config: dict, excel_sensor_names: pd.Series, requ
     if required_tags:
         all_tags_from_json.update(required_tags)
 
-    # Limpiar y validar tags de Excel
-    tags_excel_valid = set(str(tag).strip() for tag in excel_sensor_names if pd.notna(tag) and str(tag).strip() != "")
+    # Índice de cabeceras del Excel, construido una sola vez
+    indice_excel, duplicados = construir_indice_columnas(excel_sensor_names)
 
     for tag_json in all_tags_from_json:
         tag_limpio = str(tag_json).strip()
-        if tag_limpio in tags_excel_valid:
-            idx_col = buscar_col(tag_limpio, excel_sensor_names)
-            if idx_col is not None:
-                mapa_col_idx[tag_limpio] = idx_col
-            else:
-                # Este caso debería ser raro si tag_limpio in tags_excel_valid es verdadero
-                tags_no_encontrados.add(tag_limpio)
-        else:
+        idx_col = indice_excel.get(tag_limpio)
+        if idx_col is not None:
+            mapa_col_idx[tag_limpio] = idx_col
+            continue
+
+        encontrado = False
+        if "/" in tag_limpio:
+            for tag_expandido in expandir_tag(tag_limpio):
+                idx_col = indice_excel.get(tag_expandido)
+                if idx_col is not None:
+                    mapa_col_idx[tag_expandido] = idx_col
+                    encontrado = True
+        if not encontrado:
             tags_no_encontrados.add(tag_limpio)
-            
+
+    duplicados_usados = {tag: cols for tag, cols in duplicados.items() if tag in mapa_col_idx}
+    if duplicados_usados:
+        print(f"Advertencia: cabeceras repetidas en el Excel, se usa la primera columna: {duplicados_usados}")
+
     return mapa_col_idx, tags_no_encontrados
 
+def tipar_columnas_sensores(
+    sensor_data: pd.DataFrame,
+    mapa_columnas: dict,
+    dtype: type = np.float64
+) -> tuple[pd.DataFrame, dict]:
+    """
+    Convierte una sola vez cada columna mapeada (tag -> columna) a un arreglo numérico contiguo.
+    Las columnas que solo contienen 0/1 sin vacíos quedan como bool; el resto como `dtype`
+    (np.float64 o np.float32), con NaN en celdas vacías o no convertibles.
+    Las columnas no mapeadas se dejan sin cambios.
+    Retorna el DataFrame tipado y un reporte por tag: columna, dtype, nulos y fallidos
+    (celdas con contenido que no pudo convertirse a número).
+    """
+    tipado = sensor_data.copy(deep=False)
+    reporte = {}
+
+    for tag, col in mapa_columnas.items():
+        if col not in sensor_data.columns or tag in reporte:
+            continue
+        original = sensor_data[col]
+        numerica = pd.to_numeric(original, errors="coerce")
+        vacios = numerica.isna().to_numpy()
+        fallidos = int((vacios & original.notna().to_numpy()).sum())
+        valores = numerica.to_numpy(dtype=np.float64, na_value=np.nan)
+
+        if not vacios.any() and np.isin(valores, (0.0, 1.0)).all():
+            tipado[col] = valores.astype(bool)
+        else:
+            tipado[col] = valores.astype(dtype, copy=False)
+        reporte[tag] = {
+            "columna": col,
+            "dtype": str(tipado[col].dtype),
+            "nulos": int(vacios.sum()) - fallidos,
+            "fallidos": fallidos,
+        }
+
+    return tipado, reporte
+
+# === Lectura por bloques de históricos grandes ===
+# Para exportaciones de meses completos: nunca se carga el archivo entero, solo
+# bloques de `tamano_bloque` filas ya tipados. El índice de cada bloque continúa
+# la numeración global de filas del archivo.
+
+TAMANO_BLOQUE_HISTORICO = 50_000
+
+
+def leer_csv_por_bloques(
+    file_path: str,
+    tamano_bloque: int = TAMANO_BLOQUE_HISTORICO,
+    columnas: list[str] | None = None,
+    mapa_columnas: dict | None = None,
+    dtype: type = np.float64
+):
+    """
+    Itera un CSV con cabecera (ej. plant_simulator_output.csv) en DataFrames de
+    `tamano_bloque` filas. `columnas` limita las columnas leídas; si se entrega
+    mapa_columnas (tag -> nombre de columna) cada bloque pasa por tipar_columnas_sensores.
+    """
+    lector = pd.read_csv(file_path, chunksize=tamano_bloque, usecols=columnas)
+    with lector:
+        for bloque in lector:
+            if mapa_columnas is not None:
+                bloque, _ = tipar_columnas_sensores(bloque, mapa_columnas, dtype)
+            yield bloque
+
+
+def leer_excel_por_bloques(
+    file_path: str,
+    tamano_bloque: int = TAMANO_BLOQUE_HISTORICO,
+    mapa_columnas: dict | None = None,
+    dtype: type = np.float64
+) -> tuple[pd.Series, Any]:
+    """
+    Lee un XLSX con el mismo formato que load_sensor_data_from_excel (nombres en la fila 2,
+    datos desde la fila 5) usando el modo read_only de openpyxl, fila a fila.
+    Retorna (sensor_names_with_cols, iterador de bloques). Los bloques usan índices de
+    columna enteros, compatibles con build_tag_column_map; con mapa_columnas se tipan.
+    El libro se cierra al agotar el iterador.
+    """
+    from openpyxl import load_workbook
+
+    libro = load_workbook(file_path, read_only=True, data_only=True)
+    filas = libro.active.iter_rows(values_only=True)
+    encabezado = []
+    for _ in range(5):
+        fila = next(filas, None)
+        if fila is None:
+            break
+        encabezado.append(fila)
+    nombres = encabezado[2] if len(encabezado) > 2 else ()
+    sensor_names_with_cols = pd.Series(list(nombres), index=range(len(nombres)), dtype=object)
+
+    def _bloques():
+        try:
+            inicio = 0
+            pendientes = []
+            for fila in filas:
+                pendientes.append(fila)
+                if len(pendientes) == tamano_bloque:
+                    yield _bloque_excel(pendientes, inicio)
+                    inicio += len(pendientes)
+                    pendientes = []
+            if pendientes:
+                yield _bloque_excel(pendientes, inicio)
+        finally:
+            libro.close()
+
+    def _bloque_excel(pendientes, inicio):
+        bloque = pd.DataFrame.from_records(pendientes)
+        bloque.index = pd.RangeIndex(inicio, inicio + len(bloque))
+        if mapa_columnas is not None:
+            bloque, _ = tipar_columnas_sensores(bloque, mapa_columnas, dtype)
+        return bloque
+
+    return sensor_names_with_cols, _bloques()
+
+
 # === Constantes de Umbrales de Alarma (Extraídas de app.py) ===
 TEMP_MAX_CRITICA = 80.0
 TEMP_MIN_PRODUCCION = 65.0
@@ -190,108 +481,27 @@ def evaluar_sensores_json(
     fila_index: int,
     mapa_columnas: dict,
     setpoints_dict: dict,
-    config_json_sensores: dict
+    config_json_sensores: dict,
+    plan: "tuple[CondicionCompilada, ...] | None" = None
 ) -> list[str]:
     """
     Evalúa las condiciones definidas en el JSON de configuración para una fila de datos de sensores.
     Retorna una lista de mensajes de alerta.
+    Incluye custom_eval, relacion_control y estado_logico cuando sus tags (físicos o
+    lógicos derivables) están en la fila.
+    Para evaluar muchas filas conviene compilar el plan una vez con compilar_plan_alarmas y
+    pasarlo en `plan`; si no se entrega, se compila en cada llamada.
     """
+    if plan is None:
+        plan = compilar_plan_alarmas(config_json_sensores, setpoints_dict)
+    datos_fila = {tag: fila_datos.get(col_idx) for tag, col_idx in mapa_columnas.items()}
+    datos_fila = derivar_tags_logicos(datos_fila)
     alertas_json = []
 
-    for tag_principal_json, info_sensor in config_json_sensores.items():
-        # Los tags "custom_eval", "relacion_control" y "estado_logico" no se manejan en esta función
-        # porque requieren lógica de sistema más avanzada o evaluación de múltiples tags que
-        # no están directamente disponibles en la evaluación por fila de sensor individual.
-        # Estos se manejarán en una capa superior de la lógica de negocio.
-
-        for i, condicion_config in enumerate(info_sensor.get("condiciones", [])):
-            tipo_condicion = condicion_config.get("tipo")
-            # Ignoramos los tipos de condición complejos aquí
-            if tipo_condicion in ["custom_eval", "relacion_control", "estado_logico"]:
-                continue
-
-            nombre_equipo = condicion_config.get("nombre_equipo", info_sensor.get("nombre_equipo", tag_principal_json))
-            descripcion_alerta_plantilla = condicion_config.get("descripcion", f"Condición {i+1} para {tag_principal_json}")
-
-            if tipo_condicion in ["absoluto", "relativo_a_SP", None]:
-                col_idx = mapa_columnas.get(tag_principal_json)
-                if col_idx is None:
-                    continue
-
-                # Aseguramos que el acceso a fila_datos sea seguro
-                valor_sensor = fila_datos.get(col_idx)
-                if valor_sensor is None:
-                    continue
-
-                try:
-                    valor_sensor_num = pd.to_numeric(valor_sensor)
-                except (ValueError, TypeError):
-                    continue
-
-                if tipo_condicion is None: # Si no se especifica, asumimos absoluto
-                    tipo_condicion = "absoluto"
-                    # Aseguramos que condicion_config tenga los campos necesarios para evaluar
-                    condicion_config_para_eval = {
-                        "tipo": "absoluto",
-                        "operador": condicion_config.get("operador"),
-                        "valor": condicion_config.get("valor")
-                    }
-                else:
-                    condicion_config_para_eval = condicion_config
-
-
-                if evaluar_condicion(valor_sensor_num, condicion_config_para_eval, tag_principal_json, setpoints_dict):
-                    alertas_json.append(f"ALERTA JSON (Fila {fila_index}): {descripcion_alerta_plantilla} [{nombre_equipo}] (Sensor: {tag_principal_json}, Valor: {valor_sensor_num:.2f})")
-
-            elif tipo_condicion == "multiple_and":
-                sub_condiciones_lista = condicion_config.get("condiciones", [])
-                if not sub_condiciones_lista:
-                    continue
-
-                cumple_todas = True
-                for sub in sub_condiciones_lista:
-                    sub_c = sub.get("condicion", {})
-                    tag = sub_c.get("tag")
-                    operador = sub_c.get("operador")
-                    valor_esperado = sub_c.get("valor_esperado")
-                    
-                    if tag is None: # Si no hay tag, no podemos evaluar la sub-condición
-                        cumple_todas = False
-                        break
-
-                    # Necesitamos el valor actual del sensor 'tag' en la fila_datos
-                    col_idx_sub = mapa_columnas.get(tag)
-                    if col_idx_sub is None:
-                        cumple_todas = False
-                        break
-                    
-                    valor_sensor_sub = fila_datos.get(col_idx_sub)
-                    if valor_sensor_sub is None:
-                        cumple_todas = False
-                        break
-
-                    try:
-                        # Convertir a numérico solo si el valor esperado es numérico
-                        valor_para_comparar = pd.to_numeric(valor_sensor_sub) if isinstance(valor_esperado, (int, float)) else valor_sensor_sub
-                    except (ValueError, TypeError):
-                        cumple_todas = False
-                        break
-
-                    # Evaluar la sub-condición (lógica similar a evaluar_condicion pero simplificada)
-                    ok = False
-                    if operador == "==": ok = (valor_para_comparar == valor_esperado)
-                    elif operador == "!=": ok = (valor_para_comparar != valor_esperado)
-                    elif operador == "<": ok = (valor_para_comparar < valor_esperado)
-                    elif operador == ">": ok = (valor_para_comparar > valor_esperado)
-                    elif operador == "<=": ok = (valor_para_comparar <= valor_esperado)
-                    elif operador == ">=": ok = (valor_para_comparar >= valor_esperado)
-                    
-                    if not ok:
-                        cumple_todas = False
-                        break
-
-                if cumple_todas:
-                    alertas_json.append(f"ALERTA JSON (Fila {fila_index}): {descripcion_alerta_plantilla} [{nombre_equipo}] (Condiciones 'multiple_and' cumplidas)")
+    for condicion in plan:
+        valor = _evaluar_terminos(condicion.terminos, datos_fila)
+        if valor is not None:
+            alertas_json.append(f"ALERTA JSON (Fila {fila_index}): {condicion.descripcion} [{condicion.nombre_equipo}] {_detalle_alerta(condicion, valor)}")
 
     return alertas_json
 
@@ -310,33 +520,507 @@ def determinar_modo_actual(cal: float, agua: float, rotary_val: float, screw_val
         return "esperando"  # Caso de respaldo
 
 
-class ReactivityMonitor:
+# === Almacenamiento acotado de curvas de reactividad ===
+CAPACIDAD_CURVAS = 256          # Curvas completadas que se conservan en memoria
+VENTANA_MAX_CURVA_S = 900.0     # Tiempo máximo para llegar a +40°C (15 min) antes de declarar NO_REACCIONA
+PERIODO_MUESTREO_S = 1.0        # Muestreo previsto; dimensiona el buffer de la curva en curso
+RESULTADO_NO_REACCIONA = "NO_REACCIONA"  # Ventana vencida sin +40°C (ej. cal ahogada)
+RESULTADO_ABORTADA = "ABORTADA"          # El tornillo se detuvo antes de +40°C
+LIMITE_ALTA_S = 180.0           # Hasta 3 minutos a +40°C: ALTA
+LIMITE_MEDIANA_S = 360.0        # Hasta 6 minutos a +40°C: MEDIANA (más: BAJA)
+MIN_MUESTRAS_AJUSTE = 5         # Muestras para considerar válido el ajuste de tau/ΔT
+MIN_MUESTRAS_PREDICCION = 30    # Muestras antes de intentar predecir la clase de la curva en curso
+# Ajuste en línea (EstimadorExponencial): constantes de tiempo donde se evalúa el ajuste y criterios
+# para publicar una predicción solo cuando la clase no es ambigua.
+TAUS_CANDIDATOS_S = np.geomspace(2.0, 3600.0, 256)  # ~3% entre candidatas; solo se recorren al evaluar
+ESCALA_TIEMPO_S = 60.0          # Los regresores del estimador van en minutos (mejor condicionados que en s)
+CHI2_PREDICCION = 15.0          # Umbral de verosimilitud perfilada (χ² con 1 g.l., ~99,99%)
+MARGEN_RUIDO_CRUCE = 4.0        # Desvíos de ruido: una muestra puede cruzar +40°C antes que la curva media
+MARGEN_RUIDO_CRUCE_TARDIO = 2.0  # ... o después (ruido autocorrelacionado que la mantiene por debajo)
+RUIDO_MIN_TEMP = 0.05           # °C; piso del ruido estimado (resolución del transmisor)
+RHO_MAX_RUIDO = 0.95            # Autocorrelación máxima del ruido que se corrige
+PERSISTENCIA_PREDICCION_S = 10.0  # La clase debe ser confiable y estable este tiempo antes de publicarse
+HORIZONTE_EXTRAPOLACION = 3.0   # Descartar un cruce en un borde exige haber visto al menos 1/3 del tiempo hasta él
+ARCHIVO_CURVAS = "curvas_reactividad.jsonl"
+
+
+class MuestrasCurva(NamedTuple):
+    """Muestras de una curva como arreglos compactos: tiempos en ns desde epoch (UTC) y temperaturas."""
+    tiempos_ns: np.ndarray   # int64
+    temps: np.ndarray        # float64
+
+    def timestamps(self) -> pd.DatetimeIndex:
+        return pd.to_datetime(self.tiempos_ns, unit="ns", utc=True)
+
+
+class BufferCurva:
+    """
+    Muestras de la curva en curso en arreglos preasignados (tiempos en ns y temperaturas).
+    Si la curva supera la capacidad (muestreo más rápido que el previsto), se descarta una de
+    cada dos muestras guardadas y desde ahí se guarda una de cada 2, 4, ...: la memoria no crece.
+    La última muestra recibida (la que cierra la curva) siempre queda incluida.
+    """
+
+    def __init__(self, capacidad: int):
+        capacidad = max(int(capacidad), 2)
+        self.tiempos_ns = np.empty(capacidad, dtype=np.int64)
+        self.temps = np.empty(capacidad, dtype=np.float64)
+        self.reiniciar()
+
+    def reiniciar(self) -> None:
+        self.n = 0
+        self.paso = 1              # Se guarda una de cada `paso` muestras recibidas
+        self.recibidas = 0
+        self._ultima: tuple[int, float] | None = None
+        self._ultima_guardada = False
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _compactar(self) -> None:
+        conservar = (self.n + 1) // 2
+        self.tiempos_ns[:conservar] = self.tiempos_ns[:self.n:2]
+        self.temps[:conservar] = self.temps[:self.n:2]
+        self.n = conservar
+        self.paso *= 2
+
+    def agregar(self, tiempo_ns: int, temp: float) -> None:
+        if self.recibidas % self.paso == 0 and self.n == len(self.temps):
+            self._compactar()
+        self._ultima_guardada = self.recibidas % self.paso == 0
+        if self._ultima_guardada:
+            self.tiempos_ns[self.n] = tiempo_ns
+            self.temps[self.n] = temp
+            self.n += 1
+        self.recibidas += 1
+        self._ultima = (tiempo_ns, temp)
+
+    def extender(self, tiempos_ns: np.ndarray, temps: np.ndarray) -> None:
+        """Igual que llamar agregar por cada muestra, pero copiando por tramos."""
+        total = len(temps)
+        if total == 0:
+            return
+        self._ultima_guardada = False
+        hecho = 0
+        while hecho < total:
+            primero = hecho + (-self.recibidas) % self.paso  # Primera muestra del tramo que toca guardar
+            if primero >= total:
+                self.recibidas += total - hecho
+                break
+            if self.n == len(self.temps):
+                self._compactar()
+                continue
+            seleccion = np.arange(primero, total, self.paso)[:len(self.temps) - self.n]
+            self.tiempos_ns[self.n:self.n + len(seleccion)] = tiempos_ns[seleccion]
+            self.temps[self.n:self.n + len(seleccion)] = temps[seleccion]
+            self.n += len(seleccion)
+            siguiente = int(seleccion[-1]) + 1
+            self._ultima_guardada = siguiente == total
+            self.recibidas += siguiente - hecho
+            hecho = siguiente
+        self._ultima = (int(tiempos_ns[-1]), float(temps[-1]))
+
+    def muestras(self) -> MuestrasCurva:
+        """Copia compacta de las muestras guardadas, más la última recibida si quedó fuera por el submuestreo."""
+        tiempos_ns, temps = self.tiempos_ns[:self.n].copy(), self.temps[:self.n].copy()
+        if self._ultima is not None and not self._ultima_guardada:
+            tiempos_ns = np.append(tiempos_ns, self._ultima[0])
+            temps = np.append(temps, self._ultima[1])
+        return MuestrasCurva(tiempos_ns, temps)
+
+
+def _reducir_muestras(muestras: MuestrasCurva, max_muestras: int | None = None) -> MuestrasCurva:
+    """
+    Si se indica max_muestras y la curva lo supera, conserva puntos equiespaciados,
+    siempre incluidos el primero y el último (el cierre de la curva).
+    """
+    if max_muestras is None or len(muestras.temps) <= max_muestras:
+        return muestras
+    indices = np.unique(np.linspace(0, len(muestras.temps) - 1, max(max_muestras, 2)).round().astype(np.int64))
+    return MuestrasCurva(muestras.tiempos_ns[indices], muestras.temps[indices])
+
+
+def _curva_a_json(curva: dict) -> str:
+    registro = {
+        clave: (valor.isoformat() if isinstance(valor, datetime) else valor)
+        for clave, valor in curva.items()
+        if clave != "datos"
+    }
+    registro["tiempos_ns"] = curva["datos"].tiempos_ns.tolist()
+    registro["temps"] = curva["datos"].temps.tolist()
+    return json.dumps(registro, ensure_ascii=False)
+
+
+def _curva_desde_json(linea: str) -> dict:
+    registro = json.loads(linea)
+    curva = {clave: valor for clave, valor in registro.items() if clave not in ("tiempos_ns", "temps")}
+    curva["timestamp_inicio"] = pd.Timestamp(curva["timestamp_inicio"])
+    curva["timestamp_fin"] = pd.Timestamp(curva["timestamp_fin"])
+    curva["datos"] = MuestrasCurva(
+        np.asarray(registro["tiempos_ns"], dtype=np.int64),
+        np.asarray(registro["temps"], dtype=np.float64),
+    )
+    return curva
+
+
+class AlmacenCurvas:
+    """
+    Buffer circular de curvas completadas: conserva en memoria las últimas `capacidad` y, al
+    desbordarse, escribe la más antigua como una línea JSON en `directorio_archivo`/curvas_reactividad.jsonl
+    (o la descarta si no hay directorio). Así la memoria del proceso no crece con el tiempo de servicio.
+    Se comporta como una secuencia de solo lectura de las curvas en memoria (len, iteración, índice).
+    """
+
+    def __init__(self, capacidad: int = CAPACIDAD_CURVAS, directorio_archivo: str | Path | None = None):
+        if capacidad <= 0:
+            raise ValueError("capacidad debe ser mayor que 0")
+        self._curvas: deque[dict] = deque(maxlen=capacidad)
+        self.ruta_archivo = Path(directorio_archivo) / ARCHIVO_CURVAS if directorio_archivo is not None else None
+        self.archivadas = 0   # Curvas escritas al archivo
+        self.descartadas = 0  # Curvas que salieron del buffer sin archivo configurado
+
+    def append(self, curva: dict) -> None:
+        if len(self._curvas) == self._curvas.maxlen:
+            self._archivar(self._curvas[0])
+        self._curvas.append(curva)
+
+    def _archivar(self, curva: dict) -> None:
+        if self.ruta_archivo is None:
+            self.descartadas += 1
+            return
+        self.ruta_archivo.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.ruta_archivo, "a", encoding="utf-8") as f:
+            f.write(_curva_a_json(curva) + "\n")
+        self.archivadas += 1
+
+    def leer_archivo(self) -> Iterator[dict]:
+        """Recorre las curvas archivadas, de la más antigua a la más reciente, sin cargarlas todas."""
+        if self.ruta_archivo is None or not self.ruta_archivo.is_file():
+            return
+        with open(self.ruta_archivo, "r", encoding="utf-8") as f:
+            for linea in f:
+                if linea.strip():
+                    yield _curva_desde_json(linea)
+
+    def __len__(self) -> int:
+        return len(self._curvas)
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self._curvas)
+
+    def __getitem__(self, indice: int) -> dict:
+        return self._curvas[indice]
+
+
+def _clasificar_duracion(duracion_seg: float) -> str:
+    """Clase de reactividad según el tiempo hasta +40°C."""
+    tipo = "BAJA"
+    if duracion_seg <= LIMITE_ALTA_S: # 3 minutos
+        tipo = "ALTA"
+    elif duracion_seg <= LIMITE_MEDIANA_S: # 6 minutos
+        tipo = "MEDIANA"
+    return tipo
+
+
+# Clases que puede predecir EstimadorExponencial, por código (índice)
+CLASES_PREDICCION = ("ALTA", "MEDIANA", "BAJA", RESULTADO_NO_REACCIONA)
+
+
+class AjusteExponencial(NamedTuple):
+    """
+    Resultado de _ajuste_exponencial, un valor por curva (escalares o arreglos). NaN / -1 donde
+    todavía no hay un ajuste válido.
+    """
+    tau_s: Any        # Constante de tiempo del mejor ajuste
+    delta_t: Any      # Amplitud ΔT de la exponencial
+    t40_s: Any        # Tiempo estimado desde el inicio hasta +40°C (inf si no llegaría)
+    clase: Any        # Código en CLASES_PREDICCION de la clase que tendría la curva
+    confiable: Any    # True si ninguna otra clase es compatible con los datos
+
+
+def _ajuste_exponencial(info, m2, sd2, transcurrido_s, ventana_max_s) -> AjusteExponencial:
+    """
+    Resuelve el ajuste de EstimadorExponencial desde su matriz de información `info` = Σ z·zᵀ, con
+    z = [1, t, I, u]. La primera dimensión puede ser la línea (info de forma (L, 4, 4); m2, sd2 y
+    transcurrido_s de forma (L,)).
+
+    Integrando τ·u' = c + ΔT − u queda u = c + ((c + ΔT)/τ)·t − I/τ, con I = ∫u dt: lineal en
+    (c, (c + ΔT)/τ, −1/τ), así que la solución de mínimos cuadrados sale de `info`. Para decidir la
+    clase se necesita además la incertidumbre de τ, de modo que el ajuste se perfila: con τ fijo
+    quedan dos parámetros en forma cerrada, se recorre TAUS_CANDIDATOS_S (un paso vectorizado) y el
+    mejor τ es el de menor suma de residuos al cuadrado (SSE). El ruido σ² sale del SSE y su
+    autocorrelación ρ de las segundas diferencias de u (para ruido AR(1),
+    E[(Δ²u)²] = 2σ²(1 − ρ)(3 − ρ)); la varianza se infla por (1 + ρ)/(1 − ρ).
+
+    La clase es confiable si ningún borde de clase posterior a lo transcurrido (LIMITE_ALTA_S,
+    LIMITE_MEDIANA_S, la ventana) es un cruce compatible con los datos: para ningún τ el SSE mínimo
+    con la curva pasando por el nivel de cruce en ese borde supera al SSE óptimo en menos de
+    CHI2_PREDICCION·σ². El nivel de cruce va de 40 − MARGEN_RUIDO_CRUCE·σ a
+    40 + MARGEN_RUIDO_CRUCE_TARDIO·σ, porque el monitor cierra con la primera muestra que sube 40°C,
+    no con la curva media: el ruido adelanta o atrasa el cruce. Un borde más allá de
+    HORIZONTE_EXTRAPOLACION veces lo transcurrido tampoco se descarta si la curva media todavía no
+    cruzó ahí: con pocos datos el ruido autocorrelacionado se confunde con una meseta.
+    """
+    info = np.asarray(info, dtype=np.float64)
+    m2, sd2 = np.asarray(m2, dtype=np.float64), np.asarray(sd2, dtype=np.float64)
+    transcurrido_s = np.asarray(transcurrido_s, dtype=np.float64)
+    n, st, si, su = (info[..., 0, j, None] for j in range(4))
+    stt, sti, stu = (info[..., 1, j, None] for j in range(1, 4))
+    sii, siu, suu = info[..., 2, 2, None], info[..., 2, 3, None], info[..., 3, 3, None]
+    tau_min = TAUS_CANDIDATOS_S / ESCALA_TIEMPO_S
+    p_integral = -1 / tau_min
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Con τ fijo: u + I/τ = c + a·t, con a = (c + ΔT)/τ
+        det = n * stt - st * st
+        b0 = su - p_integral * si
+        b1 = stu - p_integral * sti
+        c = (stt * b0 - st * b1) / det
+        a = (n * b1 - st * b0) / det
+        sse = np.maximum(suu - 2 * p_integral * siu + p_integral * p_integral * sii - c * b0 - a * b1, 0.0)
+        valido = (n >= MIN_MUESTRAS_AJUSTE) & (det > 1e-9 * n * n)
+        sse = np.where(valido, sse, np.inf)
+
+        k = np.argmin(sse, axis=-1)
+        sse_min = np.take_along_axis(sse, k[..., None], axis=-1)[..., 0]
+        hay_ajuste = np.isfinite(sse_min)
+        c_k = np.take_along_axis(c, k[..., None], axis=-1)[..., 0]
+        a_k = np.take_along_axis(a, k[..., None], axis=-1)[..., 0]
+        tau_k = TAUS_CANDIDATOS_S[k]
+        delta_k = a_k * tau_min[k] - c_k
+
+        n = n[..., 0]
+        sigma2 = np.maximum(sse_min / np.maximum(n - 3, 1), RUIDO_MIN_TEMP ** 2)
+        q = sd2 / m2 / (2 * sigma2)
+        rho = np.where(m2 >= 10, np.clip(2 - np.sqrt(1 + q), 0.0, RHO_MAX_RUIDO), 0.0)
+        presupuesto = (CHI2_PREDICCION * sigma2 * (1 + rho) / (1 - rho))[..., None] - (sse - sse_min[..., None])
+
+        # Cruce de la curva media del mejor τ (nunca antes de lo ya transcurrido sin cruzar)
+        x_cruce = (40 - c_k) / delta_k
+        t40 = np.where((delta_k > 0) & (x_cruce < 1), -tau_k * np.log1p(-np.clip(x_cruce, 0, None)), np.inf)
+        t40 = np.maximum(t40, transcurrido_s)
+        clase = np.where(t40 > ventana_max_s, 3, np.where(t40 <= LIMITE_ALTA_S, 0, np.where(t40 <= LIMITE_MEDIANA_S, 1, 2)))
+
+        nivel_min = (40 - MARGEN_RUIDO_CRUCE * np.sqrt(sigma2))[..., None]
+        nivel_max = (40 + MARGEN_RUIDO_CRUCE_TARDIO * np.sqrt(sigma2))[..., None]
+        ambigua = np.zeros(np.shape(n), dtype=bool)
+        for borde in (LIMITE_ALTA_S, LIMITE_MEDIANA_S, ventana_max_s):
+            # u(borde) = w0·c + w1·a para cada τ
+            w0 = np.exp(-borde / TAUS_CANDIDATOS_S)
+            w1 = tau_min * -np.expm1(-borde / TAUS_CANDIDATOS_S)
+            ajustado = w0 * c + w1 * a
+            varianza = (stt * w0 * w0 - 2 * st * w0 * w1 + n[..., None] * w1 * w1) / det
+            distancia = np.maximum(0.0, np.maximum(ajustado - nivel_max, nivel_min - ajustado))
+            compatible = valido & (distancia * distancia / varianza <= presupuesto)
+            ajustado_k = np.take_along_axis(ajustado, k[..., None], axis=-1)[..., 0]
+            lejano = (borde > HORIZONTE_EXTRAPOLACION * transcurrido_s) & (ajustado_k < 40)
+            ambigua |= (borde > transcurrido_s) & (compatible.any(axis=-1) | lejano)
+
+    return AjusteExponencial(
+        tau_s=np.where(hay_ajuste, tau_k, np.nan),
+        delta_t=np.where(hay_ajuste, delta_k, np.nan),
+        t40_s=np.where(hay_ajuste, t40, np.nan),
+        clase=np.where(hay_ajuste, clase, -1),
+        confiable=hay_ajuste & ~ambigua,
+    )
+
+
+def _prediccion(ajuste: AjusteExponencial, transcurrido_s: float, muestras: int) -> dict:
+    """Registro de la predicción de una curva en curso a partir de su AjusteExponencial (escalar)."""
+    t40_s = float(ajuste.t40_s)
+    return {
+        "tau_s": float(ajuste.tau_s),
+        "delta_t": float(ajuste.delta_t),
+        "t40_s": t40_s if np.isfinite(t40_s) else None,
+        "tipo_predicho": CLASES_PREDICCION[int(ajuste.clase)],
+        "transcurrido_s": transcurrido_s,
+        "muestras": muestras,
+    }
+
+
+def _persistir_prediccion(ajuste: AjusteExponencial, n, clase_anterior, desde_ns, tiempo_ns):
+    """
+    Filtro de persistencia de las predicciones (escalares o arreglos por línea): una clase se
+    publica recién cuando fue confiable, y la misma, en todas las evaluaciones de los últimos
+    PERSISTENCIA_PREDICCION_S segundos. Retorna (clase_anterior, desde_ns, publicar) actualizados.
+    """
+    confiable = ajuste.confiable & (np.asarray(n) >= MIN_MUESTRAS_PREDICCION)
+    desde_ns = np.where(confiable & (ajuste.clase == clase_anterior), desde_ns, tiempo_ns)
+    clase_anterior = np.where(confiable, ajuste.clase, -1)
+    publicar = confiable & (np.asarray(tiempo_ns) - desde_ns >= PERSISTENCIA_PREDICCION_S * 1e9)
+    return clase_anterior, desde_ns, publicar
+
+
+class EstimadorExponencial:
+    """
+    Ajuste en línea de la curva de apagado T(t) = T_inicio + c + ΔT(1 − e^{−t/τ}), con t desde el
+    inicio de la curva. Sobre la integral I = ∫(T − T_inicio) dt (trapecios entre muestras) el
+    modelo es lineal, así que basta con la matriz de información Σ z·zᵀ de z = [1, t, I, u]
+    (mínimos cuadrados recursivos sin olvido): cada muestra actualiza 16 sumas, sin reajustar
+    sobre las muestras anteriores ni depender de τ. Se ajusta T directamente y no T contra la
+    muestra anterior, de modo que el ruido del sensor no sesga τ ni ΔT. Las muestras con NaN se
+    ignoran. Ver _ajuste_exponencial.
+    """
+
     def __init__(self):
+        self.reiniciar(0.0, 0)
+
+    def reiniciar(self, temp_inicio: float, inicio_ns: int) -> None:
+        self.temp_inicio = temp_inicio
+        self.inicio_ns = inicio_ns
+        self.n = 0
+        self.info = np.zeros((4, 4))
+        self.integral = 0.0  # I hasta la última u válida, en °C·min
+        self.m2 = 0          # Segundas diferencias acumuladas (autocorrelación del ruido)
+        self.sd2 = 0.0
+        self.u_1 = self.u_2 = np.nan  # Las dos últimas u válidas
+        self.t_ultimo_ns: int | None = None
+
+    def agregar(self, tiempo_ns: int, temp: float) -> None:
+        u = temp - self.temp_inicio
+        if u != u:
+            return
+        t = (tiempo_ns - self.inicio_ns) / 1e9 / ESCALA_TIEMPO_S
+        if self.u_1 == self.u_1:
+            self.integral += 0.5 * (u + self.u_1) * (t - (self.t_ultimo_ns - self.inicio_ns) / 1e9 / ESCALA_TIEMPO_S)
+        z = np.array([1.0, t, self.integral, u])
+        self.info += np.outer(z, z)
+        self.n += 1
+        if self.u_2 == self.u_2:
+            d2 = u - 2 * self.u_1 + self.u_2
+            self.m2 += 1
+            self.sd2 += d2 * d2
+        self.u_2, self.u_1 = self.u_1, u
+        self.t_ultimo_ns = tiempo_ns
+
+    def agregar_arreglo(self, tiempos_ns: np.ndarray, temps: np.ndarray) -> None:
+        """Igual que llamar agregar por cada muestra, con sumas vectorizadas."""
+        u = np.asarray(temps, dtype=np.float64) - self.temp_inicio
+        validos = ~np.isnan(u)
+        u, tiempos_ns = u[validos], np.asarray(tiempos_ns)[validos]
+        if u.size == 0:
+            return
+        t = (tiempos_ns - self.inicio_ns) / 1e9 / ESCALA_TIEMPO_S
+        # Trapecios desde la última u válida del lote anterior (si hay), acumulados en el mismo orden que agregar
+        t_previo = np.nan if self.t_ultimo_ns is None else (self.t_ultimo_ns - self.inicio_ns) / 1e9 / ESCALA_TIEMPO_S
+        trapecios = 0.5 * (u + np.concatenate(([self.u_1], u[:-1]))) * np.diff(t, prepend=t_previo)
+        trapecios[0] = np.nan_to_num(trapecios[0])
+        integral = np.cumsum(np.concatenate(([self.integral], trapecios)))[1:]
+        z = np.column_stack([np.ones_like(t), t, integral, u])
+        self.info += z.T @ z
+        self.integral = float(integral[-1])
+        self.n += u.size
+        previas = np.concatenate(([self.u_2, self.u_1], u))
+        d2 = previas[2:] - 2 * previas[1:-1] + previas[:-2]
+        d2 = d2[~np.isnan(d2)]
+        self.m2 += d2.size
+        self.sd2 += float(np.dot(d2, d2))
+        self.u_2, self.u_1 = previas[-2], previas[-1]
+        self.t_ultimo_ns = int(tiempos_ns[-1])
+
+    @property
+    def transcurrido_s(self) -> float:
+        return 0.0 if self.t_ultimo_ns is None else (self.t_ultimo_ns - self.inicio_ns) / 1e9
+
+    def evaluar(self, ventana_max_s: float = VENTANA_MAX_CURVA_S) -> AjusteExponencial:
+        return _ajuste_exponencial(self.info, self.m2, self.sd2, self.transcurrido_s, ventana_max_s)
+
+    def ajuste(self) -> tuple[float, float]:
+        """(tau_s, delta_t) actuales; NaN si todavía no hay un ajuste válido."""
+        ajuste = self.evaluar()
+        return float(ajuste.tau_s), float(ajuste.delta_t)
+
+
+def _armar_curva(
+    tiempo_inicio: datetime,
+    tiempo_final: datetime,
+    temp_inicio: float,
+    temp_fin: float,
+    tipo: str | None,
+    muestras: MuestrasCurva,
+    ajuste: tuple[float, float] = (np.nan, np.nan)
+) -> dict:
+    """
+    Registro de una curva terminada. Sin `tipo`, la curva llegó a +40°C y se clasifica por duración.
+    `ajuste` es el (tau_s, delta_t) final de EstimadorExponencial (None en el registro si no hubo ajuste válido).
+    """
+    duracion_seg = int((tiempo_final - tiempo_inicio).total_seconds())
+    minutos = duracion_seg // 60
+    segundos = duracion_seg % 60
+
+    if tipo is None:
+        tipo = _clasificar_duracion(duracion_seg)
+
+    # print(f"[{tiempo_final.strftime('%Y-%m-%d %H:%M:%S')}] ✅ Reactividad de cal: {tipo} – Aumento de 40°C en {minutos} min {segundos} s (de {temp_inicio:.2f}°C a {temp_fin:.2f}°C)")
+
+    return {
+        "timestamp_inicio": tiempo_inicio,
+        "timestamp_fin": tiempo_final,
+        "temp_inicio": temp_inicio,
+        "temp_fin": temp_fin,
+        "tipo": tipo,
+        "minutos": minutos,
+        "segundos": segundos,
+        "tau_s": float(ajuste[0]) if np.isfinite(ajuste[0]) else None,
+        "delta_t": float(ajuste[1]) if np.isfinite(ajuste[1]) else None,
+        "datos": muestras
+    }
+
+
+class ReactivityMonitor:
+    def __init__(
+        self,
+        capacidad_curvas: int = CAPACIDAD_CURVAS,
+        max_muestras_curva: int | None = None,
+        directorio_archivo: str | Path | None = None,
+        ventana_max_s: float = VENTANA_MAX_CURVA_S,
+        periodo_muestreo_s: float = PERIODO_MUESTREO_S,
+        abortar_con_tornillo_detenido: bool = True
+    ):
         self.reactividad_en_proceso = False
         self.tiempo_inicio_reactividad: datetime | None = None
         self.temp_inicio_reactividad: float | None = None
-        self.lista_temperaturas_reactividad: list[tuple[datetime, float]] = []
-        self.curvas_reactividad: list[dict] = [] # Para almacenar curvas completadas
+        # Muestras de la curva en curso, en un buffer preasignado para la ventana máxima
+        self.muestras_en_proceso = BufferCurva(int(np.ceil(ventana_max_s / periodo_muestreo_s)) + 2)
+        # Curvas completadas: las últimas `capacidad_curvas` en memoria, el resto al archivo (si hay directorio)
+        self.curvas_reactividad = AlmacenCurvas(capacidad_curvas, directorio_archivo)
+        self.max_muestras_curva = max_muestras_curva  # Si se indica, las muestras de cada curva se reducen a este máximo
+        self.ventana_max_s = ventana_max_s  # Sin +40°C dentro de esta ventana la curva termina como NO_REACCIONA
+        self.abortar_con_tornillo_detenido = abortar_con_tornillo_detenido  # Si el tornillo para antes de +40°C: ABORTADA
         self.screw_anterior: float = 0.0 # Valor del tornillo de la iteración anterior
+        self.estimador = EstimadorExponencial()  # Ajuste en línea de tau/ΔT de la curva en curso
+        self._inicio_ns = 0
+        self._prediccion_clase = -1      # Última clase confiable evaluada por prediccion() (-1: ninguna)
+        self._prediccion_desde_ns = 0    # Desde cuándo se mantiene esa clase
+
+    def _iniciar_curva(self, timestamp_fila: datetime, temp: float, inicio_ns: int) -> None:
+        self.tiempo_inicio_reactividad = timestamp_fila
+        self.temp_inicio_reactividad = temp
+        self.reactividad_en_proceso = True
+        self.muestras_en_proceso.reiniciar()  # Reiniciar el buffer para la nueva curva
+        self.estimador.reiniciar(temp, inicio_ns)
+        self._inicio_ns = inicio_ns
+        self._prediccion_clase = -1
 
     def process_reactivity(self, timestamp_fila: datetime, temp: float, screw_val: float) -> list[dict]:
         """
         Procesa la lógica de la curva de reactividad con los datos actuales del sensor.
         Retorna una lista de nuevas curvas de reactividad completadas en este paso.
+        Una curva termina al subir 40°C (ALTA/MEDIANA/BAJA), si el tornillo se detiene antes
+        (ABORTADA) o si se supera la ventana máxima sin llegar (NO_REACCIONA).
         """
         nuevas_curvas_completadas = []
+        tiempo_ns = pd.Timestamp(timestamp_fila).value
 
         # Detección de inicio de reactividad
         if es_cero(self.screw_anterior) and not es_cero(screw_val) and not self.reactividad_en_proceso:
-            self.tiempo_inicio_reactividad = timestamp_fila
-            self.temp_inicio_reactividad = temp
-            self.reactividad_en_proceso = True
-            self.lista_temperaturas_reactividad = []  # Reiniciar la lista para la nueva curva
+            self._iniciar_curva(timestamp_fila, temp, tiempo_ns)
             # print(f"[{self.tiempo_inicio_reactividad.strftime('%Y-%m-%d %H:%M:%S')}] 🌡️ Inicio curva reactividad. Temp inicial: {self.temp_inicio_reactividad:.2f}°C")
 
         if self.reactividad_en_proceso:
             # Acumular puntos de temperatura
-            self.lista_temperaturas_reactividad.append((timestamp_fila, temp))
+            self.muestras_en_proceso.agregar(tiempo_ns, temp)
+            self.estimador.agregar(tiempo_ns, temp)
 
             # Si ya tenemos una temperatura inicial
             if self.temp_inicio_reactividad is not None:
@@ -344,43 +1028,388 @@ class ReactivityMonitor:
 
                 # Detección de aumento de 40°C
                 if aumento >= 40:
-                    tiempo_final = timestamp_fila
-                    duracion_seg = int((tiempo_final - self.tiempo_inicio_reactividad).total_seconds())
-                    minutos = duracion_seg // 60
-                    segundos = duracion_seg % 60
-
-                    tipo = "BAJA"
-                    if duracion_seg <= 180: # 3 minutos
-                        tipo = "ALTA"
-                    elif duracion_seg <= 360: # 6 minutos
-                        tipo = "MEDIANA"
-                    
-                    # print(f"[{tiempo_final.strftime('%Y-%m-%d %H:%M:%S')}] ✅ Reactividad de cal: {tipo} – Aumento de 40°C en {minutos} min {segundos} s (de {self.temp_inicio_reactividad:.2f}°C a {temp:.2f}°C)")
-
-                    curva_completa = {
-                        "timestamp_inicio": self.tiempo_inicio_reactividad,
-                        "timestamp_fin": tiempo_final,
-                        "temp_inicio": self.temp_inicio_reactividad,
-                        "temp_fin": temp,
-                        "tipo": tipo,
-                        "minutos": minutos,
-                        "segundos": segundos,
-                        "datos": self.lista_temperaturas_reactividad.copy()
-                    }
-                    self.curvas_reactividad.append(curva_completa)
-                    nuevas_curvas_completadas.append(curva_completa) # Retornar la nueva curva
-
-                    # Resetear el estado para la próxima detección
-                    self.reactividad_en_proceso = False
-                    self.tiempo_inicio_reactividad = None
-                    self.temp_inicio_reactividad = None
-                    self.lista_temperaturas_reactividad = []
+                    nuevas_curvas_completadas.append(self._cerrar_curva(timestamp_fila, temp)) # Retornar la nueva curva
+                elif self.abortar_con_tornillo_detenido and es_cero(screw_val):
+                    nuevas_curvas_completadas.append(self._cerrar_curva(timestamp_fila, temp, RESULTADO_ABORTADA))
+                elif tiempo_ns - self._inicio_ns > self.ventana_max_s * 1e9:
+                    nuevas_curvas_completadas.append(self._cerrar_curva(timestamp_fila, temp, RESULTADO_NO_REACCIONA))
 
         # Actualizar screw_anterior para la próxima iteración
         self.screw_anterior = screw_val
         
         return nuevas_curvas_completadas
 
+    def _cerrar_curva(self, tiempo_final: datetime, temp: float, tipo: str | None = None) -> dict:
+        """
+        Registra la curva en proceso como terminada en `tiempo_final` y resetea el estado.
+        Sin `tipo`, la curva llegó a +40°C y se clasifica por duración.
+        """
+        curva_completa = _armar_curva(
+            self.tiempo_inicio_reactividad, tiempo_final, self.temp_inicio_reactividad, temp, tipo,
+            _reducir_muestras(self.muestras_en_proceso.muestras(), self.max_muestras_curva),
+            self.estimador.ajuste(),
+        )
+        self.curvas_reactividad.append(curva_completa)
+
+        # Resetear el estado para la próxima detección
+        self.reactividad_en_proceso = False
+        self.tiempo_inicio_reactividad = None
+        self.temp_inicio_reactividad = None
+        self.muestras_en_proceso.reiniciar()
+        return curva_completa
+
+    def process_reactivity_batch(self, timestamps, temps, screws) -> list[dict]:
+        """
+        Equivalente a llamar process_reactivity fila a fila (mismas curvas y mismo estado final,
+        incluida una curva que quede en proceso para el siguiente lote), pero sin un llamado por fila:
+        los flancos de subida del tornillo salen de es_cero vectorizado sobre todo el arreglo y el
+        cierre de cada curva (+40°C, tornillo detenido o ventana vencida) se busca con NumPy desde su inicio.
+        `timestamps` es cualquier secuencia convertible a DatetimeIndex; temps y screws deben ser
+        numéricos (NaN en el tornillo cuenta como distinto de cero, igual que en es_cero).
+        """
+        tiempos = pd.DatetimeIndex(timestamps)
+        tiempos_ns = tiempos.as_unit("ns").asi8
+        temps = np.asarray(temps, dtype=np.float64)
+        screws = np.asarray(screws, dtype=np.float64)
+        n = len(temps)
+        if n == 0:
+            return []
+
+        # es_cero vectorizado; el primer valor se compara con el tornillo del lote anterior
+        cero = np.abs(screws) < 0.1
+        cero_anterior = np.empty(n, dtype=bool)
+        cero_anterior[0] = es_cero(self.screw_anterior)
+        cero_anterior[1:] = cero[:-1]
+        flancos = np.flatnonzero(cero_anterior & ~cero)
+        detenido = cero if self.abortar_con_tornillo_detenido else None
+
+        nuevas_curvas_completadas = []
+        pos = 0
+        while pos < n:
+            if not self.reactividad_en_proceso:
+                k = np.searchsorted(flancos, pos)
+                if k == len(flancos):
+                    break
+                inicio = int(flancos[k])
+                self._iniciar_curva(tiempos[inicio], float(temps[inicio]), int(tiempos_ns[inicio]))
+                pos = inicio
+
+            fin, tipo = _primer_cierre(
+                temps, tiempos_ns, detenido, pos,
+                self.temp_inicio_reactividad, self._inicio_ns + self.ventana_max_s * 1e9,
+            )
+            hasta = n if fin is None else fin + 1
+            self.muestras_en_proceso.extender(tiempos_ns[pos:hasta], temps[pos:hasta])
+            self.estimador.agregar_arreglo(tiempos_ns[pos:hasta], temps[pos:hasta])
+            if fin is None:
+                break
+            nuevas_curvas_completadas.append(self._cerrar_curva(tiempos[fin], float(temps[fin]), tipo))
+            pos = fin + 1
+
+        self.screw_anterior = float(screws[-1])
+        return nuevas_curvas_completadas
+
+    def prediccion(self) -> dict | None:
+        """
+        Predicción de la curva en curso (tau, ΔT, tiempo estimado a +40°C y clase que tendría),
+        disponible antes del cruce. None si no hay curva en curso o si la clase todavía no es
+        confiable: ver _ajuste_exponencial y _persistir_prediccion. La persistencia se cuenta entre
+        llamadas sucesivas, así que se espera una llamada por muestra o por tick (como PlantRuntime).
+        """
+        estimador = self.estimador
+        if not self.reactividad_en_proceso or estimador.t_ultimo_ns is None:
+            return None
+        ajuste = estimador.evaluar(self.ventana_max_s)
+        clase, desde_ns, publicar = _persistir_prediccion(
+            ajuste, estimador.n, self._prediccion_clase, self._prediccion_desde_ns, estimador.t_ultimo_ns,
+        )
+        self._prediccion_clase, self._prediccion_desde_ns = int(clase), int(desde_ns)
+        if not publicar:
+            return None
+        prediccion = _prediccion(ajuste, estimador.transcurrido_s, estimador.n)
+        prediccion["timestamp_inicio"] = self.tiempo_inicio_reactividad
+        return prediccion
+
+
+def _primer_cierre(
+    temps: np.ndarray,
+    tiempos_ns: np.ndarray,
+    detenido: np.ndarray | None,
+    desde: int,
+    temp_inicio: float,
+    limite_ns: float,
+    aumento: float = 40
+) -> tuple[int | None, str | None]:
+    """
+    Primer índice >= desde en que termina la curva en curso, con el mismo orden de prioridad
+    que process_reactivity: +40°C (tipo None, se clasifica al cerrar), tornillo detenido
+    (ABORTADA) o ventana vencida (NO_REACCIONA). Busca en ventanas que se duplican, así el
+    costo es proporcional al largo de la curva y no al del arreglo.
+    """
+    ancho = 256
+    n = len(temps)
+    while desde < n:
+        hasta = min(n, desde + ancho)
+        sube = temps[desde:hasta] - temp_inicio >= aumento
+        vencida = tiempos_ns[desde:hasta] > limite_ns
+        termina = sube | vencida
+        if detenido is not None:
+            termina |= detenido[desde:hasta]
+        cierres = np.flatnonzero(termina)
+        if cierres.size:
+            i = int(cierres[0])
+            if sube[i]:
+                return desde + i, None
+            if detenido is not None and detenido[desde + i]:
+                return desde + i, RESULTADO_ABORTADA
+            return desde + i, RESULTADO_NO_REACCIONA
+        desde = hasta
+        ancho *= 2
+    return None, None
+
+
+def detectar_curvas_reactividad(timestamps, temps, screws) -> list[dict]:
+    """
+    Curvas de reactividad de una serie completa (ej. un histórico o una corrida del simulador)
+    en un solo paso vectorizado. Mismos registros que ReactivityMonitor fila a fila.
+    """
+    return ReactivityMonitor().process_reactivity_batch(timestamps, temps, screws)
+
+
+class MonitorReactividadMultilinea:
+    """
+    Monitores de reactividad de varias líneas (slakers), identificadas por un id. El estado de
+    todas las líneas se guarda por columnas (un arreglo por variable, una posición por línea),
+    así un tick actualiza todas las líneas con unas pocas operaciones NumPy y el costo casi no
+    depende de la cantidad de líneas. Cada línea se comporta igual que un ReactivityMonitor con
+    los mismos parámetros; solo el cierre de curvas (poco frecuente) se resuelve línea a línea.
+    """
+
+    def __init__(
+        self,
+        lineas: list[str] | tuple[str, ...] = (),
+        capacidad_curvas: int = CAPACIDAD_CURVAS,
+        max_muestras_curva: int | None = None,
+        directorio_archivo: str | Path | None = None,
+        ventana_max_s: float = VENTANA_MAX_CURVA_S,
+        periodo_muestreo_s: float = PERIODO_MUESTREO_S,
+        abortar_con_tornillo_detenido: bool = True
+    ):
+        self.capacidad_curvas = capacidad_curvas
+        self.max_muestras_curva = max_muestras_curva
+        self.directorio_archivo = Path(directorio_archivo) if directorio_archivo is not None else None
+        self.ventana_max_s = ventana_max_s
+        self.abortar_con_tornillo_detenido = abortar_con_tornillo_detenido
+        self.capacidad_buffer = max(int(np.ceil(ventana_max_s / periodo_muestreo_s)) + 2, 2)
+
+        self.lineas: list[str] = []
+        self.indice_linea: dict[str, int] = {}
+        self.curvas: dict[str, AlmacenCurvas] = {}  # Curvas terminadas por línea
+        # Estado por línea (struct-of-arrays)
+        self.en_proceso = np.zeros(0, dtype=bool)
+        self.cero_anterior = np.ones(0, dtype=bool)          # es_cero(screw_anterior); el tornillo arranca en 0
+        self.temp_inicio = np.zeros(0, dtype=np.float64)
+        self.inicio_ns = np.zeros(0, dtype=np.int64)
+        self.tiempo_inicio = np.empty(0, dtype=object)       # Timestamp original, para el registro de la curva
+        # Buffers de curvas en curso: misma lógica que BufferCurva, una fila por línea
+        self.buffer_tiempos_ns = np.empty((0, self.capacidad_buffer), dtype=np.int64)
+        self.buffer_temps = np.empty((0, self.capacidad_buffer), dtype=np.float64)
+        self.buffer_n = np.zeros(0, dtype=np.int64)
+        self.buffer_paso = np.ones(0, dtype=np.int64)
+        self.buffer_recibidas = np.zeros(0, dtype=np.int64)
+        self.ultima_guardada = np.zeros(0, dtype=bool)
+        self.ultima_tiempo_ns = np.zeros(0, dtype=np.int64)
+        self.ultima_temp = np.zeros(0, dtype=np.float64)
+        # Estado de EstimadorExponencial por línea (u = T − T_inicio); est_info: una matriz 4×4 por línea
+        self.est_n = np.zeros(0, dtype=np.int64)
+        self.est_info = np.zeros((0, 4, 4), dtype=np.float64)
+        self.est_integral = np.zeros(0, dtype=np.float64)
+        self.est_m2 = np.zeros(0, dtype=np.int64)
+        self.est_sd2 = np.zeros(0, dtype=np.float64)
+        self.est_u1 = np.zeros(0, dtype=np.float64)   # Últimas dos u válidas (NaN: todavía no hay)
+        self.est_u2 = np.zeros(0, dtype=np.float64)
+        self.est_t_ultimo_ns = np.zeros(0, dtype=np.int64)
+        # Filtro de persistencia de predicciones() (ver _persistir_prediccion)
+        self.prediccion_clase = np.zeros(0, dtype=np.int64)
+        self.prediccion_desde_ns = np.zeros(0, dtype=np.int64)
+
+        for linea in lineas:
+            self.agregar_linea(linea)
+
+    def agregar_linea(self, linea: str) -> int:
+        """Agrega una línea (si no existe) y retorna su posición en los arreglos de estado."""
+        if linea in self.indice_linea:
+            return self.indice_linea[linea]
+        directorio = self.directorio_archivo / linea if self.directorio_archivo is not None else None
+        self.indice_linea[linea] = len(self.lineas)
+        self.lineas.append(linea)
+        self.curvas[linea] = AlmacenCurvas(self.capacidad_curvas, directorio)
+
+        self.en_proceso = np.append(self.en_proceso, False)
+        self.cero_anterior = np.append(self.cero_anterior, True)
+        self.temp_inicio = np.append(self.temp_inicio, np.nan)
+        self.inicio_ns = np.append(self.inicio_ns, 0)
+        self.tiempo_inicio = np.append(self.tiempo_inicio, None)
+        self.buffer_tiempos_ns = np.vstack([self.buffer_tiempos_ns, np.empty((1, self.capacidad_buffer), dtype=np.int64)])
+        self.buffer_temps = np.vstack([self.buffer_temps, np.empty((1, self.capacidad_buffer), dtype=np.float64)])
+        self.buffer_n = np.append(self.buffer_n, 0)
+        self.buffer_paso = np.append(self.buffer_paso, 1)
+        self.buffer_recibidas = np.append(self.buffer_recibidas, 0)
+        self.ultima_guardada = np.append(self.ultima_guardada, False)
+        self.ultima_tiempo_ns = np.append(self.ultima_tiempo_ns, 0)
+        self.ultima_temp = np.append(self.ultima_temp, np.nan)
+        self.est_n = np.append(self.est_n, 0)
+        self.est_info = np.concatenate([self.est_info, np.zeros((1, 4, 4))])
+        self.est_integral = np.append(self.est_integral, 0.0)
+        self.est_m2 = np.append(self.est_m2, 0)
+        self.est_sd2 = np.append(self.est_sd2, 0.0)
+        self.est_u1 = np.append(self.est_u1, np.nan)
+        self.est_u2 = np.append(self.est_u2, np.nan)
+        self.est_t_ultimo_ns = np.append(self.est_t_ultimo_ns, 0)
+        self.prediccion_clase = np.append(self.prediccion_clase, -1)
+        self.prediccion_desde_ns = np.append(self.prediccion_desde_ns, 0)
+        return self.indice_linea[linea]
+
+    def _compactar(self, i: int) -> None:
+        n = self.buffer_n[i]
+        conservar = (n + 1) // 2
+        self.buffer_tiempos_ns[i, :conservar] = self.buffer_tiempos_ns[i, :n:2]
+        self.buffer_temps[i, :conservar] = self.buffer_temps[i, :n:2]
+        self.buffer_n[i] = conservar
+        self.buffer_paso[i] *= 2
+
+    def _muestras(self, i: int) -> MuestrasCurva:
+        n = self.buffer_n[i]
+        tiempos_ns, temps = self.buffer_tiempos_ns[i, :n].copy(), self.buffer_temps[i, :n].copy()
+        if not self.ultima_guardada[i]:
+            tiempos_ns = np.append(tiempos_ns, self.ultima_tiempo_ns[i])
+            temps = np.append(temps, self.ultima_temp[i])
+        return MuestrasCurva(tiempos_ns, temps)
+
+    def _cerrar_curva(self, i: int, tiempo_final: datetime, temp: float, tipo: str | None) -> dict:
+        linea = self.lineas[i]
+        tau_s, delta_t, *_ = self._ajuste(i)
+        curva = _armar_curva(
+            self.tiempo_inicio[i], tiempo_final, float(self.temp_inicio[i]), temp, tipo,
+            _reducir_muestras(self._muestras(i), self.max_muestras_curva),
+            (float(tau_s), float(delta_t)),
+        )
+        curva["linea"] = linea
+        self.curvas[linea].append(curva)
+        self.en_proceso[i] = False
+        self.tiempo_inicio[i] = None
+        self.temp_inicio[i] = np.nan
+        return curva
+
+    def procesar(self, timestamp: datetime, temps, screws) -> list[dict]:
+        """
+        Un tick para todas las líneas: `temps` y `screws` traen un valor numérico por línea, en el
+        orden de `self.lineas`. Retorna las curvas terminadas en este tick (cada una con su "linea").
+        """
+        temps = np.asarray(temps, dtype=np.float64)
+        screws = np.asarray(screws, dtype=np.float64)
+        tiempo_ns = pd.Timestamp(timestamp).value
+
+        # Detección de inicio de reactividad (flanco de subida del tornillo)
+        cero = np.abs(screws) < 0.1
+        inicia = self.cero_anterior & ~cero & ~self.en_proceso
+        if inicia.any():
+            self.en_proceso |= inicia
+            self.temp_inicio[inicia] = temps[inicia]
+            self.inicio_ns[inicia] = tiempo_ns
+            self.tiempo_inicio[inicia] = timestamp
+            self.buffer_n[inicia] = 0
+            self.buffer_paso[inicia] = 1
+            self.buffer_recibidas[inicia] = 0
+            self.est_n[inicia] = self.est_m2[inicia] = 0
+            self.est_integral[inicia] = self.est_sd2[inicia] = 0.0
+            self.est_info[inicia] = 0.0
+            self.est_u1[inicia] = self.est_u2[inicia] = np.nan
+            self.est_t_ultimo_ns[inicia] = tiempo_ns
+            self.prediccion_clase[inicia] = -1
+
+        # Acumular la muestra en las líneas con curva en curso
+        activas = self.en_proceso
+        toca = activas & (self.buffer_recibidas % self.buffer_paso == 0)
+        for i in np.flatnonzero(toca & (self.buffer_n == self.capacidad_buffer)):
+            self._compactar(i)
+        toca = activas & (self.buffer_recibidas % self.buffer_paso == 0)
+        filas = np.flatnonzero(toca)
+        self.buffer_tiempos_ns[filas, self.buffer_n[filas]] = tiempo_ns
+        self.buffer_temps[filas, self.buffer_n[filas]] = temps[filas]
+        self.buffer_n[filas] += 1
+        self.ultima_guardada[activas] = toca[activas]
+        self.buffer_recibidas[activas] += 1
+        # Estimador: misma actualización que EstimadorExponencial.agregar en las líneas con muestra válida
+        u = temps - self.temp_inicio
+        suma = np.flatnonzero(activas & ~np.isnan(u))
+        if suma.size:
+            u_s = u[suma]
+            t = (tiempo_ns - self.inicio_ns[suma]) / 1e9 / ESCALA_TIEMPO_S
+            t_previo = (self.est_t_ultimo_ns[suma] - self.inicio_ns[suma]) / 1e9 / ESCALA_TIEMPO_S
+            con_previa = ~np.isnan(self.est_u1[suma])
+            self.est_integral[suma[con_previa]] += (
+                0.5 * (u_s + self.est_u1[suma]) * (t - t_previo)
+            )[con_previa]
+            z = np.column_stack([np.ones_like(t), t, self.est_integral[suma], u_s])
+            self.est_n[suma] += 1
+            self.est_info[suma] += z[:, :, None] * z[:, None, :]
+            d2 = u_s - 2 * self.est_u1[suma] + self.est_u2[suma]
+            con_d2 = ~np.isnan(d2)
+            self.est_m2[suma[con_d2]] += 1
+            self.est_sd2[suma[con_d2]] += d2[con_d2] ** 2
+            self.est_u2[suma] = self.est_u1[suma]
+            self.est_u1[suma] = u_s
+            self.est_t_ultimo_ns[suma] = tiempo_ns
+        self.ultima_tiempo_ns[activas] = tiempo_ns
+        self.ultima_temp[activas] = temps[activas]
+
+        # Cierres, con la misma prioridad que ReactivityMonitor: +40°C, tornillo detenido, ventana vencida
+        with np.errstate(invalid="ignore"):
+            sube = activas & (temps - self.temp_inicio >= 40)
+        detenido = activas & ~sube & cero if self.abortar_con_tornillo_detenido else np.zeros_like(activas)
+        vencida = activas & ~sube & ~detenido & (tiempo_ns - self.inicio_ns > self.ventana_max_s * 1e9)
+        self.cero_anterior = cero
+
+        nuevas_curvas_completadas = []
+        for i in np.flatnonzero(sube | detenido | vencida):
+            tipo = None if sube[i] else RESULTADO_ABORTADA if detenido[i] else RESULTADO_NO_REACCIONA
+            nuevas_curvas_completadas.append(self._cerrar_curva(int(i), timestamp, float(temps[i]), tipo))
+        return nuevas_curvas_completadas
+
+    def _ajuste(self, filas) -> AjusteExponencial:
+        """_ajuste_exponencial de las líneas `filas` (un índice o un arreglo de índices)."""
+        return _ajuste_exponencial(
+            self.est_info[filas], self.est_m2[filas], self.est_sd2[filas],
+            (self.est_t_ultimo_ns[filas] - self.inicio_ns[filas]) / 1e9, self.ventana_max_s,
+        )
+
+    def predicciones(self) -> list[dict]:
+        """
+        Predicción de cada línea con curva en curso y clase confiable (ver ReactivityMonitor.prediccion),
+        con el ajuste de todas las líneas resuelto en un solo paso vectorizado.
+        """
+        filas = np.flatnonzero(self.en_proceso & (self.est_n > 0))
+        if filas.size == 0:
+            return []
+        ajuste = self._ajuste(filas)
+        clase, desde_ns, publicar = _persistir_prediccion(
+            ajuste, self.est_n[filas], self.prediccion_clase[filas], self.prediccion_desde_ns[filas],
+            self.est_t_ultimo_ns[filas],
+        )
+        self.prediccion_clase[filas], self.prediccion_desde_ns[filas] = clase, desde_ns
+        resultado = []
+        for j in np.flatnonzero(publicar):
+            i = filas[j]
+            prediccion = _prediccion(
+                AjusteExponencial(*(campo[j] for campo in ajuste)),
+                (self.est_t_ultimo_ns[i] - self.inicio_ns[i]) / 1e9, int(self.est_n[i]),
+            )
+            prediccion["linea"] = self.lineas[i]
+            prediccion["timestamp_inicio"] = self.tiempo_inicio[i]
+            resultado.append(prediccion)
+        return resultado
+
 
 def _normalize_timestamp(timestamp: Union[datetime, str]):
     """Convierte timestamp a objeto con .strftime (datetime o pd.Timestamp). Acepta string ISO."""
@@ -395,6 +1424,637 @@ def _normalize_timestamp(timestamp: Union[datetime, str]):
     return timestamp
 
 
+# === Plan de alarmas compilado ===
+# El JSON de alarmas se interpreta una sola vez: operadores resueltos a funciones,
+# umbrales relativos a SP ya calculados y tipos no soportados descartados.
+
+
+def _entre(valor, rango):
+    return (rango[0] <= valor) & (valor <= rango[1])
+
+
+_OPERADORES_ABSOLUTOS: dict[str, Callable[[Any, Any], bool]] = {
+    ">": operator.gt,
+    "<": operator.lt,
+    "==": operator.eq,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "between": _entre,
+}
+
+_OPERADORES_MULTIPLES: dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
+
+_SIMBOLO_OPERADOR = {comparar: simbolo for simbolo, comparar in _OPERADORES_MULTIPLES.items()}
+
+
+class TerminoCompilado(NamedTuple):
+    """Comparación de un tag contra un umbral ya resuelto."""
+    tag: str
+    comparar: Callable[[Any, Any], bool]
+    umbral: Any
+    numerico: bool  # Si True, el valor del sensor se convierte a número antes de comparar
+
+
+class CondicionCompilada(NamedTuple):
+    """Condición del JSON lista para evaluarse; se cumple si se cumplen todos sus términos."""
+    tag: str
+    tipo: str
+    terminos: tuple[TerminoCompilado, ...]
+    descripcion: str
+    nombre_equipo: str
+    tipo_alarma: str | None
+    # Ciclo de vida (MaquinaEstadosAlarmas)
+    terminos_retencion: tuple[TerminoCompilado, ...] | None = None  # Con banda muerta, usados mientras está activa
+    retardo_on: int = 0          # ticks que debe cumplirse antes de activarse
+    retardo_off: int = 0         # ticks que debe dejar de cumplirse antes de despejarse
+    retardo_on_s: float = 0.0
+    retardo_off_s: float = 0.0
+    enclavada: bool = False      # Si True, solo se despeja después de ser reconocida
+
+
+def _a_numero(valor):
+    """Convierte un valor de sensor a número; retorna None si no es convertible."""
+    if isinstance(valor, numbers.Real):
+        return valor
+    try:
+        return float(valor)
+    except (ValueError, TypeError):
+        return None
+
+
+def _compilar_condicion_simple(tag: str, condicion: dict, setpoints: dict) -> TerminoCompilado | None:
+    tipo = condicion.get("tipo") or "absoluto"
+    operador = condicion.get("operador")
+
+    if tipo == "relativo_a_SP":
+        setpoint_base = setpoints.get(tag)
+        if setpoint_base is None or "valor" not in setpoint_base:
+            return None
+        delta = condicion.get("delta", 0)
+        if operador == "+":
+            return TerminoCompilado(tag, operator.gt, setpoint_base["valor"] + delta, True)
+        if operador == "-":
+            return TerminoCompilado(tag, operator.lt, setpoint_base["valor"] - delta, True)
+        return None
+
+    comparar = _OPERADORES_ABSOLUTOS.get(operador)
+    if comparar is None:
+        return None
+    if operador == "between":
+        umbral = tuple(condicion.get("rango", [0, 0]))
+    else:
+        umbral = condicion.get("valor")
+        if umbral is None:
+            return None
+    return TerminoCompilado(tag, comparar, umbral, True)
+
+
+_UNIDADES_TIEMPO_S = {
+    "s": 1.0, "seg": 1.0, "segundo": 1.0, "segundos": 1.0,
+    "min": 60.0, "minuto": 60.0, "minutos": 60.0,
+    "h": 3600.0, "hora": 3600.0, "horas": 3600.0,
+}
+_PATRON_DURACION = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*([a-zA-Z]+)\s*$")
+
+
+def _interpretar_valor_esperado(valor_esperado):
+    """
+    Normaliza el valor_esperado de una condición lógica. Las duraciones escritas
+    como texto ("2 minutos", "30 s") se convierten a segundos; el resto no se modifica.
+    """
+    if isinstance(valor_esperado, str):
+        coincidencia = _PATRON_DURACION.match(valor_esperado)
+        if coincidencia and coincidencia.group(2).lower() in _UNIDADES_TIEMPO_S:
+            cantidad = float(coincidencia.group(1).replace(",", "."))
+            return cantidad * _UNIDADES_TIEMPO_S[coincidencia.group(2).lower()]
+    return valor_esperado
+
+
+def _compilar_termino_logico(condicion: dict) -> TerminoCompilado | None:
+    """Compila la sub-condición de un custom_eval / estado_logico (tag lógico o físico)."""
+    sub_c = condicion.get("condicion", {})
+    tag = sub_c.get("tag")
+    comparar = _OPERADORES_MULTIPLES.get(sub_c.get("operador"))
+    if tag is None or comparar is None:
+        return None
+    valor_esperado = _interpretar_valor_esperado(sub_c.get("valor_esperado"))
+    return TerminoCompilado(tag, comparar, valor_esperado, isinstance(valor_esperado, (int, float)))
+
+
+# Umbrales de relacion_control (porcentaje de apertura / salida del controlador); el JSON
+# puede sobrescribirlos por relación con "apertura_min" / "apertura_max" y por controlador
+# con "salida_min".
+APERTURA_MIN_ABIERTA = 5.0      # % de posición desde el cual una válvula se considera abierta
+APERTURA_MAX_CERRADA = 5.0      # % de posición hasta el cual una válvula se considera cerrada
+SALIDA_MIN_CONTROLADOR = 5.0    # % de salida (OUT) desde el cual el controlador está pidiendo apertura
+SUFIJO_SALIDA_CONTROLADOR = "_OUT"  # Tag de salida por defecto: <tag_controlador>_OUT
+
+
+def _terminos_accion_no_cumplida(relacion: dict) -> tuple[TerminoCompilado, ...] | None:
+    """
+    Términos que se cumplen cuando el actuador NO está en la acción esperada. La posición
+    del actuador es numérica (0-100 %): OPEN -> posición < apertura_min, CLOSED -> posición >
+    apertura_max; un número como acción esperada es la apertura mínima pedida. Si la relación
+    trae "tag_abierta" (retroalimentación discreta de abierta, ej. final de carrera) se usa esa
+    señal en lugar de la posición.
+    """
+    actuador = relacion.get("actuador")
+    accion = relacion.get("accion_esperada")
+    if actuador is None or accion is None:
+        return None
+    accion_texto = str(accion).strip().upper()
+    tag_abierta = relacion.get("tag_abierta")
+
+    if accion_texto == "OPEN":
+        if tag_abierta is not None:
+            return (TerminoCompilado(tag_abierta, operator.lt, 0.5, True),)
+        return (TerminoCompilado(actuador, operator.lt, float(relacion.get("apertura_min", APERTURA_MIN_ABIERTA)), True),)
+    if accion_texto in ("CLOSED", "CLOSE"):
+        if tag_abierta is not None:
+            return (TerminoCompilado(tag_abierta, operator.ge, 0.5, True),)
+        return (TerminoCompilado(actuador, operator.gt, float(relacion.get("apertura_max", APERTURA_MAX_CERRADA)), True),)
+    apertura = _a_numero(accion)
+    if apertura is not None:
+        return (TerminoCompilado(actuador, operator.lt, float(apertura), True),)
+    return None
+
+
+def _compilar_relacion_control(condicion: dict) -> list[tuple[TerminoCompilado, ...]]:
+    """
+    Compila una relacion_control en una condición por actuador: se cumple cuando el
+    controlador está pidiendo acción y el actuador no está en la acción esperada.
+    "Controlador activo" se lee de su salida (tag_salida, por defecto <tag_controlador>_OUT,
+    >= salida_min) y, si se indica tag_modo, además de su modo (== modo_activo, ej. "AUTO").
+    El valor de proceso (PV) del controlador no se usa: siempre es distinto de cero.
+    """
+    sub_c = condicion.get("condicion", {})
+    tag_controlador = sub_c.get("tag_controlador")
+    if tag_controlador is None:
+        return []
+    tag_salida = sub_c.get("tag_salida", tag_controlador + SUFIJO_SALIDA_CONTROLADOR)
+    controlador_activo = [
+        TerminoCompilado(tag_salida, operator.ge, float(sub_c.get("salida_min", SALIDA_MIN_CONTROLADOR)), True)
+    ]
+    if sub_c.get("tag_modo") is not None:
+        modo_activo = sub_c.get("modo_activo", "AUTO")
+        controlador_activo.append(
+            TerminoCompilado(sub_c["tag_modo"], operator.eq, modo_activo, isinstance(modo_activo, (int, float)))
+        )
+
+    compiladas = []
+    for relacion in sub_c.get("controla", []):
+        accion_no_cumplida = _terminos_accion_no_cumplida(relacion)
+        if accion_no_cumplida is not None:
+            compiladas.append((*controlador_activo, *accion_no_cumplida))
+    return compiladas
+
+
+def _cerca(valor, umbral_y_banda):
+    umbral, banda = umbral_y_banda
+    return abs(valor - umbral) <= banda
+
+
+def _terminos_con_banda(terminos: tuple[TerminoCompilado, ...], banda: float) -> tuple[TerminoCompilado, ...]:
+    """
+    Versión de los términos con el umbral desplazado por la banda muerta hacia el lado
+    que mantiene la condición cumplida; se usa mientras la alarma está activa.
+    """
+    con_banda = []
+    for termino in terminos:
+        if termino.numerico and termino.comparar in (operator.gt, operator.ge):
+            termino = termino._replace(umbral=termino.umbral - banda)
+        elif termino.numerico and termino.comparar in (operator.lt, operator.le):
+            termino = termino._replace(umbral=termino.umbral + banda)
+        elif termino.numerico and termino.comparar is operator.eq:
+            termino = termino._replace(comparar=_cerca, umbral=(termino.umbral, banda))
+        elif termino.comparar is _entre:
+            termino = termino._replace(umbral=(termino.umbral[0] - banda, termino.umbral[1] + banda))
+        con_banda.append(termino)
+    return tuple(con_banda)
+
+
+def _compilar_multiple_and(condicion: dict) -> tuple[TerminoCompilado, ...] | None:
+    terminos = []
+    for sub in condicion.get("condiciones", []):
+        sub_c = sub.get("condicion", {})
+        tag = sub_c.get("tag")
+        comparar = _OPERADORES_MULTIPLES.get(sub_c.get("operador"))
+        if tag is None or comparar is None:
+            # Una sub-condición inválida hace que la condición nunca se cumpla
+            return None
+        valor_esperado = sub_c.get("valor_esperado")
+        terminos.append(TerminoCompilado(tag, comparar, valor_esperado, isinstance(valor_esperado, (int, float))))
+    return tuple(terminos) or None
+
+
+def compilar_plan_alarmas(config_json_sensores: dict, setpoints_dict: dict) -> tuple[CondicionCompilada, ...]:
+    """
+    Compila la configuración JSON de alarmas en un plan inmutable.
+    Las condiciones que no pueden cumplirse (tipo u operador no soportado, setpoint
+    inexistente) se descartan aquí y no se vuelven a revisar en cada ciclo.
+    Debe recompilarse si cambian la configuración o los setpoints.
+    """
+    plan = []
+
+    for tag_principal_json, info_sensor in config_json_sensores.items():
+        for i, condicion_config in enumerate(info_sensor.get("condiciones", [])):
+            tipo_condicion = condicion_config.get("tipo")
+            if tipo_condicion in ["absoluto", "relativo_a_SP", None]:
+                termino = _compilar_condicion_simple(tag_principal_json, condicion_config, setpoints_dict)
+                variantes = [(termino,)] if termino is not None else []
+            elif tipo_condicion == "multiple_and":
+                terminos = _compilar_multiple_and(condicion_config)
+                variantes = [terminos] if terminos is not None else []
+            elif tipo_condicion in ["custom_eval", "estado_logico"]:
+                termino = _compilar_termino_logico(condicion_config)
+                variantes = [(termino,)] if termino is not None else []
+            elif tipo_condicion == "relacion_control":
+                variantes = _compilar_relacion_control(condicion_config)
+            else:
+                variantes = []
+
+            banda_muerta = float(condicion_config.get("banda_muerta", 0) or 0)
+            tipo_alarma = condicion_config.get("tipo_alarma")
+            for terminos in variantes:
+                plan.append(CondicionCompilada(
+                    tag=tag_principal_json,
+                    tipo=tipo_condicion or "absoluto",
+                    terminos=terminos,
+                    descripcion=condicion_config.get("descripcion", f"Condición {i+1} para {tag_principal_json}"),
+                    nombre_equipo=condicion_config.get("nombre_equipo", info_sensor.get("nombre_equipo", tag_principal_json)),
+                    tipo_alarma=tipo_alarma,
+                    terminos_retencion=_terminos_con_banda(terminos, banda_muerta) if banda_muerta > 0 else None,
+                    retardo_on=int(condicion_config.get("retardo_on", 0)),
+                    retardo_off=int(condicion_config.get("retardo_off", 0)),
+                    retardo_on_s=float(condicion_config.get("retardo_on_s", 0.0)),
+                    retardo_off_s=float(condicion_config.get("retardo_off_s", 0.0)),
+                    enclavada=bool(condicion_config.get("enclavada", tipo_alarma == "FAULT")),
+                ))
+
+    return tuple(plan)
+
+
+# === Tags lógicos (origen: "logica") ===
+# Estados discretos que el JSON referencia por nombre y que se derivan de una señal física.
+# Cada entrada: tag lógico -> (tag de origen, predicado de "activo", valor si activo, valor si no).
+# Los predicados operan igual sobre escalares y arreglos NumPy. Si el snapshot ya trae el
+# tag lógico (p. ej. desde el DCS) se respeta ese valor; los tags sin origen físico conocido
+# (MANUAL_GATE_VALVE, SOLENOID_VALVE, ...) solo se evalúan cuando vienen en los datos.
+
+def _en_marcha(valor):
+    return np.abs(valor) >= 0.1  # Mismo umbral que es_cero
+
+
+# Nivel (%) de 2270-LIT-11850 bajo el cual el DCS activa el interruptor 2270-LALL-11850
+# (nivel muy-muy bajo de la cámara separadora). Es el mismo límite de la condición FAULT
+# "Nivel Muy Bajo" de 2270-LIT-11850 en config/alarm_config.json (operador "<", valor 5).
+NIVEL_LALL_11850 = 5.0
+
+
+def _nivel_muy_bajo_camara(nivel):
+    return nivel < NIVEL_LALL_11850
+
+
+def _valvula_abierta(posicion):
+    return posicion >= APERTURA_MIN_ABIERTA  # Mismo criterio que relacion_control (OPEN)
+
+
+TAGS_LOGICOS: dict[str, tuple[str, Callable[[Any], Any], Any, Any]] = {
+    "LIME_SILO_ROTARY_VALVE": ("2270-SAL-11818", _en_marcha, "RUNNING", "STOPPED"),
+    "BOTTOM_BIN_14A": ("2270-ZM-009-14_RUN_FB", _en_marcha, "ON", "OFF"),
+    "SCREW_FEEDER_2270-ZM-009-04": ("2270-ZM-009-04_RUN_FB", _en_marcha, "OPERATING", "STOPPED"),
+    "2270-LALL-11850": ("2270-LIT-11850", _nivel_muy_bajo_camara, 1, 0),
+    "VALVE_2270-TV-11801": ("2270-TV-11801", _valvula_abierta, "OPEN", "CLOSED"),
+}
+
+
+def derivar_tags_logicos(datos_sensores: dict) -> dict:
+    """
+    Retorna los datos de sensores con los tags lógicos derivables agregados.
+    Si no hay nada que derivar retorna el mismo diccionario.
+    """
+    derivados = {}
+    for tag_logico, (tag_origen, activo, valor_activo, valor_inactivo) in TAGS_LOGICOS.items():
+        if tag_logico in datos_sensores:
+            continue
+        valor = _a_numero(datos_sensores.get(tag_origen))
+        if valor is None or valor != valor:
+            continue
+        derivados[tag_logico] = valor_activo if activo(valor) else valor_inactivo
+    if not derivados:
+        return datos_sensores
+    return {**datos_sensores, **derivados}
+
+
+def _evaluar_terminos(terminos: tuple[TerminoCompilado, ...], datos_sensores: dict):
+    """
+    Evalúa los términos de una condición. Retorna el valor numérico del primer término
+    si todos se cumplen, o None si alguno no se cumple o no puede evaluarse.
+    """
+    primer_valor = None
+    for termino in terminos:
+        valor = datos_sensores.get(termino.tag)
+        if valor is None:
+            return None
+        if termino.numerico:
+            valor = _a_numero(valor)
+            if valor is None:
+                return None
+        if not termino.comparar(valor, termino.umbral):
+            return None
+        if primer_valor is None:
+            primer_valor = valor
+    return primer_valor
+
+
+class RegistroAlarma:
+    """
+    Alarma emitida por el motor: referencia a la condición del plan más el valor y el
+    timestamp que la produjeron. El texto se arma solo al renderizar (renderizar_alarma).
+    """
+    __slots__ = ("id_condicion", "tag", "valor", "severidad", "timestamp", "evento")
+
+    def __init__(self, id_condicion: int, tag: str, valor, severidad: str | None, timestamp, evento: str | None = None):
+        self.id_condicion = id_condicion
+        self.tag = tag
+        self.valor = valor
+        self.severidad = severidad  # tipo_alarma del JSON (FAULT, WARNING, INTERLOCK, NORMAL)
+        self.timestamp = timestamp
+        self.evento = evento        # None, ALARMA_ACTIVADA o ALARMA_DESPEJADA
+
+    def __repr__(self) -> str:
+        return (f"RegistroAlarma(id_condicion={self.id_condicion}, tag={self.tag!r}, valor={self.valor!r}, "
+                f"severidad={self.severidad!r}, timestamp={self.timestamp!r}, evento={self.evento!r})")
+
+
+def _registro(plan: tuple[CondicionCompilada, ...], id_condicion: int, valor, timestamp, evento: str | None = None) -> RegistroAlarma:
+    condicion = plan[id_condicion]
+    return RegistroAlarma(id_condicion, condicion.tag, valor, condicion.tipo_alarma, timestamp, evento)
+
+
+def renderizar_alarma(registro: RegistroAlarma, plan: tuple[CondicionCompilada, ...]) -> str:
+    """Texto de una alarma con el mismo formato que evaluar_alarmas_directo."""
+    hora = _normalize_timestamp(registro.timestamp).strftime('%H:%M:%S')
+    return _mensaje_alerta(plan[registro.id_condicion], registro.valor, hora)
+
+
+def renderizar_alarmas(registros: list[RegistroAlarma], plan: tuple[CondicionCompilada, ...]) -> list[str]:
+    """Renderiza varias alarmas normalizando cada timestamp distinto una sola vez."""
+    horas: dict[Any, str] = {}
+    mensajes = []
+    for registro in registros:
+        if registro.timestamp not in horas:
+            horas[registro.timestamp] = _normalize_timestamp(registro.timestamp).strftime('%H:%M:%S')
+        mensajes.append(_mensaje_alerta(plan[registro.id_condicion], registro.valor, horas[registro.timestamp]))
+    return mensajes
+
+
+def evaluar_plan_registros(
+    plan: tuple[CondicionCompilada, ...],
+    datos_sensores: dict[str, float],
+    timestamp: Union[datetime, str]
+) -> list[RegistroAlarma]:
+    """
+    Ejecuta un plan compilado sobre un diccionario de datos de sensores (tag: valor).
+    Retorna un RegistroAlarma por condición cumplida, en el orden del plan.
+    """
+    datos_sensores = derivar_tags_logicos(datos_sensores)
+    registros = []
+
+    for id_condicion, condicion in enumerate(plan):
+        valor = _evaluar_terminos(condicion.terminos, datos_sensores)
+        if valor is not None:
+            registros.append(RegistroAlarma(id_condicion, condicion.tag, valor, condicion.tipo_alarma, timestamp))
+
+    return registros
+
+
+def evaluar_plan_alarmas(
+    plan: tuple[CondicionCompilada, ...],
+    datos_sensores: dict[str, float],
+    timestamp: Union[datetime, str]
+) -> list[str]:
+    """
+    Ejecuta un plan compilado sobre un diccionario de datos de sensores (tag: valor).
+    Retorna la misma lista de mensajes de alerta que evaluar_alarmas_directo.
+    """
+    return renderizar_alarmas(evaluar_plan_registros(plan, datos_sensores, timestamp), plan)
+
+
+def _detalle_alerta(condicion: CondicionCompilada, valor) -> str:
+    if condicion.tipo == "multiple_and":
+        return "(Condiciones 'multiple_and' cumplidas)"
+    if condicion.tipo == "relacion_control":
+        # Términos: salida del controlador, modo (opcional) y por último el actuador (ver _compilar_relacion_control)
+        *controlador, actuador = condicion.terminos
+        pedido = " y ".join(f"{t.tag} {_SIMBOLO_OPERADOR[t.comparar]} {t.umbral}" for t in controlador)
+        return f"(Controlador pidiendo acción: {pedido}; Actuador fuera de la acción esperada: {actuador.tag} {_SIMBOLO_OPERADOR[actuador.comparar]} {actuador.umbral})"
+    if condicion.tipo in ["custom_eval", "estado_logico"]:
+        return f"(Tag lógico: {condicion.terminos[0].tag}, Valor: {valor})"
+    return f"(Sensor: {condicion.tag}, Valor: {valor:.2f})"
+
+
+def _mensaje_alerta(condicion: CondicionCompilada, valor, hora: str) -> str:
+    return f"ALERTA ({hora}): {condicion.descripcion} [{condicion.nombre_equipo}] {_detalle_alerta(condicion, valor)}"
+
+
+def indexar_tags_plan(plan: tuple[CondicionCompilada, ...]) -> dict[str, tuple[int, ...]]:
+    """
+    Construye el índice inverso tag -> ids de condición (posición en el plan) que lo leen,
+    incluyendo los tags de las sub-condiciones de multiple_and.
+    """
+    indice: dict[str, list[int]] = {}
+    for id_condicion, condicion in enumerate(plan):
+        for tag in dict.fromkeys(t.tag for t in condicion.terminos):
+            indice.setdefault(tag, []).append(id_condicion)
+    return {tag: tuple(ids) for tag, ids in indice.items()}
+
+
+_SIN_VALOR = object()
+
+
+class EvaluadorAlarmasIncremental:
+    """
+    Evalúa un plan compilado sobre snapshots sucesivos re-evaluando solo las condiciones
+    cuyos tags cambiaron respecto del snapshot anterior. El resto del conjunto de alarmas
+    activas se arrastra sin volver a evaluarse.
+    """
+
+    def __init__(self, plan: tuple[CondicionCompilada, ...]):
+        self.plan = plan
+        self.condiciones_por_tag = indexar_tags_plan(plan)
+        self._valores_anteriores: dict[str, Any] = {}
+        self._activas: dict[int, Any] = {}  # id de condición -> valor que la disparó
+        self._primera_evaluacion = True
+
+    def actualizar(self, datos_sensores: dict, retenidas: np.ndarray | None = None) -> dict[int, Any]:
+        """
+        Procesa un nuevo snapshot (tag: valor) y retorna las condiciones que se cumplen
+        como {id de condición: valor}.
+        retenidas (opcional) marca por id las condiciones que deben evaluarse con su banda muerta.
+        """
+        datos_sensores = derivar_tags_logicos(datos_sensores)
+        if self._primera_evaluacion:
+            pendientes = range(len(self.plan))
+            self._primera_evaluacion = False
+        else:
+            pendientes = set()
+            for tag, ids in self.condiciones_por_tag.items():
+                valor = datos_sensores.get(tag)
+                anterior = self._valores_anteriores.get(tag, _SIN_VALOR)
+                if valor is anterior or valor == anterior:
+                    continue
+                pendientes.update(ids)
+
+        for tag in self.condiciones_por_tag:
+            self._valores_anteriores[tag] = datos_sensores.get(tag)
+
+        for id_condicion in pendientes:
+            condicion = self.plan[id_condicion]
+            terminos = condicion.terminos
+            if retenidas is not None and retenidas[id_condicion] and condicion.terminos_retencion:
+                terminos = condicion.terminos_retencion
+            valor = _evaluar_terminos(terminos, datos_sensores)
+            if valor is None:
+                self._activas.pop(id_condicion, None)
+            else:
+                self._activas[id_condicion] = valor
+
+        return self._activas
+
+    def registros(self, datos_sensores: dict, timestamp: Union[datetime, str]) -> list[RegistroAlarma]:
+        """
+        Equivalente incremental de evaluar_plan_registros, en el orden del plan.
+        """
+        activas = self.actualizar(datos_sensores)
+        return [_registro(self.plan, i, activas[i], timestamp) for i in sorted(activas)]
+
+    def evaluar(self, datos_sensores: dict, timestamp: Union[datetime, str]) -> list[str]:
+        """
+        Equivalente incremental de evaluar_plan_alarmas: mismos mensajes, en el orden del plan.
+        """
+        return renderizar_alarmas(self.registros(datos_sensores, timestamp), self.plan)
+
+
+def _serie_para_tag(df: pd.DataFrame, tag: str, mapa_columnas: dict | None) -> pd.Series | None:
+    """Ubica la columna de un tag; los tags lógicos sin columna propia se derivan de su origen."""
+    col = mapa_columnas.get(tag) if mapa_columnas is not None else tag
+    if col is not None and col in df.columns:
+        return df[col]
+    if tag not in TAGS_LOGICOS:
+        return None
+
+    tag_origen, activo, valor_activo, valor_inactivo = TAGS_LOGICOS[tag]
+    origen = _serie_para_tag(df, tag_origen, mapa_columnas)
+    if origen is None:
+        return None
+    valores = pd.to_numeric(origen, errors="coerce").to_numpy(dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        derivados = np.where(activo(valores), valor_activo, valor_inactivo).astype(object)
+    derivados[np.isnan(valores)] = None
+    return pd.Series(derivados, index=df.index)
+
+
+def _columna_para_termino(
+    df: pd.DataFrame,
+    termino: TerminoCompilado,
+    mapa_columnas: dict | None,
+    cache: dict
+) -> tuple[np.ndarray, np.ndarray] | None:
+    """
+    Obtiene (valores, validos) de la columna de un término, convirtiendo la columna
+    completa una sola vez por tag y tipo de comparación.
+    """
+    clave = (termino.tag, termino.numerico)
+    if clave in cache:
+        return cache[clave]
+
+    serie = _serie_para_tag(df, termino.tag, mapa_columnas)
+    if serie is None:
+        cache[clave] = None
+        return None
+
+    if termino.numerico:
+        valores = pd.to_numeric(serie, errors="coerce").to_numpy(dtype=np.float64)
+        validos = ~np.isnan(valores)
+    else:
+        valores = serie.to_numpy(dtype=object)
+        validos = serie.notna().to_numpy()
+    cache[clave] = (valores, validos)
+    return cache[clave]
+
+
+def evaluar_plan_dataframe(
+    plan: tuple[CondicionCompilada, ...],
+    df: pd.DataFrame,
+    mapa_columnas: dict | None = None
+) -> pd.DataFrame:
+    """
+    Evalúa un plan compilado sobre un DataFrame completo, con una máscara NumPy por condición.
+    Si se entrega mapa_columnas (tag -> columna, ej. de build_tag_column_map) se usa para
+    ubicar cada tag; si no, los tags deben ser nombres de columna (ej. plant_simulator_output.csv).
+    Los valores vacíos o no numéricos nunca cumplen una condición.
+    Retorna una tabla con columnas: fila, tag, condicion (índice en el plan), valor.
+    """
+    cache: dict = {}
+    filas, condiciones, valores = [], [], []
+    n = len(df)
+
+    for id_condicion, condicion in enumerate(plan):
+        mascara = np.ones(n, dtype=bool)
+        valor_condicion = None
+        for termino in condicion.terminos:
+            columna = _columna_para_termino(df, termino, mapa_columnas, cache)
+            if columna is None:
+                mascara = None
+                break
+            valores_col, validos = columna
+            mascara &= validos
+            with np.errstate(invalid="ignore"):
+                mascara &= np.asarray(termino.comparar(valores_col, termino.umbral), dtype=bool)
+            if valor_condicion is None:
+                valor_condicion = valores_col if termino.numerico else np.full(n, np.nan)
+        if mascara is None:
+            continue
+
+        posiciones = np.flatnonzero(mascara)
+        if posiciones.size == 0:
+            continue
+        filas.append(posiciones)
+        condiciones.append(np.full(posiciones.size, id_condicion))
+        valores.append(valor_condicion[posiciones])
+
+    if not filas:
+        return pd.DataFrame({
+            "fila": pd.Series(dtype=df.index.dtype),
+            "tag": pd.Series(dtype=object),
+            "condicion": pd.Series(dtype=np.int64),
+            "valor": pd.Series(dtype=np.float64),
+        })
+
+    filas = np.concatenate(filas)
+    condiciones = np.concatenate(condiciones)
+    valores = np.concatenate(valores)
+    # Mismo orden que la evaluación fila a fila: por fila y luego por orden del plan
+    orden = np.lexsort((condiciones, filas))
+    filas, condiciones, valores = filas[orden], condiciones[orden], valores[orden]
+    tags = np.array([c.tag for c in plan], dtype=object)
+
+    return pd.DataFrame({
+        "fila": df.index.to_numpy()[filas],
+        "tag": tags[condiciones],
+        "condicion": condiciones,
+        "valor": valores,
+    })
+
+
 def evaluar_alarmas_directo(
     datos_sensores: dict[str, float],
     timestamp: Union[datetime, str],
@@ -406,80 +2066,155 @@ def evaluar_alarmas_directo(
     Retorna una lista de mensajes de alerta.
     Esta versión es ideal para datos en tiempo real o de simuladores.
     Acepta timestamp como datetime o como string ISO (ej. del simulador).
+    Compila el plan en cada llamada; para evaluación periódica conviene compilar una vez
+    con compilar_plan_alarmas y usar evaluar_plan_alarmas.
     """
-    ts = _normalize_timestamp(timestamp)
-    alertas_json = []
+    plan = compilar_plan_alarmas(config_json_sensores, setpoints_dict)
+    return evaluar_plan_alarmas(plan, datos_sensores, timestamp)
 
-    for tag_principal_json, info_sensor in config_json_sensores.items():
-        # Ignorar tipos de condición complejos que requieren lógica externa
-        if info_sensor.get("condiciones") and any(c.get("tipo") in ["custom_eval", "relacion_control", "estado_logico"] for c in info_sensor["condiciones"]):
-            continue
 
-        for i, condicion_config in enumerate(info_sensor.get("condiciones", [])):
-            tipo_condicion = condicion_config.get("tipo")
-            if tipo_condicion in ["custom_eval", "relacion_control", "estado_logico"]:
-                continue
 
-            nombre_equipo = condicion_config.get("nombre_equipo", info_sensor.get("nombre_equipo", tag_principal_json))
-            descripcion_alerta_plantilla = condicion_config.get("descripcion", f"Condición {i+1} para {tag_principal_json}")
+# === Ciclo de vida de alarmas ===
 
-            if tipo_condicion in ["absoluto", "relativo_a_SP", None]:
-                valor_sensor = datos_sensores.get(tag_principal_json)
-                if valor_sensor is None:
-                    continue
+ALARMA_ACTIVADA = "activada"
+ALARMA_DESPEJADA = "despejada"
 
-                try:
-                    valor_sensor_num = pd.to_numeric(valor_sensor)
-                except (ValueError, TypeError):
-                    continue
-                
-                condicion_para_eval = condicion_config.copy()
-                if tipo_condicion is None:
-                    condicion_para_eval["tipo"] = "absoluto"
-
-                if evaluar_condicion(valor_sensor_num, condicion_para_eval, tag_principal_json, setpoints_dict):
-                    alertas_json.append(f"ALERTA ({ts.strftime('%H:%M:%S')}): {descripcion_alerta_plantilla} [{nombre_equipo}] (Sensor: {tag_principal_json}, Valor: {valor_sensor_num:.2f})")
 
-            elif tipo_condicion == "multiple_and":
-                sub_condiciones_lista = condicion_config.get("condiciones", [])
-                if not sub_condiciones_lista:
-                    continue
+class MaquinaEstadosAlarmas:
+    """
+    Mantiene el estado de cada condición del plan entre ticks: banda muerta, retardos de
+    activación/despeje (en ticks y/o segundos), enclavamiento y reconocimiento.
+    El estado vive en arreglos NumPy indexados por id de condición (posición en el plan)
+    y cada tick retorna solo las transiciones.
+    """
 
-                cumple_todas = True
-                for sub in sub_condiciones_lista:
-                    sub_c = sub.get("condicion", {})
-                    tag = sub_c.get("tag")
-                    operador = sub_c.get("operador")
-                    valor_esperado = sub_c.get("valor_esperado")
-                    
-                    if tag is None:
-                        cumple_todas = False
-                        break
-
-                    valor_sensor_sub = datos_sensores.get(tag)
-                    if valor_sensor_sub is None:
-                        cumple_todas = False
-                        break
-
-                    try:
-                        valor_para_comparar = pd.to_numeric(valor_sensor_sub) if isinstance(valor_esperado, (int, float)) else valor_sensor_sub
-                    except (ValueError, TypeError):
-                        cumple_todas = False
-                        break
-                    
-                    ok = False
-                    if operador == "==": ok = (valor_para_comparar == valor_esperado)
-                    elif operador == "!=": ok = (valor_para_comparar != valor_esperado)
-                    elif operador == "<": ok = (valor_para_comparar < valor_esperado)
-                    elif operador == ">": ok = (valor_para_comparar > valor_esperado)
-                    elif operador == "<=": ok = (valor_para_comparar <= valor_esperado)
-                    elif operador == ">=": ok = (valor_para_comparar >= valor_esperado)
-                    
-                    if not ok:
-                        cumple_todas = False
-                        break
-
-                if cumple_todas:
-                    alertas_json.append(f"ALERTA ({ts.strftime('%H:%M:%S')}): {descripcion_alerta_plantilla} [{nombre_equipo}] (Condiciones 'multiple_and' cumplidas)")
-
-    return alertas_json
\ No newline at end of file
+    def __init__(self, plan: tuple[CondicionCompilada, ...]):
+        self.plan = plan
+        self.evaluador = EvaluadorAlarmasIncremental(plan)
+        n = len(plan)
+
+        # Configuración por condición
+        self.retardo_on = np.array([c.retardo_on for c in plan], dtype=np.int64)
+        self.retardo_off = np.array([c.retardo_off for c in plan], dtype=np.int64)
+        self.retardo_on_s = np.array([c.retardo_on_s for c in plan], dtype=np.float64)
+        self.retardo_off_s = np.array([c.retardo_off_s for c in plan], dtype=np.float64)
+        self.enclavada = np.array([c.enclavada for c in plan], dtype=bool)
+
+        # Estado por condición
+        self.activa = np.zeros(n, dtype=bool)
+        self.reconocida = np.zeros(n, dtype=bool)
+        self.cumple_desde_tick = np.full(n, -1, dtype=np.int64)
+        self.cumple_desde_s = np.full(n, np.nan)
+        self.no_cumple_desde_tick = np.full(n, -1, dtype=np.int64)
+        self.no_cumple_desde_s = np.full(n, np.nan)
+        self.valores: dict[int, Any] = {}  # Último valor que cumplió la condición
+        self.tick = 0
+        self._ultimo_timestamp = None
+
+    def procesar(self, datos_sensores: dict, timestamp: Union[datetime, str]) -> list[RegistroAlarma]:
+        """
+        Evalúa un snapshot y actualiza el estado. Retorna las transiciones de este tick
+        como registros con evento ALARMA_ACTIVADA o ALARMA_DESPEJADA.
+        """
+        ts = _normalize_timestamp(timestamp)
+        ahora_s = ts.timestamp()
+        cumplidas = self.evaluador.actualizar(datos_sensores, retenidas=self.activa)
+        self.valores.update(cumplidas)
+
+        cumple = np.zeros(len(self.plan), dtype=bool)
+        cumple[list(cumplidas)] = True
+        tick = self.tick
+        self.tick += 1
+
+        # Marcas de inicio de cada racha (cumple / no cumple)
+        inicio_on = cumple & (self.cumple_desde_tick < 0)
+        self.cumple_desde_tick[inicio_on] = tick
+        self.cumple_desde_s[inicio_on] = ahora_s
+        self.cumple_desde_tick[~cumple] = -1
+        inicio_off = ~cumple & (self.no_cumple_desde_tick < 0)
+        self.no_cumple_desde_tick[inicio_off] = tick
+        self.no_cumple_desde_s[inicio_off] = ahora_s
+        self.no_cumple_desde_tick[cumple] = -1
+
+        activar = (
+            cumple & ~self.activa
+            & (tick - self.cumple_desde_tick >= self.retardo_on)
+            & ((self.retardo_on_s <= 0) | (ahora_s - self.cumple_desde_s >= self.retardo_on_s))
+        )
+        despejar = (
+            ~cumple & self.activa
+            & (tick - self.no_cumple_desde_tick >= self.retardo_off)
+            & ((self.retardo_off_s <= 0) | (ahora_s - self.no_cumple_desde_s >= self.retardo_off_s))
+            & (~self.enclavada | self.reconocida)
+        )
+
+        self.activa[activar] = True
+        self.reconocida[activar] = False
+        self.activa[despejar] = False
+
+        transiciones = [
+            _registro(self.plan, int(i), self.valores.get(int(i)), ts, ALARMA_ACTIVADA) for i in np.flatnonzero(activar)
+        ]
+        transiciones.extend(
+            _registro(self.plan, int(i), self.valores.pop(int(i), None), ts, ALARMA_DESPEJADA) for i in np.flatnonzero(despejar)
+        )
+        self._ultimo_timestamp = ts
+        return transiciones
+
+    def reconocer(self, id_condicion: int) -> bool:
+        """
+        Reconoce una alarma activa. Una alarma enclavada se despeja en el siguiente tick
+        en que su condición ya no se cumpla. Retorna False si no estaba activa.
+        """
+        if not 0 <= id_condicion < len(self.plan) or not self.activa[id_condicion]:
+            return False
+        self.reconocida[id_condicion] = True
+        return True
+
+    def alarmas_activas(self) -> list[RegistroAlarma]:
+        """Alarmas activas (incluidas las enclavadas) al último tick procesado, en el orden del plan."""
+        return [
+            _registro(self.plan, int(i), self.valores.get(int(i)), self._ultimo_timestamp)
+            for i in np.flatnonzero(self.activa)
+        ]
+
+
+# === Auditoría de históricos por bloques ===
+
+def _parsear_tiempos(valores: pd.Series) -> pd.Series:
+    """Convierte una columna de tiempos con el formato del historiador (dd/mm/aaaa) o, si ninguna fila calza, ISO."""
+    tiempos = pd.to_datetime(valores, format="%d/%m/%Y %H:%M:%S", errors="coerce")
+    if tiempos.isna().all():
+        tiempos = pd.to_datetime(valores, errors="coerce")
+    return tiempos
+
+
+def auditar_historico_por_bloques(
+    bloques,
+    plan: tuple[CondicionCompilada, ...],
+    mapa_columnas: dict | None = None,
+    monitor: ReactivityMonitor | None = None,
+    columna_tiempo=None,
+    columna_temp=None,
+    columna_screw=None
+):
+    """
+    Recorre los bloques de leer_csv_por_bloques / leer_excel_por_bloques y, por cada uno,
+    entrega (alertas, curvas): las alertas del plan (tabla de evaluar_plan_dataframe, con el
+    número de fila global) y las curvas de reactividad completadas en el bloque.
+    El monitor conserva su estado entre bloques, así que una curva puede abarcar varios.
+    Las filas sin tiempo, temperatura o tornillo válidos no se envían al monitor.
+    La memoria queda acotada por el tamaño de bloque.
+    """
+    usar_monitor = monitor is not None and None not in (columna_tiempo, columna_temp, columna_screw)
+
+    for bloque in bloques:
+        alertas = evaluar_plan_dataframe(plan, bloque, mapa_columnas)
+        curvas = []
+        if usar_monitor:
+            tiempos = _parsear_tiempos(bloque[columna_tiempo])
+            temps = pd.to_numeric(bloque[columna_temp], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+            screws = pd.to_numeric(bloque[columna_screw], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+            validos = tiempos.notna().to_numpy() & ~np.isnan(temps) & ~np.isnan(screws)
+            curvas = monitor.process_reactivity_batch(tiempos[validos], temps[validos], screws[validos])
+        yield alertas, curvas
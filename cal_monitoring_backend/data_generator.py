@@ -5,9 +5,9 @@ Salida: plant_simulator_output.csv con TAGs exactos e interdependencias correcta
 """
 import pandas as pd
 import numpy as np
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, NamedTuple, Optional
 
 # Columnas exactas del CSV (orden: timestamp + Fase 1 → 5)
 OUTPUT_COLUMNS = [
@@ -47,6 +47,10 @@ OUTPUT_COLUMNS = [
     "2270-TT-11824B",   # AI: Temperatura slaker (redundante, con desviación)
     "2270-TAHH-11801",  # DI: Alarma temperatura alta-alta (>90°C)
     "2270-PALL-11834",  # AI: Presión agua (kPa)
+    "2270-TIC-11801",      # AI: PV del control de temperatura del slaker (°C)
+    "2270-TIC-11801_OUT",  # AI: Salida del TIC-11801 (%)
+    "2270-TV-11801",       # AI: Posición válvula de agua comandada por el TIC (%)
+    "2270-HV-11808",       # AI: Posición válvula manual de agua (%)
     "2270-ZM-009-06",   # DI: Motor slaker
     "2270-ZM-009-06_CMD_RUN",
     "2270-ZM-009-06_RUN_FB",
@@ -110,6 +114,12 @@ TEMP_SLAKER_DEVIATION_C = 0.5  # desviación TT-11824B respecto a A
 TAHH_TEMP_THRESHOLD_C = 90.0   # TAHH-11801 = 1 si max(A,B) > 90°C
 PRESION_AGUA_NOMINAL_KPA = 300.0
 PRESION_AGUA_CAIDA_TRANSITORIA_KPA = 15.0  # caída cuando flujo sube bruscamente
+# TIC-11801: lazo P de acción inversa (más temperatura → más agua) en AUTO mientras hay hidratación;
+# TV-11801 sigue a la salida con 1 paso de retraso (recorrido) y HV-11808 queda abierta con agua
+TIC_11801_SETPOINT_C = 80.0
+TIC_11801_SALIDA_BASE_PCT = 50.0       # salida con PV = SP
+TIC_11801_GANANCIA_PCT_POR_C = 5.0     # % de salida por °C sobre el setpoint
+HV_11808_APERTURA_PCT = 100.0
 SLAKER_SPEED_FB_HZ = 35.0      # velocidad nominal motor slaker
 SLAKER_CURRENT_BASE_A = 8.0
 SLAKER_CURRENT_DENSITY_FACTOR = 40.0  # A por (densidad - 1.0); más espeso = más torque
@@ -131,45 +141,106 @@ PH_NOMINAL_BASE = 12.2
 PH_LOG_FACTOR = 0.8                    # pH como función log de densidad
 
 
-def _curva_reactividad(paso: int, paso_inicio_reaccion: int) -> float:
+def _curva_reactividad(paso, paso_inicio_reaccion: int):
     """
     Curva de reactividad: temperatura sube de 25°C y se estabiliza entre 75–85°C.
     T(paso) = T_amb + (T_estable - T_amb) * (1 - exp(-t/tau))
+    Acepta un paso o un arreglo de pasos.
     """
-    if paso < paso_inicio_reaccion:
-        return TEMP_AMBIENTE
-    t = paso - paso_inicio_reaccion
+    t = np.asarray(paso) - paso_inicio_reaccion
     T_estable = (TEMP_ESTABLE_MIN + TEMP_ESTABLE_MAX) / 2.0
     delta = T_estable - TEMP_AMBIENTE
-    return TEMP_AMBIENTE + delta * (1.0 - np.exp(-t / TAU_TEMP))
+    return np.where(t < 0, TEMP_AMBIENTE, TEMP_AMBIENTE + delta * (1.0 - np.exp(-t / TAU_TEMP)))
 
 
-def _densidad_desde_ratio(ratio_agua_cal: float) -> float:
+def _densidad_desde_ratio(ratio_agua_cal):
     """
     Densidad lechada a partir de relación agua/cal (Coloma ~4:1 → 1.15–1.25 g/cm³).
-    Más agua → menor densidad; más cal → mayor densidad.
+    Más agua → menor densidad; más cal → mayor densidad. Acepta escalar o arreglo.
     """
     # ratio 4:1 → densidad objetivo ~1.20; desviaciones suaves
     objetivo = 1.20
-    if ratio_agua_cal > 5.0:
-        return max(DENSIDAD_MIN, objetivo - 0.05)
-    if ratio_agua_cal < 3.0:
-        return min(DENSIDAD_MAX, objetivo + 0.05)
-    return np.clip(objetivo + (3.5 - ratio_agua_cal) * 0.02, DENSIDAD_MIN, DENSIDAD_MAX)
+    ratio_agua_cal = np.asarray(ratio_agua_cal, dtype=float)
+    return np.where(
+        ratio_agua_cal > 5.0, max(DENSIDAD_MIN, objetivo - 0.05),
+        np.where(
+            ratio_agua_cal < 3.0, min(DENSIDAD_MAX, objetivo + 0.05),
+            np.clip(objetivo + (3.5 - ratio_agua_cal) * 0.02, DENSIDAD_MIN, DENSIDAD_MAX),
+        ),
+    )
 
 
-def _ph_desde_densidad(densidad: float) -> float:
+def _ph_desde_densidad(densidad):
     """
     pH como función de la densidad (estabilidad del reactivo, Coloma).
     Función logarítmica; si densidad < 1.10, pH baja rápidamente (lechada pobre).
+    Acepta escalar o arreglo.
     """
-    if densidad >= DENSIDAD_UMBRAL_PH:
-        # Zona estable: relación logarítmica suave
-        ph = PH_NOMINAL_BASE + PH_LOG_FACTOR * np.log10(densidad / 1.18)
-        return np.clip(ph, 11.5, 12.6)
+    densidad = np.asarray(densidad, dtype=float)
+    # Zona estable: relación logarítmica suave
+    ph_estable = np.clip(PH_NOMINAL_BASE + PH_LOG_FACTOR * np.log10(densidad / 1.18), 11.5, 12.6)
     # Densidad < 1.10: caída rápida del pH
-    ph = 11.0 + 10.0 * (densidad - 1.0)
-    return np.clip(ph, 9.0, 12.0)
+    ph_pobre = np.clip(11.0 + 10.0 * (densidad - 1.0), 9.0, 12.0)
+    return np.where(densidad >= DENSIDAD_UMBRAL_PH, ph_estable, ph_pobre)
+
+
+def _paso_anterior(valores: np.ndarray, inicial=0) -> np.ndarray:
+    """Valor del paso previo (RUN_FB = CMD_RUN con 1 paso de retraso)."""
+    previo = np.empty_like(valores)
+    if valores.size:
+        previo[0] = inicial
+        previo[1:] = valores[:-1]
+    return previo
+
+
+def _pasos_consecutivos(condicion: np.ndarray, previos: int = 0) -> np.ndarray:
+    """
+    Cantidad de pasos seguidos (incluido el actual) en que `condicion` se cumple; 0 si no se cumple.
+    `previos` es la racha que venía del bloque anterior.
+    """
+    indices = np.arange(condicion.size)
+    ultimo_falso = np.maximum.accumulate(np.where(condicion, -1, indices))
+    return indices - ultimo_falso + np.where(ultimo_falso < 0, previos, 0)
+
+
+def _round_python(valores: np.ndarray, decimales: int) -> np.ndarray:
+    """round() de Python elemento a elemento (redondeo decimal exacto, no el de np.round)."""
+    return np.array([round(v, decimales) for v in valores.tolist()], dtype=float)
+
+
+def _timestamps_iso(t0: datetime, paso: np.ndarray, dt_seconds: float) -> list[str]:
+    """
+    Timestamps ISO8601 con milisegundos y sufijo Z: t0 + paso·dt, con la misma resolución que
+    timedelta(seconds=...) (microsegundos, redondeo al par) y truncados a milisegundos.
+    """
+    segundos = paso * dt_seconds
+    fraccion, entero = np.modf(segundos)
+    offset_us = entero.astype(np.int64) * 1_000_000 + np.rint(fraccion * 1_000_000).astype(np.int64)
+    base = np.datetime64(t0.astimezone(timezone.utc).replace(tzinfo=None), "us")
+    instantes = base + offset_us.astype("timedelta64[us]")
+    return [s + "Z" for s in np.datetime_as_string(instantes, unit="ms", casting="unsafe").tolist()]
+
+
+TAMANO_BLOQUE_SIMULACION = 10_000  # Pasos por bloque en la generación por streaming
+
+
+class EstadoSimulacion(NamedTuple):
+    """
+    Estado que la simulación arrastra de un paso al siguiente. Al terminar un bloque se
+    guarda el del último paso para continuar el siguiente sin diferencias con una corrida única.
+    """
+    nivel_silo: float
+    tornillo_on: bool = False       # Comando tornillo/válvula/blower/activador (RUN_FB con 1 paso de retraso)
+    reaccion: bool = False          # Comando slaker
+    produccion: bool = False        # Comando bombas PP-208/PP-098/PP-300
+    cmd_run_agitador: bool = False
+    run_fb_agitador: bool = False
+    speed_fault_steps: int = 0
+    steps_agitador_on: int = 0
+    speed_fb_blower: float = 0.0
+    nivel_camara: float = 45.0
+    flujo_agua: float = 0.0
+    salida_tic_11801: float = 0.0
 
 
 def run_simulation(
@@ -180,6 +251,9 @@ def run_simulation(
     paso_agua_on: int = 5,
     dt_seconds: float = 1.0,
     seed: Optional[int] = None,
+    t0: Optional[datetime] = None,
+    ratio_agua_cal: float = RATIO_AGUA_CAL,
+    rng: Optional[np.random.Generator] = None,
 ) -> pd.DataFrame:
     """
     Ejecuta la simulación física de las 5 fases para `num_steps` pasos.
@@ -187,320 +261,365 @@ def run_simulation(
     - Reacción: con flujo cal y agua, temperatura sigue curva de reactividad 25°C → 75–85°C.
     - Densidad: calculada por relación agua/cal ~4:1 → 1.15–1.25 g/cm³.
     - Alarmas: LSHH=1 si nivel > 95%; LSLL=1 si nivel < 5%.
+    Cada señal se calcula como columna completa con NumPy; solo las recurrencias no lineales
+    (velocidad del blower y nivel de cámara) quedan en un bucle escalar. Para una misma
+    semilla el resultado es idéntico al de la simulación paso a paso. `t0` fija el primer
+    timestamp (por defecto, ahora en UTC).
+    Si se entrega `rng` (np.random.default_rng) el ruido sale de ese generador y no se toca
+    el estado global de NumPy; si no, se usa np.random con `seed`, como antes.
     """
-    if seed is not None:
-        np.random.seed(seed)
+    if rng is None:
+        if seed is not None:
+            np.random.seed(seed)
+        rng = np.random
+    if t0 is None:
+        t0 = datetime.now(timezone.utc)
+    if num_steps <= 0:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+    df, _ = _simular_bloque(
+        np.arange(num_steps), EstadoSimulacion(nivel_silo=nivel_silo_inicial), rng,
+        paso_tornillo_on, paso_tornillo_off, paso_agua_on, dt_seconds, t0, ratio_agua_cal,
+    )
+    return df
 
-    t0 = datetime.now(timezone.utc)
-    rows = []
-    nivel_silo = nivel_silo_inicial
-    nivel_camara = 45.0
+
+def iter_simulation_chunks(
+    num_steps: int = NUM_STEPS,
+    chunk_size: int = TAMANO_BLOQUE_SIMULACION,
+    nivel_silo_inicial: float = 70.0,
+    paso_tornillo_on: int = 5,
+    paso_tornillo_off: int = 95,
+    paso_agua_on: int = 5,
+    dt_seconds: float = 1.0,
+    seed: Optional[int] = None,
+    t0: Optional[datetime] = None,
+    ratio_agua_cal: float = RATIO_AGUA_CAL,
+    rng: Optional[np.random.Generator] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Igual que run_simulation, pero entrega la corrida en DataFrames de hasta `chunk_size` filas,
+    arrastrando el estado de la planta entre bloques. La memoria depende del bloque y no de
+    `num_steps`; concatenar los bloques da el mismo resultado que run_simulation con la misma semilla.
+    Con semilla (o `rng`) se usa un generador propio, así otros usos de np.random entre bloques
+    no alteran la corrida.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size debe ser mayor que 0")
+    if rng is None:
+        rng = np.random.RandomState(seed) if seed is not None else np.random
+    if t0 is None:
+        t0 = datetime.now(timezone.utc)
+    estado = EstadoSimulacion(nivel_silo=nivel_silo_inicial)
+    for inicio in range(0, num_steps, chunk_size):
+        paso = np.arange(inicio, min(inicio + chunk_size, num_steps))
+        df, estado = _simular_bloque(
+            paso, estado, rng, paso_tornillo_on, paso_tornillo_off, paso_agua_on, dt_seconds, t0, ratio_agua_cal,
+        )
+        df.index = paso
+        yield df
+
+
+def _simular_bloque(
+    paso: np.ndarray,
+    estado: EstadoSimulacion,
+    rng,
+    paso_tornillo_on: int,
+    paso_tornillo_off: int,
+    paso_agua_on: int,
+    dt_seconds: float,
+    t0: datetime,
+    ratio_agua_cal: float = RATIO_AGUA_CAL,
+) -> tuple[pd.DataFrame, EstadoSimulacion]:
+    """
+    Simula los pasos `paso` (consecutivos, no vacío) partiendo de `estado`.
+    Retorna el DataFrame del bloque y el estado del último paso.
+    """
+    num_steps = paso.size
     # Presión filtro: depende de nivel y de si hay dosificación (polvo)
     presion_filtro_base = 0.5
     # Presión aceite bombas (PSI), estable en operación
     presion_aceite_nominal = 65.0
-    # Estado previo para Blower (RUN_FB con 1 paso de retraso; SPEED_FB asintótica)
-    cmd_run_blower_prev = 0
-    speed_fb_blower = 0.0
-    # Estado previo Fase 2: RUN_FB con 1 paso de retraso; contador falla de transmisión
-    cmd_run_tornillo_prev = 0
-    cmd_run_valvula_prev = 0
-    speed_fault_steps = 0
-    flujo_agua_prev = 0.0
-    cmd_run_slaker_prev = 0
-    cmd_run_agitador_prev = 0
-    run_fb_agitador_prev = 0
-    steps_agitador_on = 0
-    cmd_run_pp208_prev = 0
-    cmd_run_pp098_prev = 0
-    cmd_run_pp300_prev = 0
-
-    for paso in range(num_steps):
-        ts = t0 + timedelta(seconds=paso * dt_seconds)
-        timestamp_iso = ts.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
-
-        # --- Fase 2: Dosificación (causa) ---
-        tornillo_on = 1 if paso_tornillo_on <= paso < paso_tornillo_off else 0
-        valvula_on = 1 if paso_tornillo_on <= paso < paso_tornillo_off else 0
-        if tornillo_on:
-            # Pesómetro 5–15 Ton/h (ligera variación física, no aleatoria pura)
-            wi = WI_MIN + (WI_MAX - WI_MIN) * (0.5 + 0.1 * np.sin(paso * 0.3) + 0.05 * np.cos(paso * 0.7))
-            wi = np.clip(wi, WI_MIN, WI_MAX)
-        else:
-            wi = 0.0
-
-        # --- Fase 2 — Tornillo (ZM-009-04) y Válvula rotatoria (SAL-11818) — transferencia de masa Coloma
-        cmd_run_tornillo = tornillo_on
-        cmd_run_valvula = valvula_on
-        run_fb_tornillo = cmd_run_tornillo_prev
-        run_fb_valvula = cmd_run_valvula_prev
-        # SPEED_REF tornillo: proporcional al pesómetro (10 Ton/h → 35 Hz)
-        speed_ref_tornillo = wi * WI_TO_SPEED_HZ
-        speed_ref_tornillo = np.clip(speed_ref_tornillo, 0.0, 55.0)
-        if run_fb_tornillo:
-            speed_fb_tornillo = speed_ref_tornillo  # vinculado directamente al flujo (ley de transferencia)
-        else:
-            speed_fb_tornillo = 0.0
-        # Corriente y potencia tornillo: lineales con flujo (Ton/h); cero si motor parado
-        if run_fb_tornillo:
-            motor_current_tornillo = SCREW_CURRENT_BASE_A + SCREW_CURRENT_PER_TONH * wi
-            motor_power_tornillo = SCREW_POWER_BASE_KW + SCREW_POWER_PER_TONH_KW * wi
-            motor_current_tornillo = np.clip(motor_current_tornillo, 0.5, 35.0)
-            motor_power_tornillo = np.clip(motor_power_tornillo, 0.2, 12.0)
-        else:
-            motor_current_tornillo = 0.0
-            motor_power_tornillo = 0.0
-        # Discrepancia SPEED_REF > 0 y SPEED_FB = 0 por ≥3 pasos → Falla de transmisión
-        if speed_ref_tornillo > 0 and speed_fb_tornillo == 0:
-            speed_fault_steps = speed_fault_steps + 1
-        else:
-            speed_fault_steps = 0
-        transmission_fault = 1 if speed_fault_steps >= TRANSMISSION_FAULT_STEPS else 0
-        # Válvula rotatoria: activa con tornillo (sello del silo); velocidad fija 20 Hz, corriente estable
-        if run_fb_valvula:
-            valve_speed_fb = VALVE_SPEED_FB_HZ
-            valve_motor_current = VALVE_MOTOR_CURRENT_A + 0.1 * np.sin(paso * 0.5)  # estable con poco ruido
-            valve_motor_current = np.clip(valve_motor_current, 2.0, 3.5)
-        else:
-            valve_speed_fb = 0.0
-            valve_motor_current = 0.0
-        cmd_run_tornillo_prev = cmd_run_tornillo
-        cmd_run_valvula_prev = cmd_run_valvula
-
-        # --- Fase 1: Silo (efecto del consumo) ---
-        if tornillo_on:
-            nivel_silo = nivel_silo - CONSUMO_NIVEL_POR_PASO
-        nivel_silo = np.clip(nivel_silo, 0.0, 100.0)
-        lshh = 1 if nivel_silo > 95.0 else 0
-        lsll = 1 if nivel_silo < 5.0 else 0
-        # Presión filtro: sube con nivel (más carga) y con dosificación (polvo)
-        pda = presion_filtro_base + 0.008 * nivel_silo + (0.15 if tornillo_on else 0.0)
-        pda = np.clip(pda, 0.2, 1.2)
-
-        # --- Fase 1 — Blower (ZM-009-02) y Activador de fondo (ZM-009-14) ---
-        # Descarga neumática: blower se activa cuando hay dosificación (tornillo)
-        descarga_neumatica = tornillo_on
-        cmd_run_blower = 1 if descarga_neumatica else 0
-        run_fb_blower = cmd_run_blower_prev  # RUN_FB sigue al comando con 1 paso de retraso
-        vfd_fault_blower = 0  # sin fallo en simulación normal
-        speed_ref_blower = SPEED_REF_BLOWER_HZ
-        if run_fb_blower:
-            speed_fb_blower = speed_fb_blower + TAU_SPEED_BLOWER * (speed_ref_blower - speed_fb_blower)
-        else:
-            speed_fb_blower = speed_fb_blower * 0.85  # rampa de bajada
-        speed_fb_blower = np.clip(speed_fb_blower, 0.0, speed_ref_blower)
-        # Corriente blower: proporcional a velocidad; aumenta con presión del filtro (mayor esfuerzo)
-        if run_fb_blower and not vfd_fault_blower:
-            motor_current_blower = (
-                BLOWER_CURRENT_BASE_A * (speed_fb_blower / speed_ref_blower)
-                + BLOWER_CURRENT_PRESSURE_FACTOR * (pda - 0.2)
-            )
-            motor_current_blower = np.clip(motor_current_blower, 0.5, 55.0)
-        else:
-            motor_current_blower = 0.0
-        cmd_run_blower_prev = cmd_run_blower
-
-        # Activador de fondo (ZM-009-14): ON cuando tornillo Fase 2 opera (evitar rat-hole / puenteo Coloma)
-        activador_cmd = 1 if tornillo_on else 0
-        activador_fb = activador_cmd
-        if activador_fb:
-            activador_current = ACTIVADOR_CURRENT_BASE_A + (np.random.rand() - 0.5) * 2.0 * ACTIVADOR_CURRENT_NOISE_A
-            activador_current = np.clip(activador_current, 0.5, 8.0)
-        else:
-            activador_current = 0.0
-
-        # --- Fase 3: Hidratación (flujo agua + curva de temperatura) ---
-        agua_on = 1 if paso_agua_on <= paso < paso_tornillo_off else 0
-        if agua_on and tornillo_on:
-            # Flujo agua proporcional a relación 4:1 con pesómetro
-            flujo_agua = wi * RATIO_AGUA_CAL
-            flujo_agua = np.clip(flujo_agua, 20.0, 60.0)
-            motor_slaker = 1
-            paso_inicio_reaccion = min(paso_tornillo_on, paso_agua_on)
-            temp_slaker_base = _curva_reactividad(paso, paso_inicio_reaccion)
-            temp_slaker_base = temp_slaker_base + 0.3 * np.sin(paso * 0.2)
-            temp_slaker_base = np.clip(temp_slaker_base, TEMP_AMBIENTE, TEMP_ESTABLE_MAX + 2.0)
-            # Sensores duales: A = base, B = base + desviación ±0.5°C (redundancia real)
-            temp_slaker_a = temp_slaker_base
-            temp_slaker_b = temp_slaker_base + (np.random.rand() - 0.5) * 2.0 * TEMP_SLAKER_DEVIATION_C
-            temp_slaker_b = np.clip(temp_slaker_b, TEMP_AMBIENTE, TEMP_ESTABLE_MAX + 3.0)
-        else:
-            flujo_agua = 0.0
-            motor_slaker = 0
-            if paso < paso_agua_on:
-                temp_slaker_a = TEMP_AMBIENTE
-                temp_slaker_b = TEMP_AMBIENTE
-            else:
-                temp_cool = max(TEMP_AMBIENTE, 80.0 - (paso - paso_tornillo_off) * 0.5)
-                temp_slaker_a = temp_cool
-                temp_slaker_b = temp_cool + (np.random.rand() - 0.5) * 2.0 * TEMP_SLAKER_DEVIATION_C
-                temp_slaker_b = np.clip(temp_slaker_b, TEMP_AMBIENTE, 95.0)
-        # TAHH-11801: señal digital = 1 si cualquiera de las temperaturas supera 90°C
-        tahh_11801 = 1 if max(temp_slaker_a, temp_slaker_b) > TAHH_TEMP_THRESHOLD_C else 0
-        # Presión agua (PALL-11834): estable ~300 kPa con flujo; caída transitoria si flujo sube bruscamente
-        if flujo_agua > 0:
-            presion_agua = PRESION_AGUA_NOMINAL_KPA
-            if flujo_agua_prev > 0 and flujo_agua > flujo_agua_prev * 1.15:
-                presion_agua = PRESION_AGUA_NOMINAL_KPA - PRESION_AGUA_CAIDA_TRANSITORIA_KPA
-            presion_agua = np.clip(presion_agua, 250.0, 320.0)
-        else:
-            presion_agua = 0.0
-        flujo_agua_prev = flujo_agua
-        # Motor slaker: CMD_RUN y RUN_FB con retraso 1 paso; SPEED_FB y eléctricos se calculan tras tener densidad
-        cmd_run_slaker = motor_slaker
-        run_fb_slaker = cmd_run_slaker_prev
-        cmd_run_slaker_prev = cmd_run_slaker
-
-        # --- Fase 4: Separación ---
-        if tornillo_on and agua_on:
-            # Nivel cámara sube con alimentación, con balance de salida
-            nivel_camara = nivel_camara + 0.06 - 0.04
-        else:
-            nivel_camara = nivel_camara - 0.02
-        nivel_camara = np.clip(nivel_camara, 10.0, 80.0)
-        # Agitador (ZM-009-31): CMD_RUN si nivel > 40%; RUN_FB sigue al comando; rampa velocidad 0→100% en 5 s
-        cmd_run_agitador = 1 if nivel_camara > AGITATOR_LEVEL_THRESHOLD_PCT else 0
-        run_fb_agitador = cmd_run_agitador_prev
-        if run_fb_agitador:
-            steps_agitador_on = min(AGITATOR_RAMP_STEPS, steps_agitador_on + 1)
-        else:
-            steps_agitador_on = 0
-        speed_ref_agitador = 100.0 if cmd_run_agitador else 0.0
-        speed_fb_agitador = 100.0 * (steps_agitador_on / AGITATOR_RAMP_STEPS) if run_fb_agitador else 0.0
-        cmd_run_agitador_prev = cmd_run_agitador
-        agitador = int(run_fb_agitador)  # DI refleja estado real de marcha
-
-        # --- Fase 5: Distribución y almacenamiento final (calidad, bombas, tanques) ---
-        produccion = wi > 0 and flujo_agua > 0
-        if produccion:
-            ratio = flujo_agua / wi
-            densidad = _densidad_desde_ratio(ratio)
-            ph = _ph_desde_densidad(densidad)
-        else:
-            densidad = 1.0
-            ph = 7.5
-        # Bombas: PP-208 (principal a mina), PP-098, 2220-PP-300 — RUN_FB con 1 paso de retraso
-        cmd_run_pp208 = 1 if produccion else 0
-        cmd_run_pp098 = 1 if produccion else 0
-        cmd_run_pp300 = 1 if produccion else 0
-        run_fb_pp208 = cmd_run_pp208_prev
-        run_fb_pp098 = cmd_run_pp098_prev
-        run_fb_pp300 = cmd_run_pp300_prev
-        # Presión aceite (PIT-11895) vinculada a marcha de PP-208: nominal ~65 PSI con bomba, ~45 sin
-        if run_fb_pp208:
-            presion_aceite = presion_aceite_nominal + 2.0 * np.sin(paso * 0.1)
-            presion_aceite = np.clip(presion_aceite, 60.0, 75.0)
-        else:
-            presion_aceite = 45.0
-        # PP-208: SPEED_FB oscila 40–50 Hz; MOTOR_CURRENT con densidad (más densa = más corriente)
-        if run_fb_pp208:
-            speed_fb_pp208 = PP_208_SPEED_FB_MIN_HZ + (PP_208_SPEED_FB_MAX_HZ - PP_208_SPEED_FB_MIN_HZ) * (0.5 + 0.1 * np.sin(paso * 0.4))
-            speed_fb_pp208 = np.clip(speed_fb_pp208, PP_208_SPEED_FB_MIN_HZ, PP_208_SPEED_FB_MAX_HZ)
-            motor_current_pp208 = PP_208_CURRENT_BASE_A + PP_208_CURRENT_DENSITY_FACTOR * (densidad - 1.0)
-            motor_current_pp208 = np.clip(motor_current_pp208, 5.0, 65.0)
-        else:
-            speed_fb_pp208 = 0.0
-            motor_current_pp208 = 0.0
-        cmd_run_pp208_prev = cmd_run_pp208
-        cmd_run_pp098_prev = cmd_run_pp098
-        cmd_run_pp300_prev = cmd_run_pp300
-        # Agitadores tanques (TK-068/069): siempre en marcha para evitar sedimentación
-        tk068_ag_cmd_run = 1
-        tk068_ag_run_fb = 1
-        tk068_ag_motor_current = TK_068_AG_MOTOR_CURRENT_A + 0.1 * np.sin(paso * 0.3)
-        tk068_ag_motor_current = np.clip(tk068_ag_motor_current, 2.5, 3.5)
-        tk069_ag_cmd_run = 1
-        tk069_ag_run_fb = 1
-
-        # --- Fase 3 (continuación): Motor Slaker — corriente/potencia proporcionales a densidad ---
-        if run_fb_slaker and densidad >= 1.0:
-            motor_current_slaker = SLAKER_CURRENT_BASE_A + SLAKER_CURRENT_DENSITY_FACTOR * (densidad - 1.0)
-            motor_power_slaker = SLAKER_POWER_BASE_KW + SLAKER_POWER_DENSITY_FACTOR * (densidad - 1.0)
-            motor_current_slaker = np.clip(motor_current_slaker, 0.5, 28.0)
-            motor_power_slaker = np.clip(motor_power_slaker, 0.2, 12.0)
+
+    # --- Fase 2: Dosificación (causa) ---
+    tornillo_on = (paso_tornillo_on <= paso) & (paso < paso_tornillo_off)
+    valvula_on = tornillo_on
+    agua_on = (paso_agua_on <= paso) & (paso < paso_tornillo_off)
+    reaccion = agua_on & tornillo_on
+
+    # Ruido: mismo orden de extracción que la simulación paso a paso
+    # (por paso: corriente del activador si tornillo ON, luego TT-11824B desde que hay agua)
+    extrae_activador = tornillo_on
+    extrae_temp_b = paso >= paso_agua_on
+    por_paso = extrae_activador.astype(np.int64) + extrae_temp_b
+    ruido = rng.random(int(por_paso.sum()))
+    inicio_paso = np.cumsum(por_paso) - por_paso
+    ruido_activador = np.zeros(num_steps)
+    ruido_activador[extrae_activador] = ruido[inicio_paso[extrae_activador]]
+    ruido_temp_b = np.zeros(num_steps)
+    ruido_temp_b[extrae_temp_b] = ruido[(inicio_paso + extrae_activador)[extrae_temp_b]]
+
+    # Pesómetro 5–15 Ton/h (ligera variación física, no aleatoria pura)
+    wi = np.where(
+        tornillo_on,
+        np.clip(WI_MIN + (WI_MAX - WI_MIN) * (0.5 + 0.1 * np.sin(paso * 0.3) + 0.05 * np.cos(paso * 0.7)), WI_MIN, WI_MAX),
+        0.0,
+    )
+
+    # --- Fase 2 — Tornillo (ZM-009-04) y Válvula rotatoria (SAL-11818) — transferencia de masa Coloma
+    run_fb_tornillo = _paso_anterior(tornillo_on, estado.tornillo_on)
+    run_fb_valvula = _paso_anterior(valvula_on, estado.tornillo_on)
+    # SPEED_REF tornillo: proporcional al pesómetro (10 Ton/h → 35 Hz)
+    speed_ref_tornillo = np.clip(wi * WI_TO_SPEED_HZ, 0.0, 55.0)
+    speed_fb_tornillo = np.where(run_fb_tornillo, speed_ref_tornillo, 0.0)  # vinculado directamente al flujo
+    # Corriente y potencia tornillo: lineales con flujo (Ton/h); cero si motor parado
+    motor_current_tornillo = np.where(run_fb_tornillo, np.clip(SCREW_CURRENT_BASE_A + SCREW_CURRENT_PER_TONH * wi, 0.5, 35.0), 0.0)
+    motor_power_tornillo = np.where(run_fb_tornillo, np.clip(SCREW_POWER_BASE_KW + SCREW_POWER_PER_TONH_KW * wi, 0.2, 12.0), 0.0)
+    # Discrepancia SPEED_REF > 0 y SPEED_FB = 0 por ≥3 pasos → Falla de transmisión
+    speed_fault_steps = _pasos_consecutivos((speed_ref_tornillo > 0) & (speed_fb_tornillo == 0), estado.speed_fault_steps)
+    transmission_fault = speed_fault_steps >= TRANSMISSION_FAULT_STEPS
+    # Válvula rotatoria: activa con tornillo (sello del silo); velocidad fija 20 Hz, corriente estable
+    valve_speed_fb = np.where(run_fb_valvula, VALVE_SPEED_FB_HZ, 0.0)
+    valve_motor_current = np.where(run_fb_valvula, np.clip(VALVE_MOTOR_CURRENT_A + 0.1 * np.sin(paso * 0.5), 2.0, 3.5), 0.0)
+
+    # --- Fase 1: Silo (efecto del consumo) ---
+    # Consumo acumulado paso a paso (suma secuencial, igual que restar en cada paso);
+    # el nivel solo baja, así que una vez recortado en 0 queda en 0
+    consumo = np.where(tornillo_on, -CONSUMO_NIVEL_POR_PASO, 0.0)
+    nivel_silo = np.empty(num_steps)
+    nivel_silo[0] = np.clip(estado.nivel_silo + consumo[0], 0.0, 100.0)
+    nivel_silo[1:] = consumo[1:]
+    nivel_silo = np.clip(np.add.accumulate(nivel_silo), 0.0, 100.0)
+    lshh = nivel_silo > 95.0
+    lsll = nivel_silo < 5.0
+    # Presión filtro: sube con nivel (más carga) y con dosificación (polvo)
+    pda = np.clip(presion_filtro_base + 0.008 * nivel_silo + np.where(tornillo_on, 0.15, 0.0), 0.2, 1.2)
+
+    # --- Fase 1 — Blower (ZM-009-02) y Activador de fondo (ZM-009-14) ---
+    # Descarga neumática: blower se activa cuando hay dosificación (tornillo)
+    cmd_run_blower = tornillo_on
+    run_fb_blower = _paso_anterior(cmd_run_blower, estado.tornillo_on)  # RUN_FB sigue al comando con 1 paso de retraso
+    vfd_fault_blower = np.zeros(num_steps, dtype=bool)  # sin fallo en simulación normal
+    speed_ref_blower = SPEED_REF_BLOWER_HZ
+    # SPEED_FB asintótica hacia SPEED_REF en marcha, rampa de bajada si no (recurrencia no lineal)
+    speed_fb_blower = np.empty(num_steps)
+    velocidad = estado.speed_fb_blower
+    for i, en_marcha in enumerate(run_fb_blower.tolist()):
+        if en_marcha:
+            velocidad = velocidad + TAU_SPEED_BLOWER * (speed_ref_blower - velocidad)
         else:
-            motor_current_slaker = 0.0
-            motor_power_slaker = 0.0
-        speed_fb_slaker = SLAKER_SPEED_FB_HZ if run_fb_slaker else 0.0
-
-        # --- Fase 4 (continuación): Corriente agitador (proporcional a densidad + 20% si re-arranque) ---
-        if run_fb_agitador and densidad >= 1.0:
-            motor_current_agitador = AGITATOR_CURRENT_BASE_A + AGITATOR_CURRENT_DENSITY_FACTOR * (densidad - 1.0)
-            if run_fb_agitador_prev == 0:  # re-arranque: mayor corriente por sedimentación (Coloma)
-                motor_current_agitador *= AGITATOR_RESTART_CURRENT_FACTOR
-            motor_current_agitador = np.clip(motor_current_agitador, 0.5, 30.0)
+            velocidad = velocidad * 0.85
+        velocidad = min(max(velocidad, 0.0), speed_ref_blower)
+        speed_fb_blower[i] = velocidad
+    # Corriente blower: proporcional a velocidad; aumenta con presión del filtro (mayor esfuerzo)
+    motor_current_blower = np.where(
+        run_fb_blower & ~vfd_fault_blower,
+        np.clip(
+            BLOWER_CURRENT_BASE_A * (speed_fb_blower / speed_ref_blower)
+            + BLOWER_CURRENT_PRESSURE_FACTOR * (pda - 0.2),
+            0.5, 55.0,
+        ),
+        0.0,
+    )
+
+    # Activador de fondo (ZM-009-14): ON cuando tornillo Fase 2 opera (evitar rat-hole / puenteo Coloma)
+    activador_cmd = tornillo_on
+    activador_fb = activador_cmd
+    activador_current = np.where(
+        activador_fb,
+        np.clip(ACTIVADOR_CURRENT_BASE_A + (ruido_activador - 0.5) * 2.0 * ACTIVADOR_CURRENT_NOISE_A, 0.5, 8.0),
+        0.0,
+    )
+
+    # --- Fase 3: Hidratación (flujo agua + curva de temperatura) ---
+    # Flujo agua proporcional a la relación agua/cal (4:1 nominal) con pesómetro
+    flujo_agua = np.where(reaccion, np.clip(wi * ratio_agua_cal, 20.0, 60.0), 0.0)
+    motor_slaker = reaccion
+    paso_inicio_reaccion = min(paso_tornillo_on, paso_agua_on)
+    temp_reaccion = np.clip(
+        _curva_reactividad(paso, paso_inicio_reaccion) + 0.3 * np.sin(paso * 0.2),
+        TEMP_AMBIENTE, TEMP_ESTABLE_MAX + 2.0,
+    )
+    temp_enfriamiento = np.maximum(TEMP_AMBIENTE, 80.0 - (paso - paso_tornillo_off) * 0.5)
+    desviacion_b = (ruido_temp_b - 0.5) * 2.0 * TEMP_SLAKER_DEVIATION_C
+    # Sensores duales: A = base, B = base + desviación ±0.5°C (redundancia real)
+    temp_slaker_a = np.where(
+        reaccion, temp_reaccion,
+        np.where(paso < paso_agua_on, TEMP_AMBIENTE, temp_enfriamiento),
+    )
+    temp_slaker_b = np.where(
+        reaccion, np.clip(temp_reaccion + desviacion_b, TEMP_AMBIENTE, TEMP_ESTABLE_MAX + 3.0),
+        np.where(paso < paso_agua_on, TEMP_AMBIENTE, np.clip(temp_enfriamiento + desviacion_b, TEMP_AMBIENTE, 95.0)),
+    )
+    # TAHH-11801: señal digital = 1 si cualquiera de las temperaturas supera 90°C
+    tahh_11801 = np.maximum(temp_slaker_a, temp_slaker_b) > TAHH_TEMP_THRESHOLD_C
+    # Presión agua (PALL-11834): estable ~300 kPa con flujo; caída transitoria si flujo sube bruscamente
+    flujo_agua_prev = _paso_anterior(flujo_agua, estado.flujo_agua)
+    caida = (flujo_agua_prev > 0) & (flujo_agua > flujo_agua_prev * 1.15)
+    presion_agua = np.where(
+        flujo_agua > 0,
+        np.clip(np.where(caida, PRESION_AGUA_NOMINAL_KPA - PRESION_AGUA_CAIDA_TRANSITORIA_KPA, PRESION_AGUA_NOMINAL_KPA), 250.0, 320.0),
+        0.0,
+    )
+    # TIC-11801 (PV = TT-11824A): salida solo en hidratación; TV-11801 la sigue con 1 paso de retraso
+    salida_tic_11801 = np.where(
+        reaccion,
+        np.clip(TIC_11801_SALIDA_BASE_PCT + TIC_11801_GANANCIA_PCT_POR_C * (temp_slaker_a - TIC_11801_SETPOINT_C), 0.0, 100.0),
+        0.0,
+    )
+    posicion_tv_11801 = _paso_anterior(salida_tic_11801, estado.salida_tic_11801)
+    posicion_hv_11808 = np.where(agua_on, HV_11808_APERTURA_PCT, 0.0)
+    # Motor slaker: CMD_RUN y RUN_FB con retraso 1 paso
+    cmd_run_slaker = motor_slaker
+    run_fb_slaker = _paso_anterior(cmd_run_slaker, estado.reaccion)
+
+    # --- Fase 4: Separación ---
+    # Nivel cámara sube con alimentación, con balance de salida (recurrencia con saturación)
+    nivel_camara = np.empty(num_steps)
+    nivel = estado.nivel_camara
+    for i, alimentando in enumerate(reaccion.tolist()):
+        if alimentando:
+            nivel = nivel + 0.06 - 0.04
         else:
-            motor_current_agitador = 0.0
-        dry_run_fault = 1 if (nivel_camara < 5.0 and run_fb_agitador) else 0
-        run_fb_agitador_prev = run_fb_agitador
-
-        row = {
-            "timestamp": timestamp_iso,
-            "2270-LIT-11825": round(nivel_silo, 4),
-            "2270-LSHH-11826": int(lshh),
-            "2270-LSLL-11829": int(lsll),
-            "2270-PDAH-11827": round(pda, 4),
-            "2270-ZM-009-02_CMD_RUN": int(cmd_run_blower),
-            "2270-ZM-009-02_RUN_FB": int(run_fb_blower),
-            "2270-ZM-009-02_VFD_FAULT": int(vfd_fault_blower),
-            "2270-ZM-009-02_SPEED_REF": round(speed_ref_blower, 4),
-            "2270-ZM-009-02_SPEED_FB": round(speed_fb_blower, 4),
-            "2270-ZM-009-02_MOTOR_CURRENT": round(motor_current_blower, 4),
-            "2270-ZM-009-14_CMD_RUN": int(activador_cmd),
-            "2270-ZM-009-14_RUN_FB": int(activador_fb),
-            "2270-ZM-009-14_MOTOR_CURRENT": round(activador_current, 4),
-            "2280-WI-01769": round(wi, 4),
-            "2270-SAL-11817": int(tornillo_on),
-            "2270-SAL-11818": int(valvula_on),
-            "2270-ZM-009-04_CMD_RUN": int(cmd_run_tornillo),
-            "2270-ZM-009-04_RUN_FB": int(run_fb_tornillo),
-            "2270-ZM-009-04_SPEED_REF": round(speed_ref_tornillo, 4),
-            "2270-ZM-009-04_SPEED_FB": round(speed_fb_tornillo, 4),
-            "2270-ZM-009-04_MOTOR_CURRENT": round(motor_current_tornillo, 4),
-            "2270-ZM-009-04_MOTOR_POWER": round(motor_power_tornillo, 4),
-            "2270-ZM-009-04_TRANSMISSION_FAULT": int(transmission_fault),
-            "2270-SAL-11818_MOTOR_CURRENT": round(valve_motor_current, 4),
-            "2270-SAL-11818_SPEED_FB": round(valve_speed_fb, 4),
-            "2270-FIT-11801": round(flujo_agua, 4),
-            "2270-TT-11824A": round(float(temp_slaker_a), 4),
-            "2270-TT-11824B": round(float(temp_slaker_b), 4),
-            "2270-TAHH-11801": int(tahh_11801),
-            "2270-PALL-11834": round(presion_agua, 4),
-            "2270-ZM-009-06": int(motor_slaker),
-            "2270-ZM-009-06_CMD_RUN": int(cmd_run_slaker),
-            "2270-ZM-009-06_RUN_FB": int(run_fb_slaker),
-            "2270-ZM-009-06_SPEED_FB": round(speed_fb_slaker, 4),
-            "2270-ZM-009-06_MOTOR_CURRENT": round(motor_current_slaker, 4),
-            "2270-ZM-009-06_MOTOR_POWER": round(motor_power_slaker, 4),
-            "2270-LIT-11850": round(nivel_camara, 4),
-            "2270-ZM-009-31": int(agitador),
-            "2270-ZM-009-31_CMD_RUN": int(cmd_run_agitador),
-            "2270-ZM-009-31_RUN_FB": int(run_fb_agitador),
-            "2270-ZM-009-31_SPEED_REF": round(speed_ref_agitador, 4),
-            "2270-ZM-009-31_SPEED_FB": round(speed_fb_agitador, 4),
-            "2270-ZM-009-31_MOTOR_CURRENT": round(motor_current_agitador, 4),
-            "2270-ZM-009-31_DRY_RUN_FAULT": int(dry_run_fault),
-            "DT-2270-HDR": round(densidad, 4),
-            "pHT-2270-RGH": round(ph, 4),
-            "2270-PIT-11895": round(presion_aceite, 4),
-            "2270-TK-068_AG_CMD_RUN": int(tk068_ag_cmd_run),
-            "2270-TK-068_AG_RUN_FB": int(tk068_ag_run_fb),
-            "2270-TK-068_AG_MOTOR_CURRENT": round(tk068_ag_motor_current, 4),
-            "2270-TK-069_AG_CMD_RUN": int(tk069_ag_cmd_run),
-            "2270-TK-069_AG_RUN_FB": int(tk069_ag_run_fb),
-            "2270-PP-208_CMD_RUN": int(cmd_run_pp208),
-            "2270-PP-208_RUN_FB": int(run_fb_pp208),
-            "2270-PP-208_SPEED_FB": round(speed_fb_pp208, 4),
-            "2270-PP-208_MOTOR_CURRENT": round(motor_current_pp208, 4),
-            "2270-PP-098_CMD_RUN": int(cmd_run_pp098),
-            "2270-PP-098_RUN_FB": int(run_fb_pp098),
-            "2220-PP-300_CMD_RUN": int(cmd_run_pp300),
-            "2220-PP-300_RUN_FB": int(run_fb_pp300),
-        }
-        rows.append(row)
-
-    df = pd.DataFrame(rows, columns=OUTPUT_COLUMNS)
-    return df
+            nivel = nivel - 0.02
+        nivel = min(max(nivel, 10.0), 80.0)
+        nivel_camara[i] = nivel
+    # Agitador (ZM-009-31): CMD_RUN si nivel > 40%; RUN_FB sigue al comando; rampa velocidad 0→100% en 5 s
+    cmd_run_agitador = nivel_camara > AGITATOR_LEVEL_THRESHOLD_PCT
+    run_fb_agitador = _paso_anterior(cmd_run_agitador, estado.cmd_run_agitador)
+    steps_agitador_on = np.minimum(AGITATOR_RAMP_STEPS, _pasos_consecutivos(run_fb_agitador, estado.steps_agitador_on))
+    speed_ref_agitador = np.where(cmd_run_agitador, 100.0, 0.0)
+    speed_fb_agitador = np.where(run_fb_agitador, 100.0 * (steps_agitador_on / AGITATOR_RAMP_STEPS), 0.0)
+    agitador = run_fb_agitador  # DI refleja estado real de marcha
+
+    # --- Fase 5: Distribución y almacenamiento final (calidad, bombas, tanques) ---
+    produccion = (wi > 0) & (flujo_agua > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = flujo_agua / wi
+    densidad = np.where(produccion, _densidad_desde_ratio(ratio), 1.0)
+    ph = np.where(produccion, _ph_desde_densidad(densidad), 7.5)
+    # Bombas: PP-208 (principal a mina), PP-098, 2220-PP-300 — RUN_FB con 1 paso de retraso
+    cmd_run_pp208 = cmd_run_pp098 = cmd_run_pp300 = produccion
+    run_fb_pp208 = _paso_anterior(cmd_run_pp208, estado.produccion)
+    run_fb_pp098 = _paso_anterior(cmd_run_pp098, estado.produccion)
+    run_fb_pp300 = _paso_anterior(cmd_run_pp300, estado.produccion)
+    # Presión aceite (PIT-11895) vinculada a marcha de PP-208: nominal ~65 PSI con bomba, ~45 sin
+    presion_aceite = np.where(run_fb_pp208, np.clip(presion_aceite_nominal + 2.0 * np.sin(paso * 0.1), 60.0, 75.0), 45.0)
+    # PP-208: SPEED_FB oscila 40–50 Hz; MOTOR_CURRENT con densidad (más densa = más corriente)
+    speed_fb_pp208 = np.where(
+        run_fb_pp208,
+        np.clip(
+            PP_208_SPEED_FB_MIN_HZ + (PP_208_SPEED_FB_MAX_HZ - PP_208_SPEED_FB_MIN_HZ) * (0.5 + 0.1 * np.sin(paso * 0.4)),
+            PP_208_SPEED_FB_MIN_HZ, PP_208_SPEED_FB_MAX_HZ,
+        ),
+        0.0,
+    )
+    motor_current_pp208 = np.where(run_fb_pp208, np.clip(PP_208_CURRENT_BASE_A + PP_208_CURRENT_DENSITY_FACTOR * (densidad - 1.0), 5.0, 65.0), 0.0)
+    # Agitadores tanques (TK-068/069): siempre en marcha para evitar sedimentación
+    siempre = np.ones(num_steps, dtype=bool)
+    tk068_ag_motor_current = np.clip(TK_068_AG_MOTOR_CURRENT_A + 0.1 * np.sin(paso * 0.3), 2.5, 3.5)
+
+    # --- Fase 3 (continuación): Motor Slaker — corriente/potencia proporcionales a densidad ---
+    slaker_con_carga = run_fb_slaker & (densidad >= 1.0)
+    motor_current_slaker = np.where(slaker_con_carga, np.clip(SLAKER_CURRENT_BASE_A + SLAKER_CURRENT_DENSITY_FACTOR * (densidad - 1.0), 0.5, 28.0), 0.0)
+    motor_power_slaker = np.where(slaker_con_carga, np.clip(SLAKER_POWER_BASE_KW + SLAKER_POWER_DENSITY_FACTOR * (densidad - 1.0), 0.2, 12.0), 0.0)
+    speed_fb_slaker = np.where(run_fb_slaker, SLAKER_SPEED_FB_HZ, 0.0)
+
+    # --- Fase 4 (continuación): Corriente agitador (proporcional a densidad + 20% si re-arranque) ---
+    corriente_agitador = AGITATOR_CURRENT_BASE_A + AGITATOR_CURRENT_DENSITY_FACTOR * (densidad - 1.0)
+    rearranque = ~_paso_anterior(run_fb_agitador, estado.run_fb_agitador)  # re-arranque: mayor corriente por sedimentación (Coloma)
+    corriente_agitador = np.where(rearranque, corriente_agitador * AGITATOR_RESTART_CURRENT_FACTOR, corriente_agitador)
+    motor_current_agitador = np.where(run_fb_agitador & (densidad >= 1.0), np.clip(corriente_agitador, 0.5, 30.0), 0.0)
+    dry_run_fault = (nivel_camara < 5.0) & run_fb_agitador
+
+    def entero(valores):
+        return np.broadcast_to(valores, (num_steps,)).astype(np.int64)
+
+    def real(valores):
+        return np.round(np.broadcast_to(np.asarray(valores, dtype=float), (num_steps,)), 4)
+
+    columnas = {
+        "timestamp": _timestamps_iso(t0, paso, dt_seconds),
+        "2270-LIT-11825": real(nivel_silo),
+        "2270-LSHH-11826": entero(lshh),
+        "2270-LSLL-11829": entero(lsll),
+        "2270-PDAH-11827": real(pda),
+        "2270-ZM-009-02_CMD_RUN": entero(cmd_run_blower),
+        "2270-ZM-009-02_RUN_FB": entero(run_fb_blower),
+        "2270-ZM-009-02_VFD_FAULT": entero(vfd_fault_blower),
+        "2270-ZM-009-02_SPEED_REF": real(speed_ref_blower),
+        "2270-ZM-009-02_SPEED_FB": real(speed_fb_blower),
+        "2270-ZM-009-02_MOTOR_CURRENT": real(motor_current_blower),
+        "2270-ZM-009-14_CMD_RUN": entero(activador_cmd),
+        "2270-ZM-009-14_RUN_FB": entero(activador_fb),
+        "2270-ZM-009-14_MOTOR_CURRENT": real(activador_current),
+        "2280-WI-01769": real(wi),
+        "2270-SAL-11817": entero(tornillo_on),
+        "2270-SAL-11818": entero(valvula_on),
+        "2270-ZM-009-04_CMD_RUN": entero(tornillo_on),
+        "2270-ZM-009-04_RUN_FB": entero(run_fb_tornillo),
+        "2270-ZM-009-04_SPEED_REF": real(speed_ref_tornillo),
+        "2270-ZM-009-04_SPEED_FB": real(speed_fb_tornillo),
+        "2270-ZM-009-04_MOTOR_CURRENT": real(motor_current_tornillo),
+        "2270-ZM-009-04_MOTOR_POWER": real(motor_power_tornillo),
+        "2270-ZM-009-04_TRANSMISSION_FAULT": entero(transmission_fault),
+        "2270-SAL-11818_MOTOR_CURRENT": real(valve_motor_current),
+        "2270-SAL-11818_SPEED_FB": real(valve_speed_fb),
+        "2270-FIT-11801": real(flujo_agua),
+        # Las temperaturas se redondeaban como float de Python: se conserva ese redondeo
+        "2270-TT-11824A": _round_python(temp_slaker_a, 4),
+        "2270-TT-11824B": _round_python(temp_slaker_b, 4),
+        "2270-TAHH-11801": entero(tahh_11801),
+        "2270-PALL-11834": real(presion_agua),
+        "2270-TIC-11801": _round_python(temp_slaker_a, 4),
+        "2270-TIC-11801_OUT": real(salida_tic_11801),
+        "2270-TV-11801": real(posicion_tv_11801),
+        "2270-HV-11808": real(posicion_hv_11808),
+        "2270-ZM-009-06": entero(motor_slaker),
+        "2270-ZM-009-06_CMD_RUN": entero(cmd_run_slaker),
+        "2270-ZM-009-06_RUN_FB": entero(run_fb_slaker),
+        "2270-ZM-009-06_SPEED_FB": real(speed_fb_slaker),
+        "2270-ZM-009-06_MOTOR_CURRENT": real(motor_current_slaker),
+        "2270-ZM-009-06_MOTOR_POWER": real(motor_power_slaker),
+        "2270-LIT-11850": real(nivel_camara),
+        "2270-ZM-009-31": entero(agitador),
+        "2270-ZM-009-31_CMD_RUN": entero(cmd_run_agitador),
+        "2270-ZM-009-31_RUN_FB": entero(run_fb_agitador),
+        "2270-ZM-009-31_SPEED_REF": real(speed_ref_agitador),
+        "2270-ZM-009-31_SPEED_FB": real(speed_fb_agitador),
+        "2270-ZM-009-31_MOTOR_CURRENT": real(motor_current_agitador),
+        "2270-ZM-009-31_DRY_RUN_FAULT": entero(dry_run_fault),
+        "DT-2270-HDR": real(densidad),
+        "pHT-2270-RGH": real(ph),
+        "2270-PIT-11895": real(presion_aceite),
+        "2270-TK-068_AG_CMD_RUN": entero(siempre),
+        "2270-TK-068_AG_RUN_FB": entero(siempre),
+        "2270-TK-068_AG_MOTOR_CURRENT": real(tk068_ag_motor_current),
+        "2270-TK-069_AG_CMD_RUN": entero(siempre),
+        "2270-TK-069_AG_RUN_FB": entero(siempre),
+        "2270-PP-208_CMD_RUN": entero(cmd_run_pp208),
+        "2270-PP-208_RUN_FB": entero(run_fb_pp208),
+        "2270-PP-208_SPEED_FB": real(speed_fb_pp208),
+        "2270-PP-208_MOTOR_CURRENT": real(motor_current_pp208),
+        "2270-PP-098_CMD_RUN": entero(cmd_run_pp098),
+        "2270-PP-098_RUN_FB": entero(run_fb_pp098),
+        "2220-PP-300_CMD_RUN": entero(cmd_run_pp300),
+        "2220-PP-300_RUN_FB": entero(run_fb_pp300),
+    }
+    siguiente = EstadoSimulacion(
+        nivel_silo=float(nivel_silo[-1]),
+        tornillo_on=bool(tornillo_on[-1]),
+        reaccion=bool(reaccion[-1]),
+        produccion=bool(produccion[-1]),
+        cmd_run_agitador=bool(cmd_run_agitador[-1]),
+        run_fb_agitador=bool(run_fb_agitador[-1]),
+        speed_fault_steps=int(speed_fault_steps[-1]),
+        steps_agitador_on=int(steps_agitador_on[-1]),
+        speed_fb_blower=float(speed_fb_blower[-1]),
+        nivel_camara=float(nivel_camara[-1]),
+        flujo_agua=float(flujo_agua[-1]),
+        salida_tic_11801=float(salida_tic_11801[-1]),
+    )
+    return pd.DataFrame(columnas, columns=OUTPUT_COLUMNS), siguiente
 
 
 def generate_data_to_csv(
@@ -519,6 +638,48 @@ def generate_data_to_csv(
     return df
 
 
+def write_simulation_chunks(
+    filepath: str | Path,
+    num_steps: int = NUM_STEPS,
+    chunk_size: int = TAMANO_BLOQUE_SIMULACION,
+    **kwargs,
+) -> int:
+    """
+    Genera la simulación por bloques (iter_simulation_chunks) y los va agregando a `filepath`
+    sin tener la corrida completa en memoria. El formato sale de la extensión: `.parquet`
+    (requiere pyarrow) o CSV en cualquier otro caso. Retorna la cantidad de filas escritas.
+    """
+    path = Path(filepath)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    chunks = iter_simulation_chunks(num_steps=num_steps, chunk_size=chunk_size, **kwargs)
+    filas = 0
+
+    if path.suffix.lower() == ".parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Escribir Parquet requiere pyarrow (pip install pyarrow)") from e
+        writer = None
+        try:
+            for chunk in chunks:
+                tabla = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, tabla.schema)
+                writer.write_table(tabla)
+                filas += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        return filas
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for chunk in chunks:
+            chunk.to_csv(f, index=False, header=(filas == 0))
+            filas += len(chunk)
+    return filas
+
+
 # Compatibilidad con código que instanciaba PlantSimulator
 class PlantSimulator:
     """
@@ -529,17 +690,24 @@ class PlantSimulator:
     def __init__(self):
         self.mode = "inactivo"
         self._cached_df: Optional[pd.DataFrame] = None
+        # Corrida precalculada como tuplas de escalares Python con un único tuple de claves
+        self._keys: tuple[str, ...] = ()
+        self._rows: list[tuple] = []
         self._tick_index = 0
 
+    def _materializar(self) -> None:
+        self._cached_df = run_simulation(num_steps=NUM_STEPS, seed=42)
+        self._keys = tuple(self._cached_df.columns)
+        self._rows = list(zip(*(self._cached_df[col].tolist() for col in self._keys)))
+
     def tick(self) -> dict:
         """
         Devuelve una fila de datos de sensores (un paso de simulación) como dict.
         Usa una simulación precalculada y cicla por sus filas para coherencia.
         """
-        if self._cached_df is None:
-            self._cached_df = run_simulation(num_steps=NUM_STEPS, seed=42)
-        idx = self._tick_index % len(self._cached_df)
-        row = self._cached_df.iloc[idx].to_dict()
+        if not self._rows:
+            self._materializar()
+        row = dict(zip(self._keys, self._rows[self._tick_index % len(self._rows)]))
         self._tick_index += 1
         return row
 
@@ -1,25 +1,67 @@
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, NamedTuple, Optional
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import logging
+import threading
+import uuid
+import numpy as np
 import pandas as pd
 
-# Importar la l?gica y el simulador
-from data_generator import PlantSimulator
+# Importar la lógica y el bucle de simulación
 from core_logic import (
     load_alarm_config_from_json,
-    determinar_modo_actual,
-    evaluar_alarmas_directo,
-    ReactivityMonitor
+    compilar_plan_alarmas,
+    MonitorReactividadMultilinea,
+    renderizar_alarmas,
 )
+from plant_runtime import BloqueoInstancia, PlantRuntime, PlantSnapshot
+
+logger = logging.getLogger(__name__)
 
 # Ruta al config relativa a este archivo (funciona desde cualquier directorio de ejecuci?n)
 _THIS_DIR = Path(__file__).resolve().parent
 ALARM_CONFIG_PATH = _THIS_DIR / "config" / "alarm_config.json"
 TEMPLATES_DIR = _THIS_DIR / "templates"
+# Curvas de reactividad que salen del buffer en memoria (una carpeta por línea, una línea JSON por curva)
+CURVES_ARCHIVE_DIR = _THIS_DIR / ".curvas_reactividad"
+# Bloqueo que asegura un solo proceso con el bucle de planta (ver plant_runtime.BloqueoInstancia)
+RUNTIME_LOCK_PATH = _THIS_DIR / ".plant_runtime.lock"
+
+
+# Lista de CSV de la carpeta, cacheada por el mtime del directorio (cambia al crear/borrar/renombrar)
+_csv_listing: Dict[str, Any] = {"dir_mtime_ns": None, "paths": []}
+
+
+def _list_csvs_in_folder() -> List[Path]:
+    dir_mtime_ns = _THIS_DIR.stat().st_mtime_ns
+    if _csv_listing["dir_mtime_ns"] != dir_mtime_ns:
+        _csv_listing["paths"] = list(_THIS_DIR.glob("*.csv"))
+        _csv_listing["dir_mtime_ns"] = dir_mtime_ns
+    return _csv_listing["paths"]
+
+
+def _newest_csv_with_stat():
+    """Devuelve (ruta, stat) del CSV más reciente, o (None, None) si no hay."""
+    newest = None
+    for path in _list_csvs_in_folder():
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            _csv_listing["dir_mtime_ns"] = None  # La lista quedó obsoleta; se rehace en la próxima llamada
+            continue
+        if newest is None or st.st_mtime > newest[1].st_mtime:
+            newest = (path, st)
+    return newest if newest is not None else (None, None)
 
 
 def get_csv_path_in_folder() -> Optional[Path]:
@@ -28,30 +70,58 @@ def get_csv_path_in_folder() -> Optional[Path]:
     Si hay varios, usa el m?s recientemente modificado (el ?ltimo generado).
     Si no hay ninguno, devuelve None.
     """
-    csvs = list(_THIS_DIR.glob("*.csv"))
-    if not csvs:
-        return None
-    return max(csvs, key=lambda p: p.stat().st_mtime)
+    return _newest_csv_with_stat()[0]
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
 
 # --- Inicializaci?n de la Aplicaci?n y Estado Global ---
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Arranca el bucle de simulación de la planta y lo detiene al cerrar la API.
+    El estado de la planta vive en este proceso: si otro worker ya tiene el bucle, el
+    arranque falla en vez de crear una segunda planta independiente.
+    """
+    lock = BloqueoInstancia(RUNTIME_LOCK_PATH)
+    lock.adquirir()
+    producer = asyncio.create_task(runtime.run())
+    try:
+        yield
+    finally:
+        producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+        lock.liberar()
+
+
 app = FastAPI(
     title="Sistema de Monitoreo de Cal Lechada",
     description="API para la supervisi?n y an?lisis operacional del sistema de preparaci?n de lechada de cal.",
     version="0.2.0",
+    lifespan=lifespan,
 )
 
 # Estado global de la aplicaci?n (para una PoC, en producci?n se usar?a un sistema de estado m?s robusto)
-simulator = PlantSimulator()
-reactivity_monitor = ReactivityMonitor()
 alarm_config = load_alarm_config_from_json(str(ALARM_CONFIG_PATH))
 setpoints = {} # Diccionario para futuros setpoints din?micos
 
 if not alarm_config:
     raise RuntimeError("No se pudo cargar la configuraci?n de alarmas. La API no puede iniciar.")
 
+# Plan de alarmas compilado una sola vez; recompilar si cambian alarm_config o setpoints
+plan_alarmas = compilar_plan_alarmas(alarm_config, setpoints)
+# Simulador, alarmas y reactividad viven en el bucle de planta; la API solo lee snapshots
+# y le envía comandos (ver plant_runtime.py)
+STATUS_TICK_SECONDS = 1.0
+runtime = PlantRuntime(
+    plan_alarmas,
+    tick_seconds=STATUS_TICK_SECONDS,
+    reactividad=MonitorReactividadMultilinea(directorio_archivo=CURVES_ARCHIVE_DIR),
+)
+
 
 # Mapeo de sensores por fase (La Historia de la Cal) para la API de datos
 # Coincide con columnas de plant_simulator_output.csv generado por data_generator.py
@@ -74,6 +144,7 @@ PHASE_SENSORS: Dict[str, List[str]] = {
         "2270-FIT-11801", "2270-TT-11824A", "2270-TT-11824B", "2270-TAHH-11801", "2270-PALL-11834",
         "2270-ZM-009-06", "2270-ZM-009-06_CMD_RUN", "2270-ZM-009-06_RUN_FB", "2270-ZM-009-06_SPEED_FB",
         "2270-ZM-009-06_MOTOR_CURRENT", "2270-ZM-009-06_MOTOR_POWER",
+        "2270-TIC-11801", "2270-TIC-11801_OUT", "2270-TV-11801", "2270-HV-11808",
     ],  # Hidratación / Slaker
     "4": [
         "2270-LIT-11850", "2270-ZM-009-31",
@@ -92,47 +163,457 @@ PHASE_SENSORS: Dict[str, List[str]] = {
 }
 
 
+# Columnas de /api/visualization/data
+VISUALIZATION_SENSORS: List[str] = ["2270-LIT-11825", "2280-WI-01769", "2270-TT-11824B"]
+
+
+def _empty_series(tags: List[str]) -> Dict[str, Any]:
+    return {"timestamps": [], **{tag: [] for tag in tags}}
+
+
+def _column_values(col: pd.Series) -> List[Any]:
+    """Valores de la columna como lista; NaN pasa a None (null en JSON)."""
+    if col.isna().any():
+        return col.astype(object).where(col.notna(), None).tolist()
+    return col.tolist()
+
+
+class SerializedPayload(NamedTuple):
+    """Respuesta JSON ya serializada, con su versión gzip y ETag fuerte de cada representación."""
+    body: bytes
+    body_gzip: bytes
+    etag: str
+    etag_gzip: str
+
+
+def _serialize_payload(data: Dict[str, Any]) -> SerializedPayload:
+    body = json.dumps(data, separators=(",", ":"), allow_nan=False).encode("utf-8")
+    digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+    return SerializedPayload(
+        body=body,
+        body_gzip=gzip.compress(body, compresslevel=6, mtime=0),
+        etag=f'"{digest}"',
+        etag_gzip=f'"{digest}-gz"',
+    )
+
+
+# Máximo de puntos por serie aceptado en /api/data/{phase_id}?max_points=
+MAX_POINTS_LIMIT = 20000
+# Consultas (rango / max_points) distintas que se guardan serializadas por versión del CSV
+QUERY_CACHE_SIZE = 64
+
+
+class TimeIndex(NamedTuple):
+    """Filas del CSV ordenadas por tiempo (UTC, ns) con las columnas de las fases como float64."""
+    times_ns: np.ndarray
+    timestamps: np.ndarray
+    columns: Dict[str, np.ndarray]
+
+
+def _build_time_index(df: pd.DataFrame) -> TimeIndex:
+    times = pd.to_datetime(df["timestamp"], utc=True, errors="coerce").dt.as_unit("ns")
+    valid = times.notna().to_numpy()
+    times_ns = times.to_numpy(dtype="datetime64[ns]")[valid].view(np.int64)
+    order = np.argsort(times_ns, kind="stable")
+    rows = np.flatnonzero(valid)[order]
+    tags = {tag for phase_tags in PHASE_SENSORS.values() for tag in phase_tags if tag in df.columns}
+    columns = {
+        tag: pd.to_numeric(df[tag], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+        for tag in tags
+    }
+    return TimeIndex(times_ns[order], df["timestamp"].astype(str).to_numpy()[rows], columns)
+
+
+def _float_list(values: np.ndarray) -> List[Any]:
+    out = values.astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
+
+
+def _minmax_buckets(values: np.ndarray, n_buckets: int, size: int) -> np.ndarray:
+    """
+    Reduce `values` a 2 puntos por bucket (mínimo y máximo, en el orden en que ocurren).
+    Los buckets sin datos quedan en NaN.
+    """
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:values.size] = values
+    padded = padded.reshape(n_buckets, size)
+    missing = np.isnan(padded)
+    i_min = np.where(missing, np.inf, padded).argmin(axis=1)
+    i_max = np.where(missing, -np.inf, padded).argmax(axis=1)
+    rows = np.arange(n_buckets)
+    v_min, v_max = padded[rows, i_min], padded[rows, i_max]
+    min_first = i_min <= i_max
+    out = np.empty(2 * n_buckets)
+    out[0::2] = np.where(min_first, v_min, v_max)
+    out[1::2] = np.where(min_first, v_max, v_min)
+    return out
+
+
+def _query_series(index: TimeIndex, tags: List[str], start_ns: Optional[int], end_ns: Optional[int],
+                  max_points: Optional[int]) -> Dict[str, Any]:
+    """
+    Corta el rango [start, end] con búsqueda binaria sobre el índice de tiempo y, si quedan
+    más de max_points filas, las reduce por buckets mínimo/máximo con un eje de tiempo común
+    (primer y último timestamp de cada bucket). El último punto conserva el valor de la
+    última fila del rango.
+    """
+    lo = 0 if start_ns is None else int(np.searchsorted(index.times_ns, start_ns, side="left"))
+    hi = index.times_ns.size if end_ns is None else int(np.searchsorted(index.times_ns, end_ns, side="right"))
+    hi = max(lo, hi)
+    n = hi - lo
+
+    if max_points is None or n <= max_points:
+        out: Dict[str, Any] = {"timestamps": index.timestamps[lo:hi].tolist()}
+        for tag in tags:
+            out[tag] = _float_list(index.columns[tag][lo:hi]) if tag in index.columns else []
+        return out
+
+    size = -(-n // max(1, max_points // 2))
+    n_buckets = -(-n // size)
+    firsts = lo + np.arange(n_buckets) * size
+    lasts = np.minimum(firsts + size, hi) - 1
+    bucket_times = np.empty(2 * n_buckets, dtype=object)
+    bucket_times[0::2] = index.timestamps[firsts]
+    bucket_times[1::2] = index.timestamps[lasts]
+    out = {"timestamps": bucket_times.tolist()}
+    for tag in tags:
+        if tag in index.columns:
+            values = index.columns[tag][lo:hi]
+            reduced = _minmax_buckets(values, n_buckets, size)
+            reduced[-1] = values[-1]  # El último punto es siempre la lectura más reciente (badges de estado)
+            out[tag] = _float_list(reduced)
+        else:
+            out[tag] = []
+    return out
+
+
+# Bytes al final de la parte ya leída que se comparan para confirmar que el CSV solo creció
+_APPEND_CHECK_BYTES = 256
+
+
+def _parse_cursor(cursor: str):
+    """'<generación>:<filas>' -> (generación, filas), o None si el formato no es válido."""
+    generation, _, rows = cursor.rpartition(":")
+    if not generation or not rows.isdigit():
+        return None
+    return generation, int(rows)
+
+
+class _GrowableArray:
+    """
+    Arreglo NumPy que solo crece (la capacidad se duplica al llenarse). Las vistas que entrega
+    `view` no cambian con agregados posteriores: lo nuevo se escribe después de ellas.
+    """
+
+    def __init__(self, initial: np.ndarray):
+        # Margen inicial para que los primeros agregados no copien todo el arreglo
+        self._buf = np.empty(initial.size + max(4096, initial.size // 4), dtype=initial.dtype)
+        self._buf[:initial.size] = initial
+        self._n = initial.size
+
+    def extend(self, values: np.ndarray) -> None:
+        needed = self._n + values.size
+        if needed > self._buf.size:
+            buf = np.empty(max(needed, 2 * self._buf.size), dtype=self._buf.dtype)
+            buf[:self._n] = self._buf[:self._n]
+            self._buf = buf
+        self._buf[self._n:needed] = values
+        self._n = needed
+
+    def view(self) -> np.ndarray:
+        return self._buf[:self._n]
+
+
+class _CsvView(NamedTuple):
+    """
+    Versión publicada del CSV. Las listas por columna se comparten entre versiones (solo se
+    agregan filas al final), por eso cada versión lee únicamente sus primeras `rows` filas.
+    `series` y `queries` son cachés perezosas de esta versión.
+    """
+    key: Any
+    generation: str
+    rows: int
+    has_timestamp: bool
+    timestamps: List[str]
+    values: Dict[str, List[Any]]
+    index: TimeIndex
+    series: Dict[str, Dict[str, Any]]
+    queries: Dict[tuple, SerializedPayload]
+
+    @property
+    def cursor(self) -> str:
+        return f"{self.generation}:{self.rows}"
+
+
+# Tags que se guardan por columna: todos los de las fases y los de visualización
+_SERIES_TAGS: List[str] = list(dict.fromkeys(
+    [tag for tags in PHASE_SENSORS.values() for tag in tags] + VISUALIZATION_SENSORS
+))
+
+
+class CsvFrameStore:
+    """
+    Carga el CSV más reciente una sola vez y guarda, por (ruta, mtime, tamaño), las
+    columnas de las fases y su índice de tiempo. El JSON de cada fase (plano y gzip, con
+    ETag) se serializa recién cuando se pide esa fase y queda cacheado hasta el próximo
+    cambio del archivo; los datos entregados no se deben modificar.
+
+    Las filas se indexan en orden de archivo y solo se agregan: si el CSV crece sin
+    cambiar lo ya leído, se parsean únicamente los bytes nuevos (hasta el último salto de
+    línea completo) y las columnas y el índice de tiempo se extienden con esas filas, sin
+    reconstruir lo anterior. Cualquier otro cambio (otro archivo, reescritura, truncado)
+    abre una nueva generación. El cursor '<generación>:<filas>' identifica qué ya vio el cliente.
+
+    Leer el CSV bloquea: se debe llamar desde un hilo (endpoints `def`), no desde el event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._epoch = uuid.uuid4().hex[:8]
+        self._reloads = 0
+        self._generation = f"{self._epoch}-0"
+        self._path: Optional[Path] = None
+        self._header = b""
+        self._consumed = 0
+        self._tail = b""
+        self._rows = 0
+        self._has_timestamp = False
+        self._timestamps: List[str] = []
+        self._values: Dict[str, List[Any]] = {}
+        self._index_times: Optional[_GrowableArray] = None
+        self._index_stamps: Optional[_GrowableArray] = None
+        self._index_columns: Dict[str, _GrowableArray] = {}
+        self._view: Optional[_CsvView] = None
+
+    @property
+    def cursor(self) -> str:
+        view = self._view
+        return view.cursor if view is not None else f"{self._generation}:0"
+
+    def _read_appended(self, csv_path: Path, size: int) -> Optional[pd.DataFrame]:
+        """Filas agregadas desde la última lectura, o None si el archivo no es una extensión de lo leído."""
+        if csv_path != self._path or not self._header or size < self._consumed:
+            return None
+        with open(csv_path, "rb") as f:
+            check_from = self._consumed - len(self._tail)
+            f.seek(check_from)
+            if f.read(len(self._tail)) != self._tail:
+                return None
+            f.seek(0)
+            if f.read(len(self._header)) != self._header:
+                return None
+            f.seek(self._consumed)
+            new_bytes = f.read(size - self._consumed)
+        complete = new_bytes.rfind(b"\n") + 1
+        if complete == 0:
+            return pd.DataFrame()
+        chunk = new_bytes[:complete]
+        self._consumed += complete
+        self._tail = (self._tail + chunk)[-_APPEND_CHECK_BYTES:]
+        return pd.read_csv(io.BytesIO(self._header + chunk))
+
+    def _read_full(self, csv_path: Path) -> pd.DataFrame:
+        data = csv_path.read_bytes()
+        complete = data.rfind(b"\n") + 1 or len(data)
+        self._header = data[:data.find(b"\n") + 1]
+        self._consumed = complete
+        self._tail = data[max(0, complete - _APPEND_CHECK_BYTES):complete]
+        self._path = csv_path
+        self._reloads += 1
+        self._generation = f"{self._epoch}-{self._reloads}"
+        return pd.read_csv(io.BytesIO(data[:complete]))
+
+    def _reset_index(self, index: TimeIndex) -> None:
+        self._index_times = _GrowableArray(index.times_ns)
+        self._index_stamps = _GrowableArray(index.timestamps)
+        self._index_columns = {tag: _GrowableArray(values) for tag, values in index.columns.items()}
+
+    def _load(self, df: Optional[pd.DataFrame]) -> None:
+        """Reemplaza todas las filas (nueva generación o sin CSV)."""
+        self._rows = 0 if df is None else len(df)
+        self._has_timestamp = df is not None and "timestamp" in df.columns
+        if not self._has_timestamp:
+            self._timestamps, self._values = [], {}
+            self._reset_index(_build_time_index(pd.DataFrame({"timestamp": pd.Series(dtype=str)})))
+            return
+        self._timestamps = df["timestamp"].astype(str).tolist()
+        self._values = {tag: _column_values(df[tag]) for tag in _SERIES_TAGS if tag in df.columns}
+        self._reset_index(_build_time_index(df))
+
+    def _append(self, df: pd.DataFrame) -> None:
+        """Agrega filas nuevas al final: costo proporcional a las filas agregadas."""
+        self._rows += len(df)
+        if not self._has_timestamp:
+            return
+        self._timestamps.extend(df["timestamp"].astype(str).tolist())
+        for tag, values in self._values.items():
+            values.extend(_column_values(df[tag]))
+
+        chunk = _build_time_index(df)
+        if chunk.times_ns.size == 0:
+            return
+        times = self._index_times.view()
+        if times.size and chunk.times_ns[0] < times[-1]:
+            # Filas fuera de orden: se rehace el índice completo (caso raro en un CSV que solo crece)
+            full = pd.DataFrame({"timestamp": self._timestamps, **self._values})
+            self._reset_index(_build_time_index(full))
+            return
+        self._index_times.extend(chunk.times_ns)
+        self._index_stamps.extend(chunk.timestamps)
+        for tag, values in chunk.columns.items():
+            self._index_columns[tag].extend(values)
+
+    def _refresh(self) -> _CsvView:
+        csv_path, st = _newest_csv_with_stat()
+        key = None if csv_path is None else (csv_path, st.st_mtime_ns, st.st_size)
+        view = self._view
+        if view is not None and view.key == key:
+            return view
+        with self._lock:
+            view = self._view
+            if view is not None and view.key == key:
+                return view
+            unchanged = False
+            if csv_path is None:
+                self._path, self._header = None, b""
+                self._load(None)
+            else:
+                appended = self._read_appended(csv_path, st.st_size)
+                if appended is None:
+                    self._load(self._read_full(csv_path))
+                elif appended.empty:
+                    unchanged = view is not None
+                else:
+                    self._append(appended)
+            index = TimeIndex(
+                self._index_times.view(),
+                self._index_stamps.view(),
+                {tag: values.view() for tag, values in self._index_columns.items()},
+            )
+            self._view = _CsvView(
+                key=key,
+                generation=self._generation,
+                rows=self._rows,
+                has_timestamp=self._has_timestamp,
+                timestamps=self._timestamps,
+                values=self._values,
+                index=index,
+                # Sin filas completas nuevas los datos no cambiaron: se conservan las cachés
+                series=view.series if unchanged else {},
+                queries=view.queries if unchanged else {},
+            )
+            return self._view
+
+    @staticmethod
+    def _rows_series(view: _CsvView, tags: List[str], start: int = 0) -> Dict[str, Any]:
+        """Timestamps y columnas de las filas [start, view.rows) en orden de archivo."""
+        if not view.has_timestamp:
+            return _empty_series(tags)
+        out: Dict[str, Any] = {"timestamps": view.timestamps[start:view.rows]}
+        for tag in tags:
+            out[tag] = view.values[tag][start:view.rows] if tag in view.values else []
+        return out
+
+    def _series(self, view: _CsvView, name: str, tags: List[str], with_cursor: bool) -> Dict[str, Any]:
+        data = view.series.get(name)
+        if data is None:
+            data = self._rows_series(view, tags)
+            if with_cursor:
+                data["cursor"] = view.cursor
+            view.series[name] = data
+        return data
+
+    @staticmethod
+    def _cached_query(view: _CsvView, query_key: tuple, build) -> SerializedPayload:
+        queries = view.queries
+        payload = queries.get(query_key)
+        if payload is None:
+            payload = _serialize_payload(build())
+            if len(queries) >= QUERY_CACHE_SIZE:
+                queries.pop(next(iter(queries)), None)
+            queries[query_key] = payload
+        return payload
+
+    def phase(self, phase_id: str) -> Dict[str, Any]:
+        view = self._refresh()
+        return self._series(view, phase_id, PHASE_SENSORS[phase_id], with_cursor=True)
+
+    def phase_payload(self, phase_id: str) -> SerializedPayload:
+        """JSON completo de la fase; se serializa la primera vez que se pide en esta versión del CSV."""
+        view = self._refresh()
+        return self._cached_query(view, (phase_id,), lambda: self._series(view, phase_id, PHASE_SENSORS[phase_id], True))
+
+    def phase_query(self, phase_id: str, start_ns: Optional[int], end_ns: Optional[int],
+                    max_points: Optional[int]) -> SerializedPayload:
+        """Payload de la fase para un rango de tiempo y/o max_points; cacheado por versión del CSV."""
+        view = self._refresh()
+
+        def build():
+            data = _query_series(view.index, PHASE_SENSORS[phase_id], start_ns, end_ns, max_points)
+            data["cursor"] = view.cursor
+            return data
+
+        return self._cached_query(view, (phase_id, start_ns, end_ns, max_points), build)
+
+    def phase_since(self, phase_id: str, since: str, max_points: Optional[int]) -> SerializedPayload:
+        """
+        Filas de la fase agregadas después de `since`, con el cursor para el próximo poll.
+        Si el cursor es de otra generación (o inválido) responde reset=true con la serie
+        completa (reducida a max_points si se indicó) y el cliente debe reemplazar sus datos.
+        """
+        view = self._refresh()
+        parsed = _parse_cursor(since)
+
+        if parsed is None or parsed[0] != view.generation or parsed[1] > view.rows or not view.has_timestamp:
+            if max_points is None:
+                data = dict(self._series(view, phase_id, PHASE_SENSORS[phase_id], with_cursor=True))
+            else:
+                data = _query_series(view.index, PHASE_SENSORS[phase_id], None, None, max_points)
+                data["cursor"] = view.cursor
+            data["reset"] = True
+            return _serialize_payload(data)
+
+        rows = parsed[1]
+
+        def build():
+            data = self._rows_series(view, PHASE_SENSORS[phase_id], rows)
+            data["cursor"] = view.cursor
+            data["reset"] = False
+            return data
+
+        return self._cached_query(view, (phase_id, "since", rows), build)
+
+    def visualization(self) -> Dict[str, Any]:
+        view = self._refresh()
+        return self._series(view, "visualization", VISUALIZATION_SENSORS, with_cursor=False)
+
+
+csv_store = CsvFrameStore()
+
+
 def get_csv_visualization_data() -> Dict[str, Any]:
     """
-    Lee el ?nico CSV de la carpeta y devuelve los datos para la visualizaci?n
+    Devuelve los datos del CSV más reciente para la visualización
     (timestamps + columnas: Nivel Silo, Flujo Cal, Temperatura Slaker).
     """
-    csv_path = get_csv_path_in_folder()
-    if csv_path is None:
-        return {"timestamps": [], "2270-LIT-11825": [], "2280-WI-01769": [], "2270-TT-11824B": []}
-    df = pd.read_csv(csv_path)
-    cols = ["timestamp", "2270-LIT-11825", "2280-WI-01769", "2270-TT-11824B"]
-    existing = [c for c in cols if c in df.columns]
-    if not existing or "timestamp" not in df.columns:
-        return {"timestamps": [], "2270-LIT-11825": [], "2280-WI-01769": [], "2270-TT-11824B": []}
-    out = {"timestamps": df["timestamp"].astype(str).tolist()}
-    for c in ["2270-LIT-11825", "2280-WI-01769", "2270-TT-11824B"]:
-        out[c] = df[c].tolist() if c in df.columns else []
-    return out
+    return csv_store.visualization()
 
 
 def get_phase_data(phase_id: str) -> Dict[str, Any]:
     """
-    Lee el ?nico CSV de la carpeta y devuelve timestamps y columnas de la fase dada.
+    Devuelve timestamps y columnas de la fase dada, desde el CSV cacheado en csv_store.
     Retorna listas vac?as si no hay CSV o la fase no es v?lida.
     """
     if phase_id not in PHASE_SENSORS:
-        return {"timestamps": [], **{tag: [] for tag in PHASE_SENSORS.get("1", [])}}
-    csv_path = get_csv_path_in_folder()
-    if csv_path is None:
-        return {"timestamps": [], **{tag: [] for tag in PHASE_SENSORS[phase_id]}}
-    df = pd.read_csv(csv_path)
-    if "timestamp" not in df.columns:
-        return {"timestamps": [], **{tag: [] for tag in PHASE_SENSORS[phase_id]}}
-    out: Dict[str, Any] = {"timestamps": df["timestamp"].astype(str).tolist()}
-    for tag in PHASE_SENSORS[phase_id]:
-        out[tag] = df[tag].tolist() if tag in df.columns else []
-    return out
+        return _empty_series(PHASE_SENSORS["1"])
+    return csv_store.phase(phase_id)
 
 
 # --- Modelos de Datos (Pydantic) ---
 
 class ReactivityCurve(BaseModel):
+    linea: Optional[str] = Field(None, description="Id de la línea (slaker) de la curva.")
     timestamp_inicio: datetime
     timestamp_fin: datetime
     temp_inicio: float
@@ -140,13 +621,38 @@ class ReactivityCurve(BaseModel):
     tipo: str
     minutos: int
     segundos: int
+    tau_s: Optional[float] = Field(None, description="Constante de tiempo ajustada de la curva (s).")
+    delta_t: Optional[float] = Field(None, description="Aumento de temperatura final ajustado (°C).")
+
+class ReactivityPrediction(BaseModel):
+    linea: Optional[str] = None
+    timestamp_inicio: datetime
+    transcurrido_s: float = Field(..., description="Segundos desde el inicio de la curva en curso.")
+    tau_s: float = Field(..., description="Constante de tiempo estimada en línea (s).")
+    delta_t: float = Field(..., description="Aumento de temperatura final estimado (°C).")
+    t40_s: Optional[float] = Field(None, description="Tiempo estimado desde el inicio hasta +40°C (s); null si no se alcanzaría.")
+    tipo_predicho: str = Field(..., description="Clase que tendría la curva: ALTA, MEDIANA, BAJA o NO_REACCIONA. Solo se publica cuando ninguna otra clase es compatible con los datos.")
+    muestras: int
+
+class AlarmEvent(BaseModel):
+    evento: str = Field(..., description="'activada' o 'despejada'.")
+    condicion_id: int = Field(..., description="Id de la condición en el plan de alarmas (usar para reconocer).")
+    tag: str
+    tipo_alarma: Optional[str] = None
+    descripcion: str
+    valor: Any = None
+    timestamp: datetime
 
 class PlantStatusResponse(BaseModel):
+    tick: int = Field(0, description="Número de ciclo de la planta (tiempo de planta monótono).")
     timestamp: datetime = Field(..., description="El timestamp de los datos de sensores.")
     mode: str = Field(..., description="El modo de operaci?n actual de la planta (ej: 'produciendo', 'inactivo').")
     active_alarms: List[str] = Field(..., description="Una lista de las descripciones de las alarmas actualmente activas.")
+    alarm_events: List[AlarmEvent] = Field(default_factory=list, description="Transiciones de alarma (activada/despejada) ocurridas en este ciclo.")
     new_reactivity_curves: List[ReactivityCurve] = Field(..., description="Una lista de las curvas de reactividad completadas en este ciclo.")
+    reactivity_predictions: List[ReactivityPrediction] = Field(default_factory=list, description="Predicción de las curvas aún en curso (ajuste en línea de tau y ΔT).")
     sensor_data: Dict[str, Any] = Field(..., description="Los valores crudos de los sensores para este ciclo.")
+    healthy: bool = Field(True, description="False si el último ciclo de planta o su publicación fallaron: este estado puede estar desactualizado (detalle en /api/v1/health).")
 
 class ScenarioControlResponse(BaseModel):
     message: str
@@ -160,15 +666,70 @@ async def api_info():
     return {"message": "API de Monitoreo de Cal Lechada en funcionamiento!", "version": app.version}
 
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _serialized_response(request: Request, payload: SerializedPayload) -> Response:
+    """Sirve un payload pre-serializado: gzip si el cliente lo acepta y 304 si su ETag sigue vigente."""
+    use_gzip = "gzip" in request.headers.get("accept-encoding", "")
+    etag = payload.etag_gzip if use_gzip else payload.etag
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=payload.body_gzip, media_type="application/json", headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
+
+def _parse_query_time(value: Optional[str], name: str) -> Optional[int]:
+    """Convierte un parámetro de tiempo (ISO) a ns UTC; sin zona horaria se asume UTC."""
+    if value is None:
+        return None
+    try:
+        ts = pd.Timestamp(value)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail=f"'{name}' no es un timestamp válido: {value!r}")
+    if ts is pd.NaT:
+        raise HTTPException(status_code=400, detail=f"'{name}' no es un timestamp válido: {value!r}")
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return ts.as_unit("ns").value
+
+
 @app.get("/api/data/{phase_id}", tags=["Visualizaci?n"])
-async def get_data_by_phase(phase_id: str):
+def get_data_by_phase(
+    phase_id: str,
+    request: Request,
+    start: Optional[str] = Query(None, alias="from", description="Inicio del rango (ISO 8601, incluido)."),
+    end: Optional[str] = Query(None, alias="to", description="Fin del rango (ISO 8601, incluido)."),
+    max_points: Optional[int] = Query(None, ge=2, le=MAX_POINTS_LIMIT, description="Máximo de puntos por serie (reducción mínimo/máximo por bucket)."),
+    since: Optional[str] = Query(None, description="Cursor de la respuesta anterior: devuelve solo las filas agregadas después."),
+):
     """
     Devuelve los datos del CSV filtrados por fase (1-5).
     Formato: { timestamps: [...], tag1: [...], tag2: [...] }.
+    `from`/`to` acotan el rango por búsqueda binaria y `max_points` reduce cada serie a
+    pares mínimo/máximo por bucket, con un eje de tiempo común.
+    Toda respuesta incluye `cursor`; con `since=<cursor>` se devuelven solo las filas nuevas
+    (`reset: true` indica que el CSV cambió y la respuesta trae la serie completa).
+    El JSON se serializa una vez por versión del CSV; responde 304 si If-None-Match coincide con el ETag.
+    Es un endpoint `def` (corre en el threadpool): leer el CSV no bloquea el event loop ni el bucle de planta.
     """
     if phase_id not in PHASE_SENSORS:
         raise HTTPException(status_code=404, detail=f"Fase '{phase_id}' no v?lida. Use 1, 2, 3, 4 o 5.")
-    return get_phase_data(phase_id)
+    if since is not None:
+        return _serialized_response(request, csv_store.phase_since(phase_id, since, max_points))
+    if start is None and end is None and max_points is None:
+        return _serialized_response(request, csv_store.phase_payload(phase_id))
+    payload = csv_store.phase_query(
+        phase_id, _parse_query_time(start, "from"), _parse_query_time(end, "to"), max_points
+    )
+    return _serialized_response(request, payload)
 
 
 # --- Vistas HTML (La Historia de la Cal - 5 fases) ---
@@ -210,7 +771,7 @@ async def phase5_dist(request: Request):
 
 
 @app.get("/api/visualization/data", tags=["Visualizaci?n"])
-async def get_visualization_data():
+def get_visualization_data():
     """Devuelve los datos del CSV de simulaci?n en JSON para los gr?ficos."""
     return get_csv_visualization_data()
 
@@ -286,52 +847,170 @@ async def visualization_page():
     return HTMLResponse(html_content)
 
 
+# --- Estado de planta para la API ---
+# El bucle de planta (plant_runtime.PlantRuntime) ejecuta un solo ciclo por tick, sin importar
+# cuántas pantallas están conectadas. /api/v1/status devuelve el último snapshot y los
+# streams SSE / WebSocket reciben cada uno.
+
+SUBSCRIBER_QUEUE_SIZE = 16
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+def status_from_snapshot(snapshot: PlantSnapshot) -> PlantStatusResponse:
+    """Arma la respuesta de la API desde un snapshot; el texto de las alarmas se genera solo aquí."""
+    alarm_events = [
+        AlarmEvent(
+            evento=r.evento,
+            condicion_id=r.id_condicion,
+            tag=r.tag,
+            tipo_alarma=r.severidad,
+            descripcion=plan_alarmas[r.id_condicion].descripcion,
+            valor=r.valor,
+            timestamp=r.timestamp,
+        )
+        for r in snapshot.alarm_transitions
+    ]
+    return PlantStatusResponse(
+        tick=snapshot.tick,
+        timestamp=snapshot.timestamp,
+        mode=snapshot.mode,
+        active_alarms=renderizar_alarmas(list(snapshot.active_alarms), plan_alarmas),
+        alarm_events=alarm_events,
+        new_reactivity_curves=list(snapshot.new_reactivity_curves),
+        reactivity_predictions=list(snapshot.reactivity_predictions),
+        sensor_data=dict(snapshot.sensor_data),
+    )
+
+
+class StatusBroadcaster:
+    """
+    Convierte cada snapshot en PlantStatusResponse y lo reparte a los suscriptores. El JSON
+    se serializa una vez por tick; cada suscriptor tiene una cola acotada y, si se atrasa,
+    se descartan sus mensajes más antiguos en vez de frenar al bucle de planta.
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.latest: Optional[PlantStatusResponse] = None
+        self.latest_snapshot: Optional[PlantSnapshot] = None
+        self.latest_json: Optional[str] = None
+        self._subscribers: set = set()
+
+    def publish(self, snapshot: PlantSnapshot) -> None:
+        # Se arma todo antes de asignar: si falla, latest / latest_snapshot / latest_json siguen siendo del mismo tick
+        status = status_from_snapshot(snapshot)
+        status_json = status.model_dump_json()
+        self.latest_snapshot, self.latest, self.latest_json = snapshot, status, status_json
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(self.latest_json)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.latest_json is not None:
+            queue.put_nowait(self.latest_json)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+broadcaster = StatusBroadcaster()
+runtime.add_listener(broadcaster.publish)
+
+
 @app.get("/api/v1/status", response_model=PlantStatusResponse, tags=["Monitoreo"])
-async def get_plant_status():
+async def get_plant_status(severidad: Optional[str] = None):
     """
-    Ejecuta un ciclo de simulaci?n y devuelve el estado completo y actual de la planta.
+    Devuelve el último snapshot publicado por el bucle de planta (no avanza la simulación).
+    Para recibir cada ciclo use /api/v1/status/stream o /ws/status.
+    `severidad` (ej. FAULT, WARNING) filtra las alarmas activas y los eventos por tipo_alarma.
     """
-    # 1. Obtener los datos m?s recientes del simulador
-    sensor_data = simulator.tick()
-
-    # 2. Determinar el modo de operaci?n
-    # Mapeo de valores a los argumentos de la funci?n
-    screw_val = sensor_data.get("2270-SAL-11817", 0.0)
-    rotary_val = sensor_data.get("2270-SAL-11818", 0.0)
-    agua_val = sensor_data.get("2270-FIT-11801", 0.0)
-    
-    # Asumimos que 'cal' est? relacionado con la operaci?n del tornillo
-    cal_val = screw_val 
-    
-    current_mode = determinar_modo_actual(cal=cal_val, agua=agua_val, rotary_val=rotary_val, screw_val=screw_val)
-    simulator.mode = current_mode # Sincronizar el modo del simulador si la l?gica lo cambia
-
-    # 3. Evaluar alarmas
-    active_alarms = evaluar_alarmas_directo(
-        datos_sensores=sensor_data,
-        timestamp=sensor_data["timestamp"],
-        setpoints_dict=setpoints,
-        config_json_sensores=alarm_config
-    )
+    if broadcaster.latest is None:
+        # Aún no hay snapshot: con el bucle corriendo se espera su próximo tick; si no, se ejecuta uno
+        if runtime.running:
+            await runtime.proximo_snapshot()
+        else:
+            try:
+                runtime.step()
+            except Exception as e:
+                logger.exception("Error al ejecutar un ciclo de planta para /api/v1/status")
+                runtime.registrar_falla_tick(e)
+    if broadcaster.latest is None:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Todavía no hay estado de planta publicado. Último error: {runtime.ultimo_error}",
+        )
+    status, snapshot = broadcaster.latest, broadcaster.latest_snapshot
+    status = status.model_copy(update={"healthy": runtime.saludable})
+    if severidad is None:
+        return status
+    severidad = severidad.upper()
+    return status.model_copy(update={
+        "active_alarms": renderizar_alarmas([r for r in snapshot.active_alarms if r.severidad == severidad], plan_alarmas),
+        "alarm_events": [e for e in status.alarm_events if e.tipo_alarma == severidad],
+    })
 
-    # 4. Procesar curva de reactividad (promedio de sensores A y B si ambos existen)
-    temp_a = sensor_data.get("2270-TT-11824A")
-    temp_b = sensor_data.get("2270-TT-11824B", 25.0)
-    temp_reactividad = ((temp_a + temp_b) / 2.0) if temp_a is not None else temp_b
-    new_curves = reactivity_monitor.process_reactivity(
-        timestamp_fila=sensor_data["timestamp"],
-        temp=temp_reactividad,
-        screw_val=screw_val
-    )
 
-    # 5. Construir y devolver la respuesta
-    return PlantStatusResponse(
-        timestamp=sensor_data["timestamp"],
-        mode=current_mode,
-        active_alarms=active_alarms,
-        new_reactivity_curves=new_curves,
-        sensor_data=sensor_data
-    )
+@app.get("/api/v1/health", tags=["Monitoreo"])
+async def get_plant_health():
+    """
+    Salud del bucle de planta: 200 si el último ciclo y su publicación funcionaron, 503 si no
+    (fallas seguidas y último error en el cuerpo). `/api/v1/status` sigue devolviendo el último
+    estado publicado, marcado con healthy=false.
+    """
+    salud = runtime.salud()
+    return JSONResponse(salud, status_code=200 if salud["saludable"] else 503)
+
+
+@app.get("/api/v1/status/stream", tags=["Monitoreo"])
+async def stream_plant_status(request: Request):
+    """Server-Sent Events: un evento `data:` con el PlantStatusResponse de cada ciclo."""
+    queue = broadcaster.subscribe()
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {message}\n\n"
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.websocket("/ws/status")
+async def websocket_plant_status(websocket: WebSocket):
+    """WebSocket: un mensaje JSON (PlantStatusResponse) por ciclo."""
+    await websocket.accept()
+    queue = broadcaster.subscribe()
+    try:
+        while True:
+            await websocket.send_text(await queue.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broadcaster.unsubscribe(queue)
+
+@app.post("/api/v1/alarms/{condicion_id}/ack", tags=["Monitoreo"])
+async def acknowledge_alarm(condicion_id: int):
+    """
+    Reconoce una alarma activa. Las alarmas enclavadas (FAULT) se despejan
+    cuando su condición deja de cumplirse después del reconocimiento.
+    """
+    if not await runtime.call(lambda rt: rt.alarmas.reconocer(condicion_id)):
+        raise HTTPException(status_code=404, detail=f"La condición {condicion_id} no tiene una alarma activa.")
+    return {"message": f"Alarma {condicion_id} reconocida.", "condicion_id": condicion_id}
 
 @app.post("/api/v1/simulator/scenario/{scenario_name}", response_model=ScenarioControlResponse, tags=["Simulador"])
 async def start_scenario(scenario_name: str):
@@ -347,25 +1026,27 @@ async def start_scenario(scenario_name: str):
     """
     scenario_name = scenario_name.lower()
     if scenario_name == "reactividad_alta":
-        simulator.start_reactivity_scenario('ALTA')
+        command = lambda rt: rt.simulator.start_reactivity_scenario('ALTA')
     elif scenario_name == "reactividad_media":
-        simulator.start_reactivity_scenario('MEDIA')
+        command = lambda rt: rt.simulator.start_reactivity_scenario('MEDIA')
     elif scenario_name == "reactividad_baja":
-        simulator.start_reactivity_scenario('BAJA')
+        command = lambda rt: rt.simulator.start_reactivity_scenario('BAJA')
     elif scenario_name == "lavado":
-        simulator.mode = "lavando"
+        command = lambda rt: setattr(rt.simulator, "mode", "lavando")
     elif scenario_name == "inactivo":
-        simulator.mode = "inactivo"
+        command = lambda rt: setattr(rt.simulator, "mode", "inactivo")
     else:
         raise HTTPException(
             status_code=404,
             detail=f"Escenario '{scenario_name}' no reconocido. Escenarios v?lidos: reactividad_alta, reactividad_media, reactividad_baja, lavado, inactivo."
         )
-    
+    # El bucle de planta aplica el comando al inicio de su próximo tick
+    runtime.submit(command)
+
     return ScenarioControlResponse(
         message=f"Comando recibido. Iniciando escenario: {scenario_name}",
         scenario_started=scenario_name
     )
 
-# Para ejecutar la app localmente:
+# Para ejecutar la app localmente (un solo worker: el estado de la planta vive en el proceso):
 # uvicorn cal_monitoring_backend.main:app --reload
\ No newline at end of file
@@ -0,0 +1,316 @@
+"""
+Bucle de simulación de la planta, independiente de la capa HTTP.
+
+PlantRuntime es el único dueño del simulador, la máquina de estados de alarmas y los
+monitores de reactividad de cada línea. Avanza un tick a ritmo fijo y publica un PlantSnapshot inmutable;
+los handlers HTTP solo leen el último snapshot o encolan comandos (escenarios,
+reconocimiento de alarmas) que el bucle aplica al inicio del siguiente tick.
+Con `run`, el cálculo del tick corre en un hilo de trabajo (el event loop sigue atendiendo
+HTTP/SSE/WebSocket) y la publicación del snapshot vuelve al event loop.
+
+El estado vive en la memoria de un proceso: la API debe correr con un solo worker
+(uvicorn sin --workers o con --workers 1). Con varios, cada worker tendría su propia planta
+(simulador, alarmas, reactividad) y los clientes verían plantas distintas; un reconocimiento
+de alarma llegaría solo a uno de ellos. BloqueoInstancia impide que arranque un segundo
+proceso sobre el mismo directorio.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import os
+import queue
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Mapping, NamedTuple
+
+import pandas as pd
+
+from core_logic import (
+    CondicionCompilada,
+    MaquinaEstadosAlarmas,
+    MonitorReactividadMultilinea,
+    RegistroAlarma,
+    determinar_modo_actual,
+)
+from data_generator import PlantSimulator
+
+logger = logging.getLogger(__name__)
+
+TICK_SECONDS = 1.0
+# Líneas de apagado (slakers) -> (temperatura A, temperatura B, tornillo que las alimenta)
+LINEAS_SLAKER: dict[str, tuple[str, str, str]] = {
+    "2270-ZM-009-06": ("2270-TT-11824A", "2270-TT-11824B", "2270-SAL-11817"),
+}
+
+
+class BloqueoInstancia:
+    """
+    Bloqueo exclusivo del sistema operativo sobre un archivo, para que un solo proceso
+    ejecute PlantRuntime. El sistema lo libera si el proceso muere, así que no quedan
+    bloqueos huérfanos. `adquirir` lanza RuntimeError si otro proceso ya lo tiene.
+    """
+
+    def __init__(self, ruta: str | Path):
+        self.ruta = Path(ruta)
+        self._archivo = None
+
+    def adquirir(self) -> None:
+        archivo = open(self.ruta, "a+b")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                archivo.seek(0)
+                msvcrt.locking(archivo.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            archivo.close()
+            raise RuntimeError(
+                f"Otro proceso ya ejecuta el bucle de planta ({self.ruta}). "
+                "La API debe correr con un solo worker (uvicorn --workers 1)."
+            ) from None
+        self._archivo = archivo
+
+    def liberar(self) -> None:
+        if self._archivo is None:
+            return
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._archivo.seek(0)
+                msvcrt.locking(self._archivo.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._archivo.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._archivo.close()
+            self._archivo = None
+
+
+class PlantSnapshot(NamedTuple):
+    """Resultado inmutable de un tick de planta."""
+    tick: int
+    timestamp: pd.Timestamp
+    mode: str
+    sensor_data: Mapping[str, Any]
+    alarm_transitions: tuple[RegistroAlarma, ...]
+    active_alarms: tuple[RegistroAlarma, ...]
+    new_reactivity_curves: tuple[dict, ...]
+    reactivity_predictions: tuple[dict, ...] = ()
+
+
+class PlantRuntime:
+    """
+    Dueño del estado de la simulación. Todo cambio pasa por `submit`/`call`, que encolan
+    un comando `fn(runtime)`; el bucle los ejecuta en orden antes de cada tick, así el
+    estado nunca se modifica desde dos lugares a la vez.
+    """
+
+    def __init__(
+        self,
+        plan: tuple[CondicionCompilada, ...],
+        simulator: PlantSimulator | None = None,
+        tick_seconds: float = TICK_SECONDS,
+        reactividad: MonitorReactividadMultilinea | None = None,
+        lineas_slaker: Mapping[str, tuple[str, str, str]] = LINEAS_SLAKER
+    ):
+        self.plan = plan
+        self.simulator = simulator if simulator is not None else PlantSimulator()
+        self.lineas_slaker = dict(lineas_slaker)
+        self.reactividad = reactividad if reactividad is not None else MonitorReactividadMultilinea()
+        for linea in self.lineas_slaker:
+            self.reactividad.agregar_linea(linea)
+        self.alarmas = MaquinaEstadosAlarmas(plan)
+        self.tick_seconds = tick_seconds
+        self.latest: PlantSnapshot | None = None
+        self.running = False
+        self._tick = 0
+        self._commands: queue.SimpleQueue = queue.SimpleQueue()
+        self._listeners: list[Callable[[PlantSnapshot], None]] = []
+        # Salud: ticks / publicaciones fallidas seguidas y último error (ver `saludable`)
+        self.fallas_tick = 0
+        self.fallas_publicacion = 0
+        self.ultimo_error: str | None = None
+        self._esperas: list[asyncio.Future] = []  # Handlers esperando el próximo tick (proximo_snapshot)
+
+    # --- Comandos ---
+
+    def submit(self, command: Callable[["PlantRuntime"], Any]) -> concurrent.futures.Future:
+        """Encola un comando para el próximo tick; si el bucle no corre se ejecuta de inmediato."""
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        if self.running:
+            self._commands.put((command, future))
+        else:
+            self._run_command(command, future)
+        return future
+
+    async def call(self, command: Callable[["PlantRuntime"], Any]) -> Any:
+        """Versión awaitable de submit: espera a que el bucle aplique el comando y retorna su resultado."""
+        return await asyncio.wrap_future(self.submit(command))
+
+    def _run_command(self, command, future: concurrent.futures.Future) -> None:
+        try:
+            future.set_result(command(self))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _drain_commands(self) -> None:
+        while True:
+            try:
+                command, future = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            self._run_command(command, future)
+
+    # --- Publicación ---
+
+    def add_listener(self, listener: Callable[[PlantSnapshot], None]) -> None:
+        """Registra una función que recibe cada snapshot publicado (ej. el broadcaster de la API)."""
+        self._listeners.append(listener)
+
+    def _publish(self, snapshot: PlantSnapshot) -> None:
+        self.latest = snapshot
+        fallo = False
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.exception("Error al publicar el snapshot %s en %r", snapshot.tick, listener)
+                self.ultimo_error = f"Publicación del tick {snapshot.tick}: {e!r}"
+                fallo = True
+        self.fallas_publicacion = self.fallas_publicacion + 1 if fallo else 0
+
+    async def proximo_snapshot(self) -> PlantSnapshot | None:
+        """Con el bucle corriendo, espera a que termine el próximo tick: su snapshot, o None si falló."""
+        espera = asyncio.get_running_loop().create_future()
+        self._esperas.append(espera)
+        return await espera
+
+    def _resolver_esperas(self, snapshot: PlantSnapshot | None) -> None:
+        esperas, self._esperas = self._esperas, []
+        for espera in esperas:
+            if not espera.done():
+                espera.set_result(snapshot)
+
+    # --- Salud ---
+
+    @property
+    def saludable(self) -> bool:
+        """False si el último tick o la publicación de su snapshot fallaron (los suscriptores ven datos viejos)."""
+        return self.fallas_tick == 0 and self.fallas_publicacion == 0
+
+    def registrar_falla_tick(self, error: Exception) -> None:
+        """Cuenta un tick fallido (lo usan `run` y quien llame a `step` directamente)."""
+        self.fallas_tick += 1
+        self.ultimo_error = f"Tick {self._tick + 1}: {error!r}"
+
+    def salud(self) -> dict:
+        """Resumen de salud del bucle para la API."""
+        return {
+            "saludable": self.saludable,
+            "corriendo": self.running,
+            "tick": self._tick,
+            "tick_publicado": self.latest.tick if self.latest is not None else None,
+            "fallas_tick": self.fallas_tick,
+            "fallas_publicacion": self.fallas_publicacion,
+            "ultimo_error": self.ultimo_error,
+        }
+
+    # --- Ciclo ---
+
+    def step(self) -> PlantSnapshot:
+        """Aplica los comandos pendientes, ejecuta un tick completo y publica su snapshot."""
+        snapshot = self._avanzar()
+        self._publish(snapshot)
+        return snapshot
+
+    def _avanzar(self) -> PlantSnapshot:
+        """Aplica los comandos pendientes y calcula un tick completo, sin publicarlo."""
+        self._drain_commands()
+
+        # 1. Obtener los datos más recientes del simulador
+        sensor_data = self.simulator.tick()
+        timestamp = pd.Timestamp(sensor_data["timestamp"])
+
+        # 2. Determinar el modo de operación
+        screw_val = sensor_data.get("2270-SAL-11817", 0.0)
+        rotary_val = sensor_data.get("2270-SAL-11818", 0.0)
+        agua_val = sensor_data.get("2270-FIT-11801", 0.0)
+        # Asumimos que 'cal' está relacionado con la operación del tornillo
+        cal_val = screw_val
+        mode = determinar_modo_actual(cal=cal_val, agua=agua_val, rotary_val=rotary_val, screw_val=screw_val)
+        self.simulator.mode = mode  # Sincronizar el modo del simulador si la lógica lo cambia
+
+        # 3. Alarmas: transiciones de este tick y activas según el estado
+        transiciones = self.alarmas.procesar(datos_sensores=sensor_data, timestamp=sensor_data["timestamp"])
+        activas = self.alarmas.alarmas_activas()
+
+        # 4. Curvas de reactividad de todas las líneas en un solo paso
+        #    (por línea, promedio de sensores A y B si ambos existen)
+        temps_lineas, screws_lineas = [], []
+        for linea in self.reactividad.lineas:
+            if linea not in self.lineas_slaker:  # Línea sin sensores en esta planta: nunca inicia curva
+                temps_lineas.append(float("nan"))
+                screws_lineas.append(0.0)
+                continue
+            tag_a, tag_b, tag_screw = self.lineas_slaker[linea]
+            temp_a = sensor_data.get(tag_a)
+            temp_b = sensor_data.get(tag_b, 25.0)
+            temps_lineas.append(((temp_a + temp_b) / 2.0) if temp_a is not None else temp_b)
+            screws_lineas.append(sensor_data.get(tag_screw, 0.0))
+        new_curves = self.reactividad.procesar(timestamp, temps_lineas, screws_lineas)
+        predictions = self.reactividad.predicciones()
+
+        self._tick += 1
+        snapshot = PlantSnapshot(
+            tick=self._tick,
+            timestamp=timestamp,
+            mode=mode,
+            sensor_data=MappingProxyType(dict(sensor_data)),
+            alarm_transitions=tuple(transiciones),
+            active_alarms=tuple(activas),
+            new_reactivity_curves=tuple(new_curves),
+            reactivity_predictions=tuple(predictions),
+        )
+        return snapshot
+
+    async def run(self) -> None:
+        """
+        Bucle a ritmo fijo (sin acumular atraso). Pensado para correr como tarea asyncio: cada
+        tick se calcula en un hilo de trabajo (asyncio.to_thread) y se publica en el event loop,
+        así los listeners (colas asyncio de los suscriptores) no se tocan desde otro hilo.
+        Un solo tick está en curso a la vez, de modo que el estado sigue teniendo un único dueño.
+        """
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        self.running = True
+        en_curso: asyncio.Task | None = None
+        try:
+            while True:
+                en_curso = asyncio.ensure_future(asyncio.to_thread(self._avanzar))
+                try:
+                    # shield: si se cancela el bucle, el tick en curso termina igual (ver finally)
+                    snapshot = await asyncio.shield(en_curso)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.exception("Error en el ciclo de planta")
+                    self.registrar_falla_tick(e)
+                    self._resolver_esperas(None)
+                else:
+                    self.fallas_tick = 0
+                    self._publish(snapshot)
+                    self._resolver_esperas(snapshot)
+                next_tick += self.tick_seconds
+                delay = next_tick - loop.time()
+                if delay < 0:
+                    next_tick = loop.time()
+                    delay = 0
+                await asyncio.sleep(delay)
+        finally:
+            if en_curso is not None and not en_curso.done():
+                await asyncio.wait([en_curso])
+            self.running = False
+            self._drain_commands()
+            self._resolver_esperas(None)
@@ -0,0 +1,175 @@
+"""
+Barridos Monte Carlo del simulador de planta (data_generator.run_simulation).
+Arma una grilla de parámetros (nivel inicial del silo, pasos de arranque/parada del tornillo,
+relación agua/cal, réplicas), reparte las corridas en un pool de procesos y junta un resumen
+por corrida en una sola tabla: alarmas, clase de reactividad, nivel mínimo del silo y pasos
+con densidad fuera de banda.
+
+Cada corrida usa su propio np.random.default_rng, derivado con SeedSequence.spawn de una
+semilla base: el resultado no depende del número de procesos ni del orden de ejecución y el
+estado global de NumPy no se toca.
+"""
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from core_logic import (
+    CondicionCompilada,
+    compilar_plan_alarmas,
+    detectar_curvas_reactividad,
+    evaluar_plan_dataframe,
+    load_alarm_config_from_json,
+)
+from data_generator import DENSIDAD_MAX, DENSIDAD_MIN, NUM_STEPS, run_simulation
+
+ALARM_CONFIG_PATH = Path(__file__).resolve().parent / "config" / "alarm_config.json"
+# tipo_alarma que cuentan en alarmas / pasos_en_alarma. Las condiciones NORMAL e INTERLOCK son
+# permisivos y estados de operación que se cumplen casi siempre: solo van en alarmas_<severidad>.
+SEVERIDADES_ALARMA = ("WARNING", "FAULT")
+
+# Plan de alarmas del proceso trabajador (se compila una vez por proceso en _iniciar_trabajador)
+_plan_trabajador: tuple[CondicionCompilada, ...] = ()
+
+
+def construir_grilla(replicas: int = 1, **ejes) -> list[dict]:
+    """
+    Producto cartesiano de los ejes (nombre de parámetro de run_simulation -> lista de valores),
+    repetido `replicas` veces. Cada elemento es un dict de parámetros; las réplicas se distinguen
+    por la clave "replica" y reciben semillas distintas.
+    Ej.: construir_grilla(replicas=10, nivel_silo_inicial=[20, 70], ratio_agua_cal=[3.5, 4, 5.5])
+    """
+    nombres = list(ejes)
+    grilla = []
+    for valores in itertools.product(*(ejes[n] for n in nombres)):
+        for replica in range(replicas):
+            grilla.append({**dict(zip(nombres, valores)), "replica": replica})
+    return grilla
+
+
+def _contar_activaciones(alertas: pd.DataFrame) -> pd.Series:
+    """Activaciones por condición: tramos de filas consecutivas en que la condición se cumple."""
+    if alertas.empty:
+        return pd.Series(dtype=np.int64)
+    alertas = alertas.sort_values(["condicion", "fila"], kind="stable")
+    condiciones = alertas["condicion"].to_numpy()
+    filas = alertas["fila"].to_numpy()
+    nuevo_tramo = np.ones(len(alertas), dtype=bool)
+    nuevo_tramo[1:] = (condiciones[1:] != condiciones[:-1]) | (filas[1:] != filas[:-1] + 1)
+    return pd.Series(condiciones[nuevo_tramo]).value_counts()
+
+
+def resumir_corrida(df: pd.DataFrame, plan: tuple[CondicionCompilada, ...]) -> dict:
+    """
+    Métricas de una corrida de run_simulation:
+    - alarmas: activaciones de condiciones SEVERIDADES_ALARMA del plan (un tramo continuo cuenta una vez).
+    - alarmas_<severidad>: activaciones por tipo_alarma, de todas las condiciones (incluye normal/interlock).
+    - pasos_en_alarma: pasos con al menos una condición SEVERIDADES_ALARMA cumplida.
+    - reactividad / reactividad_seg: resultado (ALTA/MEDIANA/BAJA, NO_REACCIONA o ABORTADA) y duración
+      de la primera curva terminada (SIN_CURVA si no hubo).
+    - nivel_silo_min, temp_max.
+    - pasos_densidad_fuera_banda: pasos en producción con densidad fuera o en el límite de
+      DENSIDAD_MIN–DENSIDAD_MAX (el modelo satura en el límite cuando la relación agua/cal se desvía).
+    """
+    resumen: dict = {"pasos": len(df)}
+
+    alertas = evaluar_plan_dataframe(plan, df)
+    activaciones = _contar_activaciones(alertas)
+    severas = [i for i, condicion in enumerate(plan) if condicion.tipo_alarma in SEVERIDADES_ALARMA]
+    resumen["alarmas"] = int(activaciones[activaciones.index.isin(severas)].sum())
+    resumen["pasos_en_alarma"] = int(alertas.loc[alertas["condicion"].isin(severas), "fila"].nunique())
+    for id_condicion, cantidad in activaciones.items():
+        clave = f"alarmas_{(plan[id_condicion].tipo_alarma or 'sin_tipo').lower()}"
+        resumen[clave] = resumen.get(clave, 0) + int(cantidad)
+
+    # Reactividad con la misma señal que usa PlantRuntime (promedio de TT-11824A/B, tornillo SAL-11817)
+    curvas = detectar_curvas_reactividad(
+        pd.to_datetime(df["timestamp"]),
+        (df["2270-TT-11824A"] + df["2270-TT-11824B"]) / 2.0,
+        df["2270-SAL-11817"],
+    )
+    if curvas:
+        resumen["reactividad"] = curvas[0]["tipo"]
+        resumen["reactividad_seg"] = curvas[0]["minutos"] * 60 + curvas[0]["segundos"]
+    else:
+        resumen["reactividad"] = "SIN_CURVA"
+        resumen["reactividad_seg"] = np.nan
+
+    resumen["nivel_silo_min"] = float(df["2270-LIT-11825"].min()) if len(df) else np.nan
+    resumen["temp_max"] = float(df[["2270-TT-11824A", "2270-TT-11824B"]].to_numpy().max()) if len(df) else np.nan
+
+    densidad = df["DT-2270-HDR"].to_numpy()
+    en_produccion = (df["2280-WI-01769"].to_numpy() > 0) & (df["2270-FIT-11801"].to_numpy() > 0)
+    fuera_banda = (densidad <= DENSIDAD_MIN) | (densidad >= DENSIDAD_MAX)
+    resumen["pasos_densidad_fuera_banda"] = int((en_produccion & fuera_banda).sum())
+    return resumen
+
+
+def _iniciar_trabajador(ruta_config: str) -> None:
+    """Inicializador del pool: compila el plan de alarmas una vez por proceso."""
+    global _plan_trabajador
+    config = load_alarm_config_from_json(ruta_config)
+    _plan_trabajador = compilar_plan_alarmas(config, {}) if config else ()
+
+
+def _ejecutar_corrida(tarea: tuple[int, dict, np.random.SeedSequence, int]) -> dict:
+    """Una corrida del barrido, en el proceso trabajador."""
+    indice, parametros, semilla, num_steps = tarea
+    kwargs = {k: v for k, v in parametros.items() if k != "replica"}
+    df = run_simulation(num_steps=num_steps, rng=np.random.default_rng(semilla), **kwargs)
+    return {"corrida": indice, **parametros, **resumir_corrida(df, _plan_trabajador)}
+
+
+def ejecutar_barrido(
+    grilla: list[dict],
+    num_steps: int = NUM_STEPS,
+    semilla_base: int = 0,
+    max_workers: int | None = None,
+    ruta_config: str | Path = ALARM_CONFIG_PATH,
+) -> pd.DataFrame:
+    """
+    Ejecuta run_simulation para cada elemento de la grilla en un ProcessPoolExecutor (por
+    defecto un proceso por núcleo) y retorna una fila de resumen por corrida, en el orden
+    de la grilla. Con la misma grilla y semilla_base el resultado es reproducible.
+    """
+    semillas = np.random.SeedSequence(semilla_base).spawn(len(grilla))
+    tareas = [(i, parametros, semillas[i], num_steps) for i, parametros in enumerate(grilla)]
+    max_workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, len(tareas) // (max_workers * 4))
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_iniciar_trabajador,
+        initargs=(str(ruta_config),),
+    ) as pool:
+        resultados = list(pool.map(_ejecutar_corrida, tareas, chunksize=chunksize))
+
+    tabla = pd.DataFrame(resultados)
+    columnas_alarma = [c for c in tabla.columns if c.startswith("alarmas_")]
+    tabla[columnas_alarma] = tabla[columnas_alarma].fillna(0).astype(np.int64)
+    return tabla
+
+
+if __name__ == "__main__":
+    import time
+
+    grilla = construir_grilla(
+        replicas=4,
+        nivel_silo_inicial=[8.0, 40.0, 70.0],
+        paso_tornillo_on=[5, 30],
+        paso_tornillo_off=[400, 800],
+        ratio_agua_cal=[2.5, 4.0, 5.5],
+    )
+    print(f"Barrido de {len(grilla)} corridas de 900 pasos en {os.cpu_count()} núcleos...")
+    inicio = time.perf_counter()
+    tabla = ejecutar_barrido(grilla, num_steps=900, semilla_base=2026)
+    print(f"Listo en {time.perf_counter() - inicio:.1f} s\n")
+    pd.set_option("display.width", 200)
+    print(tabla.head(12).to_string(index=False))
+    print("\nClases de reactividad:")
+    print(tabla["reactividad"].value_counts().to_string())
+    print("\nPasos con densidad fuera de banda por relación agua/cal:")
+    print(tabla.groupby("ratio_agua_cal")["pasos_densidad_fuera_banda"].mean().to_string())
@@ -1,12 +1,19 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from core_logic import (
     load_sensor_data_from_excel,
     load_alarm_config_from_json,
     build_tag_column_map,
+    tipar_columnas_sensores,
     evaluar_sensores_json,
+    compilar_plan_alarmas,
+    evaluar_plan_dataframe,
+    evaluar_plan_registros,
+    renderizar_alarmas,
     determinar_modo_actual,
     ReactivityMonitor,
+    detectar_curvas_reactividad,
     es_cero
 )
 from pathlib import Path
@@ -47,6 +54,13 @@ def run_basic_test():
     print(f"\nMapa de columnas construido. {len(mapa_col_idx)} tags mapeados.")
     if tags_no_encontrados:
         print(f"Advertencia: {len(tags_no_encontrados)} tags JSON no encontrados en Excel:", tags_no_encontrados)
+
+    # 4b. Convertir una sola vez las columnas mapeadas a arreglos numéricos
+    sensor_data_df, reporte_tipos = tipar_columnas_sensores(sensor_data_df, mapa_col_idx)
+    con_fallos = {tag: info for tag, info in reporte_tipos.items() if info["fallidos"]}
+    print(f"Columnas tipadas: {len(reporte_tipos)}. Con celdas no numéricas: {len(con_fallos)}")
+    for tag, info in con_fallos.items():
+        print(f"  {tag} (col {info['columna']}): {info['fallidos']} celdas no convertibles")
     
     # 5. Definir setpoints de ejemplo (similares a los de app.py)
     setpoints_para_evaluacion = {
@@ -56,6 +70,9 @@ def run_basic_test():
         "2270-TIC-11801":  {"valor": 70.0}, # Agregado para evaluar_condicion relativo_a_SP
     }
 
+    # El plan se compila una sola vez y se reutiliza fila a fila y en lote
+    plan = compilar_plan_alarmas(alarm_config, setpoints_para_evaluacion)
+
     # === Testeando evaluar_sensores_json ===
     print("\n--- Evaluando alarmas para las primeras 50 filas de datos ---")
     all_alerts = []
@@ -68,7 +85,8 @@ def run_basic_test():
             fila_index=i,
             mapa_columnas=mapa_col_idx,
             setpoints_dict=setpoints_para_evaluacion,
-            config_json_sensores=alarm_config
+            config_json_sensores=alarm_config,
+            plan=plan
         )
         if alertas_fila:
             # Descomentar si quieres ver todas las alertas
@@ -79,6 +97,12 @@ def run_basic_test():
 
     print(f"--- Prueba de evaluación de alarmas finalizada. Total de alertas encontradas: {len(all_alerts)} ---")
 
+    # === Testeando evaluar_plan_dataframe (todas las filas en una pasada) ===
+    print("\n--- Evaluando alarmas en lote sobre todo el Excel ---")
+    alertas_lote = evaluar_plan_dataframe(plan, sensor_data_df, mapa_col_idx)
+    alertas_lote_50 = alertas_lote[alertas_lote["fila"] < rows_to_process]
+    print(f"Alertas en lote: {len(alertas_lote)} en {len(sensor_data_df)} filas ({len(alertas_lote_50)} en las primeras {rows_to_process}).")
+
     # === Testeando determinar_modo_actual ===
     print("\n--- Evaluando el modo de operación para algunas filas ---")
     
@@ -125,6 +149,7 @@ def run_basic_test():
         # Usaremos las primeras 100 filas para ver si detecta alguna curva
         rows_for_reactivity = min(100, len(sensor_data_df))
         print(f"Procesando {rows_for_reactivity} filas para detectar reactividad...")
+        filas_procesadas = []  # (timestamp, temp, screw) enviados al monitor, para comparar con el lote
         for i in range(rows_for_reactivity):
             fila = sensor_data_df.iloc[i]
             
@@ -148,6 +173,7 @@ def run_basic_test():
             except (ValueError, TypeError):
                 continue
 
+            filas_procesadas.append((timestamp_fila, temp_val, screw_val))
             new_curves = reactivity_monitor.process_reactivity(timestamp_fila, temp_val, screw_val)
             if new_curves:
                 for curve in new_curves:
@@ -155,8 +181,93 @@ def run_basic_test():
         
         print(f"Total de curvas de reactividad almacenadas: {len(reactivity_monitor.curvas_reactividad)}")
 
+        # Detección vectorizada sobre las mismas filas: debe encontrar las mismas curvas
+        if filas_procesadas:
+            tiempos, temps, screws = zip(*filas_procesadas)
+            curvas_lote = detectar_curvas_reactividad(tiempos, temps, screws)
+            coinciden = [(c["tipo"], c["minutos"], c["segundos"]) for c in curvas_lote] == [
+                (c["tipo"], c["minutos"], c["segundos"]) for c in reactivity_monitor.curvas_reactividad
+            ]
+            print(f"Detección por lote: {len(curvas_lote)} curvas ({'coincide' if coinciden else 'NO coincide'} con el monitor fila a fila)")
+
     print("--- Prueba básica finalizada por completo ---")
 
 
+def run_relacion_control_test():
+    """relacion_control con posiciones numéricas de válvula (no requiere el Excel)."""
+    print("\n--- Evaluando relacion_control 2270-TIC-11801 -> TV-11801 / HV-11808 ---")
+    alarm_config = load_alarm_config_from_json(JSON_FILE_PATH)
+    plan = compilar_plan_alarmas(alarm_config, {"2270-TIC-11801": {"valor": 70.0}})
+    ids_relacion = {i for i, c in enumerate(plan) if c.tipo == "relacion_control"}
+
+    casos = [
+        # (datos, actuadores que deben alarmar)
+        ({"2270-TIC-11801": 70, "2270-TV-11801": 80, "2270-HV-11808": 100}, set()),  # Sin salida del TIC
+        ({"2270-TIC-11801": 70, "2270-TIC-11801_OUT": 60, "2270-TV-11801": 80, "2270-HV-11808": 100}, set()),
+        ({"2270-TIC-11801": 70, "2270-TIC-11801_OUT": 0, "2270-TV-11801": 0, "2270-HV-11808": 0}, set()),
+        ({"2270-TIC-11801": 70, "2270-TIC-11801_OUT": 60, "2270-TV-11801": 0, "2270-HV-11808": 100}, {"2270-TV-11801"}),
+    ]
+    for datos, esperados in casos:
+        registros = evaluar_plan_registros(plan, datos, datetime.now())
+        por_fila = {plan[r.id_condicion].terminos[-1].tag for r in registros if r.id_condicion in ids_relacion}
+        lote = evaluar_plan_dataframe(plan, pd.DataFrame([datos]))
+        por_lote = {plan[i].terminos[-1].tag for i in lote["condicion"] if i in ids_relacion}
+        assert por_fila == esperados and por_lote == esperados, (datos, por_fila, por_lote)
+    print(f"relacion_control: {len(casos)} casos OK (fila a fila y en lote)")
+
+    # Con tag_modo el controlador solo pide acción en AUTO (tres términos por condición)
+    alarm_config["2270-TIC-11801"]["condiciones"][0]["condicion"]["tag_modo"] = "2270-TIC-11801_MODE"
+    plan = compilar_plan_alarmas(alarm_config, {"2270-TIC-11801": {"valor": 70.0}})
+    datos = {"2270-TIC-11801_OUT": 60, "2270-TV-11801": 0, "2270-HV-11808": 100}
+    for modo, esperados in (("AUTO", {"2270-TV-11801"}), ("MAN", set())):
+        registros = evaluar_plan_registros(plan, {**datos, "2270-TIC-11801_MODE": modo}, datetime.now())
+        alarmas = [r for r in registros if plan[r.id_condicion].tipo == "relacion_control"]
+        assert {plan[r.id_condicion].terminos[-1].tag for r in alarmas} == esperados, (modo, alarmas)
+        for mensaje in renderizar_alarmas(alarmas, plan):
+            assert "2270-TIC-11801_MODE == AUTO" in mensaje and "2270-TV-11801 < 5.0" in mensaje, mensaje
+            print(mensaje)
+    print("relacion_control con tag_modo: OK")
+
+
+def run_prediccion_ruidosa_test():
+    """Predicción de la clase con curvas exponenciales ruidosas (no requiere el Excel)."""
+    print("\n--- Evaluando predicción de reactividad con ruido ---")
+    rng = np.random.default_rng(25)
+    casos = [
+        # (tau_s, ΔT, σ ruido, autocorrelación del ruido, clase esperada, anticipación mínima en s)
+        (200.0, 55.0, 0.3, 0.0, "MEDIANA", 60),
+        (60.0, 55.0, 1.0, 0.8, "ALTA", 15),       # Ruido fuerte y filtrado
+        (300.0, 60.0, 0.3, 0.0, "MEDIANA", 60),
+        (250.0, 48.0, 0.5, 0.5, "BAJA", 60),
+        (600.0, 35.0, 0.3, 0.0, "NO_REACCIONA", 300),  # No llega a +40°C en la ventana
+    ]
+    inicio = pd.Timestamp("2026-01-01")
+    for tau_s, delta_t, sigma, rho, esperada, anticipacion_s in casos:
+        ruido = np.empty(1000)
+        ruido[0] = rng.normal(0, sigma)
+        for i in range(1, ruido.size):
+            ruido[i] = rho * ruido[i - 1] + rng.normal(0, sigma * np.sqrt(1 - rho * rho))
+        temps = 20 + delta_t * -np.expm1(-np.arange(ruido.size) / tau_s) + ruido
+
+        monitor = ReactivityMonitor()
+        predichas, primera_s, curva = set(), None, None
+        for i, temp in enumerate(temps):
+            curvas = monitor.process_reactivity(inicio + pd.Timedelta(seconds=i), float(temp), 1.0)
+            if curvas:
+                curva = curvas[0]
+                break
+            prediccion = monitor.prediccion()
+            if prediccion is not None:
+                predichas.add(prediccion["tipo_predicho"])
+                primera_s = i if primera_s is None else primera_s
+        assert curva is not None and curva["tipo"] == esperada, (tau_s, curva and curva["tipo"])
+        assert predichas == {esperada}, (tau_s, esperada, predichas)  # Nunca una clase equivocada
+        fin_s = (curva["timestamp_fin"] - inicio).total_seconds()
+        assert primera_s is not None and fin_s - primera_s >= anticipacion_s, (tau_s, primera_s, fin_s)
+        print(f"tau={tau_s:.0f}s σ={sigma}: {esperada} predicha a {primera_s} s (cierre a {fin_s:.0f} s, {fin_s - primera_s:.0f} s antes)")
+
+
 if __name__ == "__main__":
-    run_basic_test()
\ No newline at end of file
+    run_basic_test()
+    run_relacion_control_test()
+    run_prediccion_ruidosa_test()
\ No newline at end of file